@@ -7,31 +7,67 @@ analytics
 # < imports >----------------------------------------------------------------------------------
 
 # python library
+import argparse
+import concurrent.futures
 import csv
+import functools
 import logging
 import os
 import sys
 
+# numPy
+import numpy as np
 # openCV
 import cv2
 
-# analytics
+# analytics (os módulos ga_* registram seus extratores em ga_features)
 import analytics.ga_analise_contraste as ac
 import analytics.ga_analise_textura as at
+import analytics.ga_features as gf
 import analytics.ga_filtro_alta_frequencia as faf
 import analytics.ga_filtro_contraste as fc
+import analytics.ga_manifest as gm
+import analytics.ga_model as gmd
 import analytics.ga_modelo_cores as mc
+import analytics.ga_results as gr
+import analytics.ga_store as gs
+import analytics.ga_tiles as gt
 
 # local
 import gor_defs as df
-import fl_metar_parser as mp
+import gor_stats as gst
 
 # < constants >--------------------------------------------------------------------------------
 
 # diretório contendo as imagens
 DS_DIR_IMG = "data/shots/cap/SBGR-28/"
+# diretório contendo os METARs
 DS_DIR_MET = "data/metar/cap/SBGR-28/"
 
+# estação das imagens
+DS_STATION = "SBGR"
+
+# extratores calculados por imagem (alta_frequencia desabilitado)
+DLST_FEATURES = ["analise_contraste", "modelo_cores", "analise_textura", "filtro_contraste"]
+
+# default number of worker processes (1 = serial)
+D_WORKERS = 1
+
+# default number of images per worker chunk
+D_CHUNK = 64
+
+# default analysis scale (1 = full resolution, 2/4/8 = reduced decode)
+D_SCALE = 1
+
+# armazenamento colunar dos resultados
+DS_STORE = "./data/fog-features/"
+# arquivo de resultados (exportação opcional)
+DS_CSV = "./data/fog-clustering.csv"
+# manifesto dos arquivos já processados
+DS_MANIFEST = "./data/fog-clustering.manifest.json"
+# cache dos METARs interpretados
+DS_METAR_CACHE = "./data/metar-cache.json"
+
 # < logging >----------------------------------------------------------------------------------
 
 # logger
@@ -39,91 +75,176 @@ M_LOG = logging.getLogger(__name__)
 M_LOG.setLevel(logging.DEBUG)
 
 # ---------------------------------------------------------------------------------------------
-def do_analytics(fs_image_path: str):
+def positive_int(fs_value: str) -> int:
+    """
+    converte um argumento inteiro >= 1
+
+    :param fs_value: valor do argumento
+
+    :returns: valor inteiro
+    """
+    # valor inteiro
+    li_value = int(fs_value)
+
+    # não positivo ?
+    if li_value < 1:
+        # raise error
+        raise ValueError(f"Invalid value: {fs_value} (expected an integer >= 1)")
+
+    # return value
+    return li_value
+
+# ---------------------------------------------------------------------------------------------
+def arg_parse():
+    """
+    parse command line arguments
+    arguments parse: <workers> <chunk> <incremental> <scale> <tiles> <db> <csv> <links> <metar>
+                     <model>
+
+    :returns: arguments
+    """
+    # create parser
+    l_parser = argparse.ArgumentParser(description="analytics. Fog features from captured images.")
+    assert l_parser
+
+    # args
+    l_parser.add_argument("-w", "--workers", help=f"number of worker processes. [{D_WORKERS}]",
+                          default=D_WORKERS, dest="workers", type=int)
+    l_parser.add_argument("-k", "--chunk", help=f"images per worker chunk. [{D_CHUNK}]",
+                          default=D_CHUNK, dest="chunk", type=positive_int)
+    l_parser.add_argument("-r", "--scale", help=f"analysis scale (1, 2, 4 or 8). [{D_SCALE}]",
+                          default=D_SCALE, dest="scale", type=int, choices=sorted(gf.DDCT_SCALES))
+    l_parser.add_argument("-t", "--tiles", help="regional statistics grid, e.g. 4x4. [off]",
+                          default=None, dest="tiles", type=gt.parse_grid)
+    l_parser.add_argument("-d", "--db", help="SQLite database to store the tile grids. [off]",
+                          default=None, dest="db")
+    l_parser.add_argument("--csv", help=f"also export results to {DS_CSV}.",
+                          default=False, dest="csv", action="store_true")
+    l_parser.add_argument("-l", "--links", help="export symlinks of the K lowest images per "
+                          "metric (-1 = all). [0 = off]", default=0, dest="links", type=int)
+    l_parser.add_argument("-m", "--metar", help=f"label images with the visibility of the last "
+                          f"METAR in {DS_DIR_MET}.", default=False, dest="metar", action="store_true")
+    l_parser.add_argument("-M", "--model", help="tag the processed images with the cluster of this "
+                          f"fog_clustering model, e.g. {gmd.DS_MODEL}. [off]", default=None, dest="model")
+    l_parser.add_argument("-i", "--incremental", help="only process new or changed images.",
+                          default=False, dest="incremental", action="store_true")
+
+    # instrumentation args
+    gst.add_arguments(l_parser)
+
+    # return arguments
+    return l_parser.parse_args()
+
+# ---------------------------------------------------------------------------------------------
+def do_analytics(fs_image_path: str, fi_scale: int = 1, ft_grid: tuple = None):
     """
     do analytics
+
+    :param fs_image_path: path da imagem a analisar
+    :param fi_scale: escala de análise (1, 2, 4 ou 8; ver ga_calibration)
+    :param ft_grid: grade (rows, cols) das estatísticas regionais ou None
     """
     # logger
     M_LOG.info(">> do_analytics")
 
-    # carrega a imagem
-    l_image = cv2.imread(fs_image_path)
+    with gst.timer("analytics.decode"):
+        # carrega a imagem na escala de análise (em cinza, se nenhum extrator precisa de cores)
+        l_image = gf.imread(fs_image_path, fi_scale, gf.needs_color(DLST_FEATURES))
 
-    # faz detecção por filtro de alta frequência
-    # lf_percentage = faf.filtro_alta_frequencia(l_image)
-    # save image
-    # make_link(fs_image_path, "alta_frequencia", f'{lf_percentage:08.5f}')
+    # contexto da imagem (intermediários compartilhados)
+    l_ctx = gf.FeatureContext(l_image)
 
-    # faz detecção por análise de contraste
-    lf_mean_std_dev = ac.analise_contraste(l_image)
-    # save image
-    make_link(fs_image_path, "analise_contraste", f'{lf_mean_std_dev:08.5f}')
+    with gst.timer("analytics.extract"):
+        # calcula os extratores compartilhando os intermediários (gray, hsv, sobel, ...)
+        llst_result = gf.extract_ctx(l_ctx, DLST_FEATURES)
 
-    # faz detecção por modelo de cores
-    lf_std_dev = mc.modelo_cores(l_image)
-    # save image
-    make_link(fs_image_path, "modelo_cores", f'{lf_std_dev:08.5f}')
+    # estatísticas regionais ?
+    if ft_grid:
+        with gst.timer("analytics.tiles"):
+            # grades achatadas (mean, std, energy) ao final da linha
+            llst_result.extend(gt.tiles_ctx(l_ctx, *ft_grid).ravel().tolist())
 
-    # faz detecção por análise de textura
-    lf_contrast = at.analise_textura(l_image)
-    # save image
-    make_link(fs_image_path, "analise_textura", f'{lf_contrast:08.5f}')
-
-    # faz detecção por filtro de contraste
-    lf_mean_contrast = fc.filtro_contraste(l_image)
-    # save image
-    make_link(fs_image_path, "filtro_contraste", f'{lf_mean_contrast:08.5f}')
+    # imagens processadas
+    gst.count("analytics.images")
 
     # retorna o resultado para posterior análise estatística
-    return [lf_mean_std_dev, lf_std_dev, lf_contrast, lf_mean_contrast]
+    return llst_result
 
 # ---------------------------------------------------------------------------------------------
-def do_metar_process(fs_filename: str, fi_ndx: int):
-    """
-    process metar
+def do_chunk(flst_fnames: list, fi_scale: int = 1, ft_grid: tuple = None) -> list:
     """
-    # logger
-    M_LOG.info(">> do_metar_process")
+    processa um bloco de imagens (executado em um processo worker)
 
-    # open METAR file
-    with open(fs_filename, "r") as lfh:
-        # read file
-        ls_line = lfh.read().strip()
+    :param flst_fnames: lista de nomes de arquivo (em DS_DIR_IMG)
+    :param fi_scale: escala de análise
+    :param ft_grid: grade (rows, cols) das estatísticas regionais ou None
 
-        # parse METAR
-        l_metar = mp.metar_parse(ls_line)
+    :returns: lista de linhas de características (tuplas de floats), na mesma ordem
+    """
+    # retorna as linhas do bloco
+    return [tuple(do_analytics(os.path.join(DS_DIR_IMG, ls_fname), fi_scale, ft_grid))
+            for ls_fname in flst_fnames]
 
-    # visibility from METAR
-    li_visibility = l_metar.i_visibility if l_metar.i_visibility is not None else 20000
-    
-    # save image
-    make_link(fs_filename, "visibilidade", f'{li_visibility:05d}_{fi_ndx:03d}')
+# ---------------------------------------------------------------------------------------------
+def _init_worker():
+    """
+    inicializa um processo worker: openCV single-thread e instrumentação desligada (os
+    tempos por imagem só são medidos no modo serial; o modo paralelo mede os estágios)
+    """
+    # openCV single-thread
+    cv2.setNumThreads(1)
 
-    # return visibility
-    return [li_visibility]
+    # disable instrumentation
+    gst.enable(False)
 
 # ---------------------------------------------------------------------------------------------
-def make_link(fs_src, fs_dir: str, fs_result: str):
+def do_parallel(flst_fnames: list, fi_workers: int, fi_chunk: int, fi_scale: int = 1,
+                ft_grid: tuple = None) -> list:
     """
-    write image
+    processa as imagens em paralelo, em blocos, preservando a ordem da lista
+
+    :param flst_fnames: lista ordenada de nomes de arquivo
+    :param fi_workers: número de processos worker
+    :param fi_chunk: número de imagens por bloco
+    :param fi_scale: escala de análise
+    :param ft_grid: grade (rows, cols) das estatísticas regionais ou None
+
+    :returns: lista de linhas de características, na ordem de flst_fnames
     """
-    # caminho da imagem
-    ls_src = os.path.join("..", os.path.basename(fs_src))
+    # tamanho do bloco (validado por positive_int em --chunk)
+    assert fi_chunk >= 1, fi_chunk
+
+    # divide a lista em blocos
+    llst_chunks = [flst_fnames[li_ndx:li_ndx + fi_chunk]
+                   for li_ndx in range(0, len(flst_fnames), fi_chunk)]
+
+    # resultados
+    llst_results = []
+
+    # cria o pool de processos (openCV single-thread por worker)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=fi_workers,
+                                                initializer=_init_worker) as l_pool:
+        # map preserva a ordem dos blocos
+        for llst_rows in l_pool.map(functools.partial(do_chunk, fi_scale=fi_scale, ft_grid=ft_grid),
+                                    llst_chunks):
+            # junta as linhas do bloco
+            llst_results.extend(llst_rows)
 
-    # caminho completo para a saída
-    ls_dst = os.path.join(DS_DIR_IMG, fs_dir, fs_result + ".png")
+    # return results
+    return llst_results
 
-    try:
-        # create a symbolic link pointing to src named dst using os.symlink() method
-        os.symlink(ls_src, ls_dst)
+# ---------------------------------------------------------------------------------------------
+def list_images(fs_dir: str) -> list:
+    """
+    lista os arquivos de imagem do diretório, ordenados pelo nome
 
-    # em caso de erro...
-    except FileExistsError:
-        # remove previous link
-        os.remove(ls_dst)
+    :param fs_dir: diretório de imagens
 
-        # create a symbolic link pointing to src named dst using os.symlink() method
-        os.symlink(ls_src, ls_dst)
+    :returns: lista ordenada de nomes de arquivo
+    """
+    # return sorted image filenames
+    return sorted(ls_fname for ls_fname in os.listdir(fs_dir)
+                  if ls_fname.endswith(".jpg") or ls_fname.endswith(".png"))
 
 # ---------------------------------------------------------------------------------------------
 def save2csv(flst_header: list, flst_results: list):
@@ -131,7 +252,7 @@ def save2csv(flst_header: list, flst_results: list):
     save to CSV file
     """
     # create CSV file
-    with open("./data/fog-clustering.csv", 'w', encoding="UTF8") as lfh:
+    with open(DS_CSV, 'w', encoding="UTF8") as lfh:
         # create writer
         l_writer = csv.writer(lfh)
 
@@ -142,39 +263,267 @@ def save2csv(flst_header: list, flst_results: list):
         l_writer.writerows(flst_results)
 
 # ---------------------------------------------------------------------------------------------
-def main():
+def save2dbtiles(fs_db: str, flst_fnames: list, flst_rows: list, ft_grid: tuple):
     """
-    main
+    save tile grids to DB
+
+    :param fs_db: database file
+    :param flst_fnames: image filenames (YYYYmmddHHMMSSZc.png)
+    :param flst_rows: feature rows (features followed by the flattened grids)
+    :param ft_grid: grid (rows, cols)
     """
-    # lista de headers
-    llst_header = ["mean_std_dev", "std_dev", "contrast", "mean_contrast"]
+    # gor_db (importado somente quando usado: traz gor_util e o acesso à REDEMET)
+    import gor_db as db
 
-    # Lista para armazenar os resultados da função
-    llst_results = []
+    # connect to the database
+    lconn = db.create_connection(fs_db)
+    assert lconn
 
-    # percorre o diretório de imagens...
-    for li_ndx, ls_filename in enumerate(os.listdir(DS_DIR_IMG)):
-        # é um arquivo de imagem ?
-        if ls_filename.endswith(".jpg") or ls_filename.endswith(".png"):
-            # filename
-            lt_fname = os.path.splitext(os.path.basename(ls_filename))
+    # número de colunas dos extratores
+    li_nfeat = len(DLST_FEATURES)
 
-            # caminho completo para a imagem
-            ls_image_path = os.path.join(DS_DIR_IMG, ls_filename)
+    # save to DB (data da imagem a partir do nome do arquivo)
+    db.save2dbtiles(lconn, [(DS_STATION, ls_fname[:14],
+                             np.asarray(lt_row[li_nfeat:]).reshape(len(gt.DLST_STATS), *ft_grid))
+                            for ls_fname, lt_row in zip(flst_fnames, flst_rows)])
 
-            # processa a imagem e obtem o resultado
-            lt_result = do_analytics(ls_image_path)
+    # commit the changes
+    lconn.commit()
+    # close the connection
+    lconn.close()
 
-            # caminho completo para o METAR (20230526124416Zm.txt)
-            # ls_metar_path = os.path.join(DS_DIR_MET, lt_fname[0][:15] + "m.txt")
-            # parse METAR
-            # llst_visi = # do_metar_process(ls_metar_path, li_ndx)
+# ---------------------------------------------------------------------------------------------
+def save2store(flst_header: list, flst_fnames: list, flst_results: list, flst_todo: list,
+               flst_rows: list):
+    """
+    save to columnar feature store (append when only new, later images were processed)
+
+    :param flst_header: feature column names
+    :param flst_fnames: all image filenames (sorted)
+    :param flst_results: feature rows of all images (same order)
+    :param flst_todo: images processed in this run
+    :param flst_rows: feature rows of flst_todo
+    """
+    # linhas já armazenadas
+    _, li_nrows = gs.load_meta(DS_STORE)
 
-            # adicionar o resultado à lista
-            llst_results.append(lt_result)  #  + llst_visi)
+    # armazenamento já atualizado ?
+    if not flst_todo and li_nrows == len(flst_fnames):
+        # nothing to do
+        return
 
-    # save results to CSV file
-    save2csv(llst_header, llst_results)
+    # o armazenamento tem exatamente as imagens anteriores e só há imagens novas no final ?
+    if flst_todo and li_nrows + len(flst_todo) == len(flst_fnames) and \
+       flst_fnames[li_nrows:] == flst_todo:
+        # anexa as novas linhas
+        gs.append(DS_STORE, gs.make_columns(flst_todo, DS_STATION, flst_header, flst_rows))
+
+    # senão, regrava tudo
+    else:
+        # write all rows
+        gs.write(DS_STORE, gs.make_columns(flst_fnames, DS_STATION, flst_header, flst_results))
+
+# ---------------------------------------------------------------------------------------------
+def save2results(flst_fnames: list, flst_results: list, flst_todo: list, flst_rows: list,
+                 fi_links: int = 0):
+    """
+    save metrics to the indexed results table and optionally export symlinks
+
+    :param flst_fnames: all image filenames (sorted)
+    :param flst_results: feature rows of all images (same order)
+    :param flst_todo: images processed in this run
+    :param flst_rows: feature rows of flst_todo
+    :param fi_links: export the K lowest images per metric (-1 = all, 0 = off)
+    """
+    # connect to the results database
+    lconn = gr.connect()
+
+    for li_ndx, ls_name in enumerate(DLST_FEATURES):
+        # save new rows and drop removed images
+        gr.save_results(lconn, ls_name, flst_todo, [lt_row[li_ndx] for lt_row in flst_rows],
+                        flst_fnames)
+
+        # tabela incompleta (p.ex. banco novo em modo incremental) ?
+        if gr.count(lconn, ls_name) != len(flst_fnames):
+            # save all rows
+            gr.save_results(lconn, ls_name, flst_fnames, [lt_row[li_ndx] for lt_row in flst_results])
+
+    # commit the changes
+    lconn.commit()
+
+    # exporta os links ?
+    if fi_links:
+        for ls_name in DLST_FEATURES:
+            # export a sorted view of the metric
+            gr.export_links(DS_DIR_IMG, ls_name, gr.sorted_view(lconn, ls_name, fi_links),
+                            "{value:08.5f}.png")
+
+    # close the connection
+    lconn.close()
+
+# ---------------------------------------------------------------------------------------------
+def save2visibility(flst_fnames: list, fi_links: int = 0):
+    """
+    label images with the visibility of the last METAR up to the image time and save it
+    to the indexed results table (metric "visibilidade")
+
+    :param flst_fnames: all image filenames (sorted)
+    :param fi_links: export the K lowest visibility images (-1 = all, 0 = off)
+    """
+    # índice de METARs (importado somente quando usado: traz o parser da REDEMET)
+    import analytics.ga_metar as gmt
+
+    # índice dos METARs (uma leitura de cada arquivo)
+    l_index = gmt.load_index(DS_DIR_MET, DS_METAR_CACHE)
+
+    # instantes das imagens
+    l_times = gmt.image_times(flst_fnames)
+
+    # imagens com METAR
+    l_has = l_index.lookup(l_times) >= 0
+    llst_fnames = [ls_fname for ls_fname, lv_has in zip(flst_fnames, l_has) if lv_has]
+    M_LOG.info("%d of %d images with METAR", len(llst_fnames), len(flst_fnames))
+
+    # visibilidade das imagens com METAR (junção vetorizada)
+    l_vis = l_index.join("visibility", l_times, -1)[l_has]
+
+    # connect to the results database
+    lconn = gr.connect()
+
+    # save rows and drop images without METAR
+    gr.save_results(lconn, "visibilidade", llst_fnames, l_vis, llst_fnames)
+
+    # commit the changes
+    lconn.commit()
+
+    # exporta os links ?
+    if fi_links:
+        # export a sorted view of the visibility
+        gr.export_links(DS_DIR_IMG, "visibilidade", gr.sorted_view(lconn, "visibilidade", fi_links),
+                        "{value:05.0f}_{fname}")
+
+    # close the connection
+    lconn.close()
+
+# ---------------------------------------------------------------------------------------------
+def save2clusters(fs_model: str, flst_header: list, flst_todo: list, flst_rows: list):
+    """
+    tag the images processed in this run with the cluster of a saved fog_clustering model
+    and save the labels to the indexed results table (metric "kmeans")
+
+    :param fs_model: cluster model file
+    :param flst_header: feature column names
+    :param flst_todo: images processed in this run
+    :param flst_rows: feature rows of flst_todo
+    """
+    # nada a classificar ?
+    if not flst_todo:
+        return
+
+    # load model
+    l_model = gmd.load(fs_model)
+
+    # colunas do modelo presentes nas linhas ?
+    if not set(l_model.lst_names) <= set(flst_header):
+        # logger
+        M_LOG.error("cluster model columns %s not in %s", l_model.lst_names, flst_header)
+        # return
+        return
+
+    # colunas do modelo, na ordem do modelo
+    llst_cols = [flst_header.index(ls_name) for ls_name in l_model.lst_names]
+
+    # classifica o lote
+    l_labels = l_model.predict(np.asarray(flst_rows, dtype=np.float64)[:, llst_cols])
+
+    # connect to the results database
+    lconn = gr.connect()
+
+    # save labels of the new images
+    gr.save_results(lconn, "kmeans", flst_todo, l_labels)
+
+    # commit the changes
+    lconn.commit()
+    # close the connection
+    lconn.close()
+
+# ---------------------------------------------------------------------------------------------
+def main():
+    """
+    main
+    """
+    # get program arguments
+    l_args = arg_parse()
+
+    # instrumentation
+    gst.configure(l_args.stats, l_args.stats_interval)
+
+    # lista de headers ("mean_std_dev", "std_dev", "contrast", "mean_contrast", tiles...)
+    llst_header = gf.header(DLST_FEATURES) + (gt.header(*l_args.tiles) if l_args.tiles else [])
+
+    # lista ordenada das imagens (ordem determinística do CSV)
+    llst_fnames = list_images(DS_DIR_IMG)
+
+    # os nomes cabem no armazenamento ? (falha antes de extrair as características)
+    gs.check_fnames(llst_fnames)
+
+    # manifesto dos arquivos já processados (modo incremental)
+    ldct_params = {"scale": l_args.scale, "tiles": l_args.tiles and list(l_args.tiles)}
+    ldct_files = gm.load_manifest(DS_MANIFEST, llst_header, ldct_params) if l_args.incremental else {}
+
+    # somente arquivos novos ou alterados
+    llst_todo = gm.changed(ldct_files, DS_DIR_IMG, llst_fnames)
+    M_LOG.info("processing %d of %d images", len(llst_todo), len(llst_fnames))
+
+    with gst.timer("analytics.features"):
+        # modo paralelo ?
+        if l_args.workers > 1:
+            # processa os blocos de imagens nos workers
+            llst_rows = do_parallel(llst_todo, l_args.workers, l_args.chunk, l_args.scale,
+                                    l_args.tiles)
+
+        # senão, modo serial
+        else:
+            # processa as imagens e obtem o resultado
+            llst_rows = do_chunk(llst_todo, l_args.scale, l_args.tiles)
+
+    # grava as grades das imagens processadas no DB ?
+    if l_args.tiles and l_args.db:
+        with gst.timer("analytics.db_tiles"):
+            # save tile grids to DB
+            save2dbtiles(l_args.db, llst_todo, llst_rows, l_args.tiles)
+
+    # junta as linhas novas às já processadas (ordem de llst_fnames)
+    llst_results = gm.merge(ldct_files, DS_DIR_IMG, llst_fnames, llst_todo, llst_rows)
+
+    with gst.timer("analytics.store"):
+        # save results to feature store
+        save2store(llst_header, llst_fnames, llst_results, llst_todo, llst_rows)
+
+    with gst.timer("analytics.results"):
+        # save results to the indexed results table
+        save2results(llst_fnames, llst_results, llst_todo, llst_rows, l_args.links)
+
+    # classifica as imagens processadas com o modelo de clusters ?
+    if l_args.model:
+        with gst.timer("analytics.cluster"):
+            # save cluster labels to the indexed results table
+            save2clusters(l_args.model, llst_header, llst_todo, llst_rows)
+
+    # rotula as imagens com a visibilidade do METAR ?
+    if l_args.metar:
+        with gst.timer("analytics.metar"):
+            # save visibility to the indexed results table
+            save2visibility(llst_fnames, l_args.links)
+
+    # export CSV ?
+    if l_args.csv:
+        with gst.timer("analytics.csv"):
+            # save results to CSV file
+            save2csv(llst_header, llst_results)
+
+    # save manifest (base para a próxima execução incremental)
+    gm.save_manifest(DS_MANIFEST, llst_header, ldct_files, ldct_params)
 
 # ---------------------------------------------------------------------------------------------
 # this is the bootstrap process
@@ -19,8 +19,9 @@ import logging
 
 # numPy
 import numpy as np
-# openCV
-import cv2
+
+# local
+import analytics.ga_features as gf
 
 # < logging >----------------------------------------------------------------------------------
 
@@ -41,30 +42,41 @@ def analise_contraste(f_image) -> float:
     # logger
     M_LOG.info(">> analise_contraste") 
 
-    # converte a imagem para escala de cinza
-    l_gray = cv2.cvtColor(f_image, cv2.COLOR_BGR2GRAY)
+    # retorna o desvio padrão médio da imagem (contraste médio)
+    return analise_contraste_ctx(gf.FeatureContext(f_image))
 
+# ---------------------------------------------------------------------------------------------
+@gf.register("analise_contraste", "mean_std_dev", ("gray",))
+def analise_contraste_ctx(f_ctx) -> float:
+    """ 
+    técnica de analise de contraste sobre o contexto compartilhado da imagem
+    
+    :param f_ctx: contexto da imagem (ga_features.FeatureContext)
+
+    :returns: desvio padrão médio da imagem (contraste médio)
+    """
     # calcula o desvio padrão da imagem em escala de cinza
-    l_std_dev = np.std(l_gray)
+    l_std_dev = np.std(f_ctx.get("gray"))
 
     # retorna o desvio padrão médio da imagem (contraste médio)
     return np.mean(l_std_dev)
 
 # ---------------------------------------------------------------------------------------------
-def do_analise_contraste(fs_image_path: str, ff_threshold: float = 0.1) -> bool:
+def do_analise_contraste(fs_image_path: str, ff_threshold: float = 0.1, fi_scale: int = 1) -> bool:
     """ 
     técnica de analise de contraste para detecção de nevoeiro
     
     :param fs_image_path: path da imagem a analisar
     :param ff_threshold: limite que define o nível de sensibilidade da detecção
+    :param fi_scale: escala de análise (1, 2, 4 ou 8; ver ga_calibration)
 
     :returns: True indica que o nevoeiro foi detectado. False, senão.
     """
     # logger
     M_LOG.info(">> analise_contraste") 
 
-    # carrega a imagem
-    l_image = cv2.imread(fs_image_path)
+    # carrega a imagem em escala de cinza, na escala de análise
+    l_image = gf.imread(fs_image_path, fi_scale, fv_color=False)
 
     # retorna se o desvio padrão médio está abaixo do limite (i.e. nevoeiro detectado)
     return analise_contraste(l_image) < ff_threshold
@@ -7,19 +7,25 @@ então comparado com o limite (threshold) que define o nível de contraste neces
 para detectar o nevoeiro.  Se o contraste estiver abaixo do limite, o programa indica
 que o nevoeiro foi detectado.
 
+O contraste da matriz de co-ocorrência (GLCM) é calculado diretamente como a média de
+(i - j)² sobre os pares de pixels deslocados, sem materializar a matriz.  Com a GLCM
+simétrica e normalizada, isso é idêntico a graycoprops(graycomatrix(...), 'contrast').
+
 2023.may  mlabru  initial version (Linux/Python)
 """
 # < imports >----------------------------------------------------------------------------------
 
 # python library
 import logging
+import math
 
 # numPy
 import numpy as np
 # openCV
 import cv2
-# scikit-image
-import skimage.feature as skf
+
+# local
+import analytics.ga_features as gf
 
 # < logging >----------------------------------------------------------------------------------
 
@@ -43,6 +49,19 @@ def analise_textura(f_image) -> int:
     # retorna se o contraste está abaixo do limiar
     return calculate_contrast(f_image)
 
+# ---------------------------------------------------------------------------------------------
+@gf.register("analise_textura", "contrast", ("gray",))
+def analise_textura_ctx(f_ctx) -> float:
+    """
+    técnica de analise de textura sobre o contexto compartilhado da imagem
+
+    :param f_ctx: contexto da imagem (ga_features.FeatureContext)
+
+    :returns: contraste da matriz de co-ocorrência
+    """
+    # retorna o contraste a partir da imagem em escala de cinza
+    return gray_contrast(f_ctx.get("gray"))
+
 # ---------------------------------------------------------------------------------------------
 def calculate_contrast(f_image):
     """
@@ -55,30 +74,96 @@ def calculate_contrast(f_image):
     # logger
     M_LOG.info(">> calculate_contrast")
 
-    # converte a imagem para escala de cinza
-    l_gray = cv2.cvtColor(f_image, cv2.COLOR_BGR2GRAY)
-    
-    # Calcular a matriz de coocorrência de níveis de cinza
-    l_glcm = skf.graycomatrix(l_gray, [1], [0], symmetric=True, normed=True)
+    # retorna o contraste a partir da imagem em escala de cinza
+    return gray_contrast(gf.FeatureContext(f_image).get("gray"))
+
+# ---------------------------------------------------------------------------------------------
+def gray_contrast(f_gray):
+    """
+    calcula o contraste da matriz de co-ocorrência de uma imagem em escala de cinza
+
+    :param f_gray: imagem em escala de cinza
+
+    :returns: contraste 
+    """
+    # retorna o contraste da matriz de coocorrência (distância 1, ângulo 0)
+    return glcm_contrast(f_gray)[0, 0]
+
+# ---------------------------------------------------------------------------------------------
+def glcm_contrast(f_gray, flst_distances=(1,), flst_angles=(0.,), fi_levels: int = 256):
+    """
+    calcula o contraste da GLCM simétrica e normalizada sem materializar a matriz
+
+    :param f_gray: imagem em escala de cinza (uint8)
+    :param flst_distances: distâncias dos pares de pixels
+    :param flst_angles: ângulos dos pares de pixels (radianos)
+    :param fi_levels: níveis de cinza (quantização, p.ex. 32 ou 64)
+
+    :returns: contraste, array (len(flst_distances), len(flst_angles))
+    """
+    # quantização dos níveis de cinza ?
+    if fi_levels < 256:
+        # tabela de quantização (floor(g * levels / 256))
+        l_lut = (np.arange(256) * fi_levels // 256).astype(np.uint8)
+
+        # quantiza a imagem
+        f_gray = cv2.LUT(f_gray, l_lut)
+
+    # dimensões da imagem
+    li_rows, li_cols = f_gray.shape[:2]
+
+    # contraste por distância e ângulo
+    l_contrast = np.zeros((len(flst_distances), len(flst_angles)), dtype=np.float64)
+
+    for li_d, li_distance in enumerate(flst_distances):
+        for li_a, lf_angle in enumerate(flst_angles):
+            # deslocamento (arredondamento como em skimage.feature.graycomatrix)
+            li_dr = _round_half_away(math.sin(lf_angle) * li_distance)
+            li_dc = _round_half_away(math.cos(lf_angle) * li_distance)
 
-    # retorna o contraste a partir da matriz de coocorrência
-    return skf.graycoprops(l_glcm, 'contrast')[0, 0]
+            # região válida dos pares (r, c) e (r + dr, c + dc)
+            li_r0, li_r1 = max(0, -li_dr), min(li_rows, li_rows - li_dr)
+            li_c0, li_c1 = max(0, -li_dc), min(li_cols, li_cols - li_dc)
+
+            # número de pares
+            li_count = max(0, li_r1 - li_r0) * max(0, li_c1 - li_c0)
+
+            if li_count > 0:
+                # soma de (i - j)² calculada pelo openCV (acumulada em double)
+                lf_ssd = cv2.norm(f_gray[li_r0:li_r1, li_c0:li_c1],
+                                  f_gray[li_r0 + li_dr:li_r1 + li_dr, li_c0 + li_dc:li_c1 + li_dc],
+                                  cv2.NORM_L2SQR)
+
+                # contraste médio dos pares
+                l_contrast[li_d, li_a] = lf_ssd / li_count
+
+    # retorna o contraste
+    return l_contrast
+
+# ---------------------------------------------------------------------------------------------
+def _round_half_away(ff_value: float) -> int:
+    """
+    arredonda para o inteiro mais próximo, com empates afastando-se do zero
+    """
+    # return rounded value
+    return int(math.copysign(math.floor(abs(ff_value) + 0.5), ff_value))
 
 # ---------------------------------------------------------------------------------------------
-def do_analise_textura(fs_image_path: str, fi_threshold: int = 500) -> bool:
+def do_analise_textura(fs_image_path: str, fi_threshold: int = 500, fi_scale: int = 1) -> bool:
     """
     técnica de analise de textura para detecção de nevoeiro
 
     :param fs_image_path: path da imagem a analisar
     :param fi_threshold: limite que define o nível de sensibilidade da detecção
+    :param fi_scale: escala de análise (1, 2, 4 ou 8; ver ga_calibration)
 
     :returns: True indica que o nevoeiro foi detectado. False, senão.
     """
     # logger
     M_LOG.info(">> do_analise_textura")
 
-    # carrega a imagem
-    l_image = cv2.imread(fs_image_path)
+    # carrega a imagem em escala de cinza, na escala de análise
+    l_image = gf.imread(fs_image_path, fi_scale, fv_color=False)
     
     # retorna se o contraste está abaixo do limiar
     return calculate_contrast(l_image) < fi_threshold
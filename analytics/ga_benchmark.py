@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+"""
+ga_benchmark
+
+benchmark das funções de análise (ga_*).  Gera quadros sintéticos determinísticos nos
+tamanhos reais de captura (regiões DDCT_BBOX_* e recorte X1..Y2 de gor_defs), mede a
+latência de cada função (percentis), a vazão e o pico de memória alocada, e grava os
+resultados em JSON para comparação entre commits.  Não precisa de câmera nem de acesso
+à REDEMET.
+
+uso: python -m analytics.ga_benchmark [-r 50] [-w 5] [-s 0] [-o ./data/benchmark.json]
+
+2023.may  mlabru  initial version (Linux/Python)
+"""
+# < imports >----------------------------------------------------------------------------------
+
+# python library
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+# numPy
+import numpy as np
+# openCV
+import cv2
+
+# analytics (os módulos ga_* registram seus extratores em ga_features)
+import analytics.ga_analise_contraste as ac
+import analytics.ga_analise_textura as at
+import analytics.ga_features as gf
+import analytics.ga_filtro_alta_frequencia as faf
+import analytics.ga_filtro_contraste as fc
+import analytics.ga_modelo_cores as mc
+
+# local
+import gor_defs as df
+
+# < constants >--------------------------------------------------------------------------------
+
+# default number of timed repetitions per function and size
+D_REPEAT = 50
+
+# default number of warm-up calls
+D_WARMUP = 5
+
+# default seed for the synthetic frames
+D_SEED = 0
+
+# default report file
+DS_REPORT = "./data/benchmark.json"
+
+# funções medidas {name: function(image)}
+DDCT_FUNCTIONS = {"analise_contraste": ac.analise_contraste,
+                  "modelo_cores": mc.modelo_cores,
+                  "analise_textura": at.analise_textura,
+                  "filtro_contraste": fc.filtro_contraste,
+                  "filtro_alta_frequencia": faf.filtro_alta_frequencia,
+                  # os quatro extratores do analytics sobre um contexto compartilhado
+                  "extract_shared": lambda f_image: gf.extract(f_image, ["analise_contraste",
+                                                                         "modelo_cores",
+                                                                         "analise_textura",
+                                                                         "filtro_contraste"])}
+
+# < logging >----------------------------------------------------------------------------------
+
+# logger
+M_LOG = logging.getLogger(__name__)
+M_LOG.setLevel(logging.INFO)
+
+# ---------------------------------------------------------------------------------------------
+def arg_parse():
+    """
+    parse command line arguments
+    arguments parse: <repeat> <warmup> <seed> <output>
+
+    :returns: arguments
+    """
+    # create parser
+    l_parser = argparse.ArgumentParser(description="ga_benchmark. Analytics feature benchmark.")
+    assert l_parser
+
+    # args
+    l_parser.add_argument("-r", "--repeat", help=f"timed calls per function and size. [{D_REPEAT}]",
+                          default=D_REPEAT, dest="repeat", type=int)
+    l_parser.add_argument("-w", "--warmup", help=f"warm-up calls. [{D_WARMUP}]",
+                          default=D_WARMUP, dest="warmup", type=int)
+    l_parser.add_argument("-s", "--seed", help=f"synthetic frames seed. [{D_SEED}]",
+                          default=D_SEED, dest="seed", type=int)
+    l_parser.add_argument("-o", "--output", help=f"JSON report file. [{DS_REPORT}]",
+                          default=DS_REPORT, dest="output")
+
+    # return arguments
+    return l_parser.parse_args()
+
+# ---------------------------------------------------------------------------------------------
+def capture_sizes() -> dict:
+    """
+    tamanhos reais de captura (width, height): regiões DDCT_BBOX_* e recorte X1..Y2
+
+    :returns: {name: (width, height)}
+    """
+    # tamanhos distintos
+    ldct_sizes = {"crop": (df.X2 - df.X1, df.Y2 - df.Y1)}
+
+    for ls_prefix, ldct_bbox in (("gorfog", df.DDCT_BBOX_GORFOG), ("gormet", df.DDCT_BBOX_GORMET)):
+        for ls_host, lt_bbox in ldct_bbox.items():
+            # (X1, Y1, X2, Y2)
+            ldct_sizes[f"{ls_prefix}-{ls_host}"] = (lt_bbox[2] - lt_bbox[0], lt_bbox[3] - lt_bbox[1])
+
+    # return sizes
+    return ldct_sizes
+
+# ---------------------------------------------------------------------------------------------
+def synthetic_frame(fi_width: int, fi_height: int, fi_seed: int = D_SEED):
+    """
+    quadro sintético determinístico: céu em gradiente, horizonte, pista com textura e
+    um véu de nevoeiro parcial
+
+    :param fi_width: largura
+    :param fi_height: altura
+    :param fi_seed: semente
+
+    :returns: imagem BGR (uint8)
+    """
+    # gerador determinístico
+    l_rng = np.random.default_rng(fi_seed)
+
+    # coordenadas normalizadas
+    l_y = np.linspace(0., 1., fi_height, dtype=np.float32)[:, None]
+    l_x = np.linspace(0., 1., fi_width, dtype=np.float32)[None, :]
+
+    # céu em gradiente acima do horizonte, solo abaixo
+    l_sky = np.stack([200. - 60. * l_y, 170. - 40. * l_y, 140. - 20. * l_y], axis=-1)
+    l_ground = np.stack([70. + 30. * l_x, 90. + 20. * l_x, 80. + 10. * l_x], axis=-1)
+    l_frame = np.where((l_y < 0.45)[..., None], l_sky, l_ground)
+
+    # textura (ruído suavizado) e faixas da pista
+    l_noise = cv2.GaussianBlur(l_rng.normal(0., 25., (fi_height, fi_width, 3)).astype(np.float32),
+                               (0, 0), 1.5)
+    l_frame = l_frame + l_noise
+    l_frame[int(fi_height * 0.7):int(fi_height * 0.72), :] = 230.
+
+    # véu de nevoeiro crescente da esquerda para a direita
+    l_fog = np.clip(l_x * 0.8, 0., 0.8)[..., None]
+    l_frame = l_frame * (1. - l_fog) + 210. * l_fog
+
+    # return BGR image
+    return np.clip(l_frame, 0, 255).astype(np.uint8)
+
+# ---------------------------------------------------------------------------------------------
+def bench_function(f_func, f_image, fi_repeat: int, fi_warmup: int) -> dict:
+    """
+    mede a latência, a vazão e o pico de memória de uma função
+
+    :param f_func: função(image)
+    :param f_image: quadro
+    :param fi_repeat: chamadas medidas
+    :param fi_warmup: chamadas de aquecimento
+
+    :returns: estatísticas
+    """
+    for _ in range(fi_warmup):
+        # warm-up
+        f_func(f_image)
+
+    # latências (ns)
+    l_lat = np.empty(fi_repeat, dtype=np.int64)
+
+    for li_ndx in range(fi_repeat):
+        # tempo inicial
+        li_ini = time.perf_counter_ns()
+
+        # call
+        f_func(f_image)
+
+        # elapsed time
+        l_lat[li_ndx] = time.perf_counter_ns() - li_ini
+
+    # pico de memória (alocações python/numpy; buffers internos do openCV não são vistos)
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    li_base = tracemalloc.get_traced_memory()[0]
+
+    # call
+    f_func(f_image)
+
+    li_peak = tracemalloc.get_traced_memory()[1] - li_base
+    tracemalloc.stop()
+
+    # latências em ms
+    l_ms = l_lat / 1e6
+
+    # megapixels do quadro
+    lf_mpix = f_image.shape[0] * f_image.shape[1] / 1e6
+
+    # return statistics
+    return {"p50_ms": float(np.percentile(l_ms, 50)),
+            "p90_ms": float(np.percentile(l_ms, 90)),
+            "p99_ms": float(np.percentile(l_ms, 99)),
+            "mean_ms": float(np.mean(l_ms)),
+            "min_ms": float(np.min(l_ms)),
+            "max_ms": float(np.max(l_ms)),
+            "frames_per_s": float(1e3 / np.mean(l_ms)),
+            "mpix_per_s": float(lf_mpix * 1e3 / np.mean(l_ms)),
+            "peak_alloc_bytes": int(li_peak)}
+
+# ---------------------------------------------------------------------------------------------
+def git_revision() -> str:
+    """
+    commit atual (ou "unknown" fora de um repositório git)
+    """
+    try:
+        # git commit
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+
+    # em caso de erro...
+    except (OSError, subprocess.CalledProcessError):
+        # unknown revision
+        return "unknown"
+
+# ---------------------------------------------------------------------------------------------
+def run(fi_repeat: int = D_REPEAT, fi_warmup: int = D_WARMUP, fi_seed: int = D_SEED) -> dict:
+    """
+    executa o benchmark
+
+    :param fi_repeat: chamadas medidas por função e tamanho
+    :param fi_warmup: chamadas de aquecimento
+    :param fi_seed: semente dos quadros sintéticos
+
+    :returns: relatório
+    """
+    # relatório
+    ldct_report = {"revision": git_revision(),
+                   "date": datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%d%H%M%S"),
+                   "python": platform.python_version(),
+                   "numpy": np.__version__,
+                   "opencv": cv2.__version__,
+                   "machine": platform.machine(),
+                   "cpus": os.cpu_count(),
+                   "opencv_threads": cv2.getNumThreads(),
+                   "repeat": fi_repeat,
+                   "seed": fi_seed,
+                   "sizes": {}}
+
+    for ls_size, (li_width, li_height) in capture_sizes().items():
+        # quadro sintético
+        l_image = synthetic_frame(li_width, li_height, fi_seed)
+
+        # logger
+        M_LOG.info("size %s (%dx%d)", ls_size, li_width, li_height)
+
+        # resultados por função
+        ldct_report["sizes"][ls_size] = {"width": li_width, "height": li_height, "functions": {
+            ls_name: bench_function(f_func, l_image, fi_repeat, fi_warmup)
+            for ls_name, f_func in DDCT_FUNCTIONS.items()}}
+
+    # pico de memória residente do processo (inclui buffers internos do openCV)
+    ldct_report["max_rss_kib"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # return report
+    return ldct_report
+
+# ---------------------------------------------------------------------------------------------
+def main():
+    """
+    main
+    """
+    # get program arguments
+    l_args = arg_parse()
+
+    # run benchmark
+    ldct_report = run(l_args.repeat, l_args.warmup, l_args.seed)
+
+    # cria o diretório do relatório
+    if os.path.dirname(l_args.output):
+        os.makedirs(os.path.dirname(l_args.output), exist_ok=True)
+
+    # save report
+    with open(l_args.output, "w", encoding="UTF8") as lfh:
+        json.dump(ldct_report, lfh, indent=2)
+
+    # show summary
+    for ls_size, ldct_size in ldct_report["sizes"].items():
+        print(f"\n{ls_size} ({ldct_size['width']}x{ldct_size['height']})")
+        print(f"  {'function':<24}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'fps':>9}{'peak KiB':>10}")
+
+        for ls_name, ldct_stat in ldct_size["functions"].items():
+            print(f"  {ls_name:<24}{ldct_stat['p50_ms']:>9.2f}{ldct_stat['p90_ms']:>9.2f}"
+                  f"{ldct_stat['p99_ms']:>9.2f}{ldct_stat['frames_per_s']:>9.1f}"
+                  f"{ldct_stat['peak_alloc_bytes'] / 1024.:>10.0f}")
+
+    # ok
+    return 0
+
+# ---------------------------------------------------------------------------------------------
+# this is the bootstrap process
+
+if "__main__" == __name__:
+    # logger
+    logging.basicConfig(level=logging.INFO)
+
+    # run application
+    sys.exit(main())
+
+# < the end >----------------------------------------------------------------------------------
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+ga_calibration
+
+relatório de calibração das escalas de análise.  Para uma amostra de imagens, calcula
+cada métrica ga_* na resolução original e nas escalas reduzidas (2, 4, 8), e informa o
+desvio (absoluto e relativo), a correlação com a resolução original e o tempo médio de
+decodificação + extração por imagem em cada escala.  Métricas de gradiente e textura
+crescem com a redução (a mesma borda ocupa menos pixels): os limites dos do_* precisam
+ser recalibrados pela coluna bias, enquanto corr indica se a ordenação das imagens (o
+que importa para o clustering) foi preservada.
+
+uso: python -m analytics.ga_calibration [-n 200] [-o calibration.json] [dir]
+
+2023.may  mlabru  initial version (Linux/Python)
+"""
+# < imports >----------------------------------------------------------------------------------
+
+# python library
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+# numPy
+import numpy as np
+
+# analytics (os módulos ga_* registram seus extratores em ga_features)
+import analytics.ga_analise_contraste as ac
+import analytics.ga_analise_textura as at
+import analytics.ga_features as gf
+import analytics.ga_filtro_alta_frequencia as faf
+import analytics.ga_filtro_contraste as fc
+import analytics.ga_modelo_cores as mc
+
+# < constants >--------------------------------------------------------------------------------
+
+# diretório contendo as imagens
+DS_DIR_IMG = "data/shots/cap/SBGR-28/"
+
+# default sample size
+D_SAMPLE = 200
+
+# default report file
+DS_REPORT = "./data/calibration.json"
+
+# < logging >----------------------------------------------------------------------------------
+
+# logger
+M_LOG = logging.getLogger(__name__)
+M_LOG.setLevel(logging.INFO)
+
+# ---------------------------------------------------------------------------------------------
+def arg_parse():
+    """
+    parse command line arguments
+    arguments parse: <sample> <output> <dir>
+
+    :returns: arguments
+    """
+    # create parser
+    l_parser = argparse.ArgumentParser(description="ga_calibration. Metric drift per analysis scale.")
+    assert l_parser
+
+    # args
+    l_parser.add_argument("-n", "--sample", help=f"number of images to sample. [{D_SAMPLE}]",
+                          default=D_SAMPLE, dest="sample", type=int)
+    l_parser.add_argument("-o", "--output", help=f"JSON report file. [{DS_REPORT}]",
+                          default=DS_REPORT, dest="output")
+    l_parser.add_argument("dir", help=f"images directory. [{DS_DIR_IMG}]",
+                          default=DS_DIR_IMG, nargs="?")
+
+    # return arguments
+    return l_parser.parse_args()
+
+# ---------------------------------------------------------------------------------------------
+def measure(flst_paths: list, flst_names: list, fi_scale: int):
+    """
+    calcula as métricas de todas as imagens numa escala
+
+    :param flst_paths: caminhos das imagens
+    :param flst_names: nomes dos extratores
+    :param fi_scale: escala de análise
+
+    :returns: (array (imagens, métricas), tempo médio por imagem em segundos)
+    """
+    # decodifica em cinza se nenhum extrator precisa de cores
+    lv_color = gf.needs_color(flst_names)
+
+    # resultados
+    llst_rows = []
+
+    # tempo inicial (sec)
+    lf_ini = time.perf_counter()
+
+    for ls_path in flst_paths:
+        # carrega a imagem na escala de análise
+        l_image = gf.imread(ls_path, fi_scale, lv_color)
+
+        # calcula as métricas
+        llst_rows.append(gf.extract(l_image, flst_names))
+
+    # elapsed time (sec)
+    lf_dt = time.perf_counter() - lf_ini
+
+    # return metrics and mean time
+    return np.asarray(llst_rows, dtype=np.float64), lf_dt / max(1, len(flst_paths))
+
+# ---------------------------------------------------------------------------------------------
+def drift(f_ref, f_val) -> dict:
+    """
+    estatísticas de desvio de uma métrica em relação à resolução original
+
+    :param f_ref: valores na resolução original
+    :param f_val: valores na escala reduzida
+
+    :returns: dicionário de estatísticas
+    """
+    # desvio absoluto e relativo
+    l_abs = np.abs(f_val - f_ref)
+    l_rel = l_abs / np.maximum(np.abs(f_ref), 1e-12)
+
+    # correlação (indefinida para séries constantes)
+    lf_corr = float(np.corrcoef(f_ref, f_val)[0, 1]) if len(f_ref) > 1 and \
+              np.std(f_ref) > 0 and np.std(f_val) > 0 else float("nan")
+
+    # return statistics
+    return {"mean_abs": float(np.mean(l_abs)),
+            "max_abs": float(np.max(l_abs)),
+            "mean_rel": float(np.mean(l_rel)),
+            "p95_rel": float(np.percentile(l_rel, 95)),
+            "max_rel": float(np.max(l_rel)),
+            "mean_bias": float(np.mean(f_val - f_ref)),
+            "corr": lf_corr}
+
+# ---------------------------------------------------------------------------------------------
+def calibrate(flst_paths: list, flst_names: list) -> dict:
+    """
+    gera o relatório de calibração
+
+    :param flst_paths: caminhos das imagens
+    :param flst_names: nomes dos extratores
+
+    :returns: relatório {"images", "scales": {scale: {"sec_per_image", "speedup", "metrics"}}}
+    """
+    # métricas na resolução original
+    l_ref, lf_ref_time = measure(flst_paths, flst_names, 1)
+
+    # relatório
+    ldct_report = {"images": len(flst_paths), "scales": {}}
+
+    for li_scale in sorted(gf.DDCT_SCALES):
+        # métricas na escala
+        l_val, lf_time = (l_ref, lf_ref_time) if 1 == li_scale else \
+                         measure(flst_paths, flst_names, li_scale)
+
+        # desvio por métrica
+        ldct_report["scales"][str(li_scale)] = {
+            "sec_per_image": lf_time,
+            "speedup": lf_ref_time / lf_time if lf_time > 0 else float("nan"),
+            "metrics": {ls_name: drift(l_ref[:, li_ndx], l_val[:, li_ndx])
+                        for li_ndx, ls_name in enumerate(flst_names)}}
+
+    # return report
+    return ldct_report
+
+# ---------------------------------------------------------------------------------------------
+def print_report(fdct_report: dict) -> None:
+    """
+    imprime o relatório como tabela
+    """
+    print(f"calibration over {fdct_report['images']} images")
+
+    for ls_scale, ldct_scale in fdct_report["scales"].items():
+        print(f"\nscale 1/{ls_scale}: {ldct_scale['sec_per_image'] * 1000.:.2f} ms/image "
+              f"(x{ldct_scale['speedup']:.1f})")
+        print(f"  {'metric':<20}{'mean_rel':>10}{'p95_rel':>10}{'max_rel':>10}{'bias':>12}{'corr':>8}")
+
+        for ls_name, ldct_drift in ldct_scale["metrics"].items():
+            print(f"  {ls_name:<20}{ldct_drift['mean_rel']:>10.4f}{ldct_drift['p95_rel']:>10.4f}"
+                  f"{ldct_drift['max_rel']:>10.4f}{ldct_drift['mean_bias']:>12.4f}"
+                  f"{ldct_drift['corr']:>8.4f}")
+
+# ---------------------------------------------------------------------------------------------
+def main():
+    """
+    main
+    """
+    # get program arguments
+    l_args = arg_parse()
+
+    # amostra (ordenada e espaçada uniformemente) das imagens do diretório
+    llst_fnames = sorted(ls_fname for ls_fname in os.listdir(l_args.dir)
+                         if ls_fname.endswith(".jpg") or ls_fname.endswith(".png"))
+    llst_fnames = llst_fnames[::max(1, len(llst_fnames) // max(1, l_args.sample))][:l_args.sample]
+
+    if not llst_fnames:
+        # logger
+        M_LOG.error("no images found in %s", l_args.dir)
+        # quit error
+        return 1
+
+    # todos os extratores registrados
+    llst_names = sorted(gf.gdct_features)
+
+    # gera o relatório
+    ldct_report = calibrate([os.path.join(l_args.dir, ls_fname) for ls_fname in llst_fnames],
+                            llst_names)
+
+    # save report
+    with open(l_args.output, "w", encoding="UTF8") as lfh:
+        json.dump(ldct_report, lfh, indent=2)
+
+    # show report
+    print_report(ldct_report)
+
+    # ok
+    return 0
+
+# ---------------------------------------------------------------------------------------------
+# this is the bootstrap process
+
+if "__main__" == __name__:
+    # logger
+    logging.basicConfig(level=logging.INFO)
+
+    # run application
+    sys.exit(main())
+
+# < the end >----------------------------------------------------------------------------------
@@ -0,0 +1,386 @@
+# -*- coding: utf-8 -*-
+"""
+ga_embeddings
+
+embeddings profundos das imagens capturadas.  Os quadros passam em lotes pela MobileNet
+SSD do gor_ia (um único forward por lote, blobFromImages) até uma camada intermediária
+do backbone; o mapa de ativações é reduzido por average pooling global a um vetor de
+tamanho fixo (1024 para conv13).
+
+Os vetores ficam num cache em disco, lido por np.memmap: vectors.bin (float32, linhas x
+dim), filename.bin (S64, a chave de cada linha) e meta.json.  A extração é incremental:
+somente as imagens ainda não presentes no cache são processadas, e cada lote é anexado
+ao final do cache (uma interrupção perde no máximo o lote corrente).  Imagens ilegíveis
+são registradas em skipped.txt (uma por linha) e não são tentadas de novo.
+
+uso: python -m analytics.ga_embeddings [-b 32] [-l conv13] [dir]
+
+2023.may  mlabru  initial version (Linux/Python)
+"""
+# < imports >----------------------------------------------------------------------------------
+
+# python library
+import argparse
+import json
+import logging
+import os
+import sys
+
+# numPy
+import numpy as np
+# openCV
+import cv2
+
+# < constants >--------------------------------------------------------------------------------
+
+# versão do formato
+DI_VERSION = 1
+
+# diretório do cache de embeddings
+DS_EMBED = "./data/fog-embeddings/"
+
+# diretório contendo as imagens
+DS_DIR_IMG = "data/shots/cap/SBGR-28/"
+
+# path to Caffe pre-trained model and 'deploy' prototxt file (mesmos do gorfog)
+DS_MODEL = "models/MobileNetSSD_deploy.caffemodel"
+DS_PROTO = "models/MobileNetSSD_deploy.prototxt.txt"
+
+# camada intermediária (última do backbone MobileNet: 1024 x 10 x 10)
+DS_LAYER = "conv13"
+
+# default number of images per forward pass
+D_BATCH = 32
+
+# entrada da MobileNet SSD (mesma normalização do gor_ia.detect)
+DT_SIZE = (300, 300)
+DF_SCALE = 0.007843
+DF_MEAN = 127.5
+
+# arquivos do cache
+DS_META = "meta.json"
+DS_VECTORS = "vectors.bin"
+DS_FNAMES = "filename.bin"
+DS_SKIPPED = "skipped.txt"
+
+# tipo das chaves
+DS_FNAME_DTYPE = "S64"
+
+# < logging >----------------------------------------------------------------------------------
+
+# logger
+M_LOG = logging.getLogger(__name__)
+M_LOG.setLevel(logging.INFO)
+
+# ---------------------------------------------------------------------------------------------
+def arg_parse():
+    """
+    parse command line arguments
+    arguments parse: <batch> <layer> <output> <model> <proto> <dir>
+
+    :returns: arguments
+    """
+    # create parser
+    l_parser = argparse.ArgumentParser(description="ga_embeddings. MobileNet SSD image embeddings.")
+    assert l_parser
+
+    # args
+    l_parser.add_argument("-b", "--batch", help=f"images per forward pass. [{D_BATCH}]",
+                          default=D_BATCH, dest="batch", type=int)
+    l_parser.add_argument("-l", "--layer", help=f"intermediate layer to pool. [{DS_LAYER}]",
+                          default=DS_LAYER, dest="layer")
+    l_parser.add_argument("-o", "--output", help=f"embeddings cache directory. [{DS_EMBED}]",
+                          default=DS_EMBED, dest="output")
+    l_parser.add_argument("-m", "--model", help=f"path to Caffe pre-trained model. [{DS_MODEL}]",
+                          default=DS_MODEL, dest="model")
+    l_parser.add_argument("-p", "--prototxt", help=f"path to Caffe prototxt file. [{DS_PROTO}]",
+                          default=DS_PROTO, dest="proto")
+    l_parser.add_argument("dir", help=f"images directory. [{DS_DIR_IMG}]", nargs="?",
+                          default=DS_DIR_IMG)
+
+    # return arguments
+    return l_parser.parse_args()
+
+# ---------------------------------------------------------------------------------------------
+def load_meta(fs_dir: str) -> dict:
+    """
+    carrega os metadados do cache
+
+    :param fs_dir: diretório do cache
+
+    :returns: {version, layer, dim, nrows} ou None se não existe
+    """
+    # caminho dos metadados
+    ls_meta = os.path.join(fs_dir, DS_META)
+
+    # não existe ?
+    if not os.path.isfile(ls_meta):
+        return None
+
+    # open meta
+    with open(ls_meta, "r", encoding="UTF8") as lfh:
+        # load meta
+        ldct_meta = json.load(lfh)
+
+    # versão diferente ?
+    if ldct_meta.get("version") != DI_VERSION:
+        # raise error
+        raise ValueError(f"Unsupported embeddings cache version in {fs_dir}")
+
+    # return meta
+    return ldct_meta
+
+# ---------------------------------------------------------------------------------------------
+def _save_meta(fs_dir: str, fs_layer: str, fi_dim: int, fi_nrows: int) -> None:
+    """
+    salva os metadados (escrita atômica; confirma as linhas anexadas)
+    """
+    # arquivo temporário
+    ls_tmp = os.path.join(fs_dir, DS_META + ".tmp")
+
+    # create temporary file
+    with open(ls_tmp, "w", encoding="UTF8") as lfh:
+        # save meta
+        json.dump({"version": DI_VERSION, "layer": fs_layer, "dim": fi_dim, "nrows": fi_nrows}, lfh)
+
+    # replace meta
+    os.replace(ls_tmp, os.path.join(fs_dir, DS_META))
+
+# ---------------------------------------------------------------------------------------------
+def load(fs_dir: str = DS_EMBED):
+    """
+    abre o cache por memory-map (somente leitura)
+
+    :param fs_dir: diretório do cache
+
+    :returns: (filenames (S64, nrows), vectors (float32, nrows x dim))
+    """
+    # metadados
+    ldct_meta = load_meta(fs_dir)
+
+    # não existe ?
+    if ldct_meta is None:
+        # raise error
+        raise FileNotFoundError(f"No embeddings cache in {fs_dir}")
+
+    # dimensões
+    li_nrows, li_dim = ldct_meta["nrows"], ldct_meta["dim"]
+
+    # cache vazio (memmap não aceita arquivos vazios)
+    if 0 == li_nrows:
+        return np.empty(0, dtype=DS_FNAME_DTYPE), np.empty((0, li_dim), dtype=np.float32)
+
+    # return memory-mapped keys and vectors
+    return (np.memmap(os.path.join(fs_dir, DS_FNAMES), dtype=DS_FNAME_DTYPE, mode="r",
+                      shape=(li_nrows,)),
+            np.memmap(os.path.join(fs_dir, DS_VECTORS), dtype=np.float32, mode="r",
+                      shape=(li_nrows, li_dim)))
+
+# ---------------------------------------------------------------------------------------------
+def check_fnames(flst_fnames: list) -> None:
+    """
+    verifica se os nomes cabem na chave de tamanho fixo (o S64 truncaria sem aviso)
+
+    :param flst_fnames: nomes dos arquivos de imagem
+    """
+    # tamanho da chave (bytes)
+    li_size = np.dtype(DS_FNAME_DTYPE).itemsize
+
+    for ls_fname in flst_fnames:
+        # nome longo demais ?
+        if len(ls_fname.encode("UTF8")) > li_size:
+            # raise error
+            raise ValueError(f"File name longer than {li_size} bytes: {ls_fname}")
+
+# ---------------------------------------------------------------------------------------------
+def load_skipped(fs_dir: str = DS_EMBED) -> set:
+    """
+    imagens ilegíveis já registradas
+
+    :param fs_dir: diretório do cache
+
+    :returns: conjunto de nomes
+    """
+    # caminho do registro
+    ls_skipped = os.path.join(fs_dir, DS_SKIPPED)
+
+    # não existe ?
+    if not os.path.isfile(ls_skipped):
+        return set()
+
+    # open file
+    with open(ls_skipped, "r", encoding="UTF8") as lfh:
+        # return names
+        return {ls_line.strip() for ls_line in lfh if ls_line.strip()}
+
+# ---------------------------------------------------------------------------------------------
+def _skip(fs_dir: str, fs_fname: str) -> None:
+    """
+    registra uma imagem ilegível (não será tentada de novo)
+    """
+    # logger
+    M_LOG.warning("unreadable image skipped: %s", fs_fname)
+
+    # open file (cria se não existe)
+    with open(os.path.join(fs_dir, DS_SKIPPED), "a", encoding="UTF8") as lfh:
+        # append name
+        lfh.write(fs_fname + "\n")
+
+# ---------------------------------------------------------------------------------------------
+def _append(fs_dir: str, fs_layer: str, flst_fnames: list, f_vectors, fi_nrows: int) -> int:
+    """
+    anexa um lote ao cache
+
+    :returns: novo número de linhas
+    """
+    # vetores e chaves do lote
+    for ls_file, l_data in ((DS_VECTORS, np.ascontiguousarray(f_vectors, dtype=np.float32)),
+                            (DS_FNAMES, np.array(flst_fnames, dtype=DS_FNAME_DTYPE))):
+        # open file (cria se não existe)
+        with open(os.path.join(fs_dir, ls_file), "a+b") as lfh:
+            # descarta bytes de uma gravação interrompida
+            lfh.truncate(fi_nrows * (l_data.nbytes // len(l_data)))
+            lfh.seek(0, os.SEEK_END)
+
+            # append batch
+            lfh.write(l_data.tobytes())
+
+    # save meta (confirma as novas linhas)
+    _save_meta(fs_dir, fs_layer, f_vectors.shape[1], fi_nrows + len(flst_fnames))
+
+    # return number of rows
+    return fi_nrows + len(flst_fnames)
+
+# ---------------------------------------------------------------------------------------------
+def load_net(fs_proto: str = DS_PROTO, fs_model: str = DS_MODEL):
+    """
+    carrega a MobileNet SSD (mesma rede do gor_ia)
+    """
+    # return model
+    return cv2.dnn.readNetFromCaffe(fs_proto, fs_model)
+
+# ---------------------------------------------------------------------------------------------
+def embed_batch(f_net, flst_images: list, fs_layer: str = DS_LAYER):
+    """
+    embeddings de um lote de imagens (um único forward)
+
+    :param f_net: MobileNet SSD
+    :param flst_images: imagens BGR
+    :param fs_layer: camada intermediária
+
+    :returns: array (imagens x canais) float32, average pooling global das ativações
+    """
+    # lote de entrada (redimensiona e normaliza como em gor_ia.detect)
+    l_blob = cv2.dnn.blobFromImages(flst_images, DF_SCALE, DT_SIZE, DF_MEAN)
+
+    # forward pass até a camada intermediária
+    f_net.setInput(l_blob)
+    l_act = f_net.forward(fs_layer)
+
+    # return pooled vectors (N x C x H x W -> N x C)
+    return l_act.reshape(l_act.shape[0], l_act.shape[1], -1).mean(axis=2, dtype=np.float32)
+
+# ---------------------------------------------------------------------------------------------
+def extract(f_net, fs_dir_img: str, flst_fnames: list, fs_dir: str = DS_EMBED,
+            fi_batch: int = D_BATCH, fs_layer: str = DS_LAYER) -> int:
+    """
+    extração incremental: processa em lotes as imagens ainda não presentes no cache
+
+    :param f_net: MobileNet SSD
+    :param fs_dir_img: diretório de imagens
+    :param flst_fnames: nomes dos arquivos de imagem
+    :param fs_dir: diretório do cache
+    :param fi_batch: imagens por forward
+    :param fs_layer: camada intermediária
+
+    :returns: número de imagens processadas
+    """
+    # cria o diretório
+    os.makedirs(fs_dir, exist_ok=True)
+
+    # cache atual
+    ldct_meta = load_meta(fs_dir)
+
+    # cache de outra camada ?
+    if ldct_meta is not None and ldct_meta["layer"] != fs_layer:
+        # raise error
+        raise ValueError(f"Embeddings cache in {fs_dir} is for layer {ldct_meta['layer']}")
+
+    # imagens já no cache
+    li_nrows = ldct_meta["nrows"] if ldct_meta else 0
+    lset_done = set(load(fs_dir)[0].astype(str).tolist()) if li_nrows else set()
+
+    # imagens ilegíveis já registradas
+    lset_skipped = load_skipped(fs_dir)
+
+    if lset_skipped:
+        # logger
+        M_LOG.info("%d unreadable images ignored (see %s)", len(lset_skipped), DS_SKIPPED)
+
+    # imagens novas
+    llst_todo = [ls_fname for ls_fname in flst_fnames
+                 if ls_fname not in lset_done and ls_fname not in lset_skipped]
+    M_LOG.info("embedding %d of %d images", len(llst_todo), len(flst_fnames))
+
+    # as chaves cabem no cache ? (falha antes de processar qualquer lote)
+    check_fnames(llst_todo)
+
+    for li_ini in range(0, len(llst_todo), max(1, fi_batch)):
+        # lote de imagens
+        llst_names = []
+        llst_images = []
+
+        for ls_fname in llst_todo[li_ini:li_ini + max(1, fi_batch)]:
+            # load image
+            l_image = cv2.imread(os.path.join(fs_dir_img, ls_fname), cv2.IMREAD_COLOR)
+
+            if l_image is None:
+                # registra e não tenta de novo
+                _skip(fs_dir, ls_fname)
+                # next image
+                continue
+
+            llst_names.append(ls_fname)
+            llst_images.append(l_image)
+
+        # lote vazio ?
+        if not llst_images:
+            continue
+
+        # embed and append batch
+        li_nrows = _append(fs_dir, fs_layer, llst_names, embed_batch(f_net, llst_images, fs_layer),
+                           li_nrows)
+
+    # return number of processed images
+    return len(llst_todo)
+
+# ---------------------------------------------------------------------------------------------
+def main():
+    """
+    main
+    """
+    # get program arguments
+    l_args = arg_parse()
+
+    # imagens do diretório (ordem do nome)
+    llst_fnames = sorted(ls_fname for ls_fname in os.listdir(l_args.dir)
+                         if ls_fname.endswith(".jpg") or ls_fname.endswith(".png"))
+
+    # extração incremental
+    extract(load_net(l_args.proto, l_args.model), l_args.dir, llst_fnames, l_args.output,
+            l_args.batch, l_args.layer)
+
+    # ok
+    return 0
+
+# ---------------------------------------------------------------------------------------------
+# this is the bootstrap process
+
+if "__main__" == __name__:
+    # logger
+    logging.basicConfig(level=logging.INFO)
+
+    # run application
+    sys.exit(main())
+
+# < the end >----------------------------------------------------------------------------------
@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+"""
+ga_features
+
+registro dos extratores de características e contexto por imagem.  Cada extrator declara
+os intermediários de que precisa (gray, hsv, sobel, blur) e o contexto calcula cada
+intermediário uma única vez por imagem, compartilhando-o entre todos os extratores.
+
+2023.may  mlabru  initial version (Linux/Python)
+"""
+# < imports >----------------------------------------------------------------------------------
+
+# python library
+import logging
+
+# openCV
+import cv2
+
+# < logging >----------------------------------------------------------------------------------
+
+# logger
+M_LOG = logging.getLogger(__name__)
+M_LOG.setLevel(logging.WARNING)
+
+# < global data >------------------------------------------------------------------------------
+
+# extratores registrados {name: (column, function, needs)}
+gdct_features = {}
+
+# ---------------------------------------------------------------------------------------------
+def _calc_gray(f_ctx):
+    """
+    converte a imagem para escala de cinza
+    """
+    # imagem já está em escala de cinza ?
+    if 2 == f_ctx.image.ndim:
+        # nada a converter
+        return f_ctx.image
+
+    # converte a imagem para escala de cinza
+    return cv2.cvtColor(f_ctx.image, cv2.COLOR_BGR2GRAY)
+
+# ---------------------------------------------------------------------------------------------
+def _calc_hsv(f_ctx):
+    """
+    converte a imagem para o espaço de cores HSV
+    """
+    # converte a imagem para o espaço de cores HSV
+    return cv2.cvtColor(f_ctx.image, cv2.COLOR_BGR2HSV)
+
+# ---------------------------------------------------------------------------------------------
+def _calc_sobel(f_ctx):
+    """
+    calcula as derivadas parciais (x, y) da imagem em escala de cinza (float32)
+    """
+    # imagem em escala de cinza
+    l_gray = f_ctx.get("gray")
+
+    # derivadas parciais nas direções x e y
+    l_grad_x = cv2.Sobel(l_gray, cv2.CV_32F, 1, 0, ksize=3)
+    l_grad_y = cv2.Sobel(l_gray, cv2.CV_32F, 0, 1, ksize=3)
+
+    # retorna as derivadas parciais
+    return l_grad_x, l_grad_y
+
+# ---------------------------------------------------------------------------------------------
+def _calc_blur(f_ctx):
+    """
+    aplica filtro de média (5x5) para suavizar a imagem em escala de cinza
+    """
+    # aplica filtro de média para suavizar a imagem
+    return cv2.blur(f_ctx.get("gray"), (5, 5))
+
+# < constants >--------------------------------------------------------------------------------
+
+# intermediários disponíveis {name: function}
+DDCT_INTERMEDIATES = {"gray": _calc_gray,
+                      "hsv": _calc_hsv,
+                      "sobel": _calc_sobel,
+                      "blur": _calc_blur}
+
+# intermediários que precisam da imagem colorida
+DSET_COLOR_NEEDS = {"hsv"}
+
+# escalas de análise suportadas {scale: (flag color, flag gray)}
+DDCT_SCALES = {1: (cv2.IMREAD_COLOR, cv2.IMREAD_COLOR),
+               2: (cv2.IMREAD_REDUCED_COLOR_2, cv2.IMREAD_REDUCED_GRAYSCALE_2),
+               4: (cv2.IMREAD_REDUCED_COLOR_4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+               8: (cv2.IMREAD_REDUCED_COLOR_8, cv2.IMREAD_REDUCED_GRAYSCALE_8)}
+
+# =============================================================================================
+class FeatureContext:
+    """
+    contexto por imagem. Calcula cada intermediário sob demanda e apenas uma vez
+    """
+    # -----------------------------------------------------------------------------------------
+    def __init__(self, f_image):
+        """
+        constructor
+
+        :param f_image: imagem BGR (ou escala de cinza) a analisar
+        """
+        # imagem original
+        self.image = f_image
+
+        # intermediários já calculados
+        self._dct_cache = {}
+
+    # -----------------------------------------------------------------------------------------
+    def get(self, fs_name: str):
+        """
+        retorna o intermediário, calculando-o na primeira vez
+
+        :param fs_name: nome do intermediário (gray, hsv, sobel, blur)
+
+        :returns: intermediário
+        """
+        # ainda não calculado ?
+        if fs_name not in self._dct_cache:
+            # intermediário desconhecido ?
+            if fs_name not in DDCT_INTERMEDIATES:
+                # raise error
+                raise ValueError(f"Unknown intermediate: {fs_name}")
+
+            # calcula e guarda o intermediário
+            self._dct_cache[fs_name] = DDCT_INTERMEDIATES[fs_name](self)
+
+        # retorna o intermediário
+        return self._dct_cache[fs_name]
+
+    # -----------------------------------------------------------------------------------------
+    def prepare(self, flst_needs):
+        """
+        calcula antecipadamente os intermediários necessários
+
+        :param flst_needs: lista de intermediários
+        """
+        for ls_name in flst_needs:
+            # calcula o intermediário
+            self.get(ls_name)
+
+# ---------------------------------------------------------------------------------------------
+def register(fs_name: str, fs_column: str, flst_needs: tuple = ()):
+    """
+    decorator que registra um extrator de características
+
+    :param fs_name: nome do extrator (i.e. diretório de links)
+    :param fs_column: nome da coluna no arquivo de resultados
+    :param flst_needs: intermediários necessários ao extrator
+
+    :returns: decorator
+    """
+    def _decorator(f_func):
+        # intermediário desconhecido ?
+        for ls_need in flst_needs:
+            assert ls_need in DDCT_INTERMEDIATES, ls_need
+
+        # registra o extrator
+        gdct_features[fs_name] = (fs_column, f_func, tuple(flst_needs))
+
+        # retorna a função original
+        return f_func
+
+    # return decorator
+    return _decorator
+
+# ---------------------------------------------------------------------------------------------
+def needs_color(flst_names: list) -> bool:
+    """
+    verifica se algum dos extratores selecionados precisa da imagem colorida
+
+    :param flst_names: nomes dos extratores
+
+    :returns: True se precisa decodificar em cores, False se escala de cinza basta
+    """
+    # return if any extractor needs color
+    return any(DSET_COLOR_NEEDS.intersection(gdct_features[ls_name][2]) for ls_name in flst_names)
+
+# ---------------------------------------------------------------------------------------------
+def imread(fs_path: str, fi_scale: int = 1, fv_color: bool = True):
+    """
+    carrega a imagem na escala de análise, usando a decodificação reduzida do openCV.
+    Na escala 1 a imagem é sempre decodificada em cores e convertida com cvtColor, de modo
+    que as métricas originais são reproduzidas exatamente (a decodificação direta em cinza
+    difere de cvtColor em até 2 níveis)
+
+    :param fs_path: caminho da imagem
+    :param fi_scale: fator de redução (1, 2, 4 ou 8)
+    :param fv_color: True decodifica em cores (BGR), False em escala de cinza
+
+    :returns: imagem (ou None se não puder ser lida)
+    """
+    # escala suportada ?
+    if fi_scale not in DDCT_SCALES:
+        # raise error
+        raise ValueError(f"Unsupported analysis scale: {fi_scale}")
+
+    # carrega a imagem reduzida
+    l_image = cv2.imread(fs_path, DDCT_SCALES[fi_scale][0 if fv_color else 1])
+
+    # escala de cinza pedida, mas decodificada em cores (escala 1) ?
+    if not fv_color and l_image is not None and 3 == l_image.ndim:
+        # converte a imagem para escala de cinza
+        l_image = cv2.cvtColor(l_image, cv2.COLOR_BGR2GRAY)
+
+    # return image
+    return l_image
+
+# ---------------------------------------------------------------------------------------------
+def downscale(f_image, fi_scale: int = 1):
+    """
+    reduz uma imagem já decodificada por pirâmide gaussiana (p.ex. frames de vídeo)
+
+    :param f_image: imagem
+    :param fi_scale: fator de redução (1, 2, 4 ou 8)
+
+    :returns: imagem reduzida
+    """
+    # escala suportada ?
+    if fi_scale not in DDCT_SCALES:
+        # raise error
+        raise ValueError(f"Unsupported analysis scale: {fi_scale}")
+
+    # cada nível da pirâmide reduz pela metade
+    while fi_scale > 1:
+        # reduz a imagem
+        f_image = cv2.pyrDown(f_image)
+        fi_scale //= 2
+
+    # return image
+    return f_image
+
+# ---------------------------------------------------------------------------------------------
+def extract(f_image, flst_names: list) -> list:
+    """
+    calcula os extratores selecionados compartilhando os intermediários
+
+    :param f_image: imagem a analisar
+    :param flst_names: nomes dos extratores (na ordem desejada)
+
+    :returns: lista de resultados (na mesma ordem)
+    """
+    # cria o contexto da imagem e calcula os extratores
+    return extract_ctx(FeatureContext(f_image), flst_names)
+
+# ---------------------------------------------------------------------------------------------
+def extract_ctx(f_ctx, flst_names: list) -> list:
+    """
+    calcula os extratores selecionados sobre um contexto já criado
+
+    :param f_ctx: contexto da imagem
+    :param flst_names: nomes dos extratores (na ordem desejada)
+
+    :returns: lista de resultados (na mesma ordem)
+    """
+    for ls_name in flst_names:
+        # calcula os intermediários declarados pelo extrator
+        f_ctx.prepare(gdct_features[ls_name][2])
+
+    # retorna os resultados
+    return [float(gdct_features[ls_name][1](f_ctx)) for ls_name in flst_names]
+
+# ---------------------------------------------------------------------------------------------
+def header(flst_names: list) -> list:
+    """
+    retorna os nomes das colunas dos extratores selecionados
+
+    :param flst_names: nomes dos extratores
+
+    :returns: lista de nomes de colunas
+    """
+    # retorna os nomes das colunas
+    return [gdct_features[ls_name][0] for ls_name in flst_names]
+
+# < the end >----------------------------------------------------------------------------------
@@ -23,6 +23,9 @@ import numpy as np
 # openCV
 import cv2
 
+# local
+import analytics.ga_features as gf
+
 # < logging >----------------------------------------------------------------------------------
 
 # logger
@@ -42,14 +45,22 @@ def filtro_alta_frequencia(f_image, fi_threshold: int = 50) -> float:
     # logger
     M_LOG.info(">> filtro_alta_frequencia")
 
-    # converte a imagem para escala de cinza
-    l_gray = cv2.cvtColor(f_image, cv2.COLOR_BGR2GRAY)
+    # retorna a porcentagem de pixels desfocados
+    return filtro_alta_frequencia_ctx(gf.FeatureContext(f_image), fi_threshold)
 
-    # aplica filtro de média para suavizar a imagem
-    l_blurred = cv2.blur(l_gray, (5, 5))
+# ---------------------------------------------------------------------------------------------
+@gf.register("alta_frequencia", "percentage", ("gray", "blur"))
+def filtro_alta_frequencia_ctx(f_ctx, fi_threshold: int = 50) -> float:
+    """ 
+    técnica de filtro de alta frequência sobre o contexto compartilhado da imagem
+    
+    :param f_ctx: contexto da imagem (ga_features.FeatureContext)
+    :param fi_threshold: limiar de binarização da diferença
 
+    :returns: porcentagem de pixels desfocados
+    """ 
     # calcula a diferença entre a imagem original e a imagem suavizada
-    l_diff = cv2.absdiff(l_gray, l_blurred)
+    l_diff = cv2.absdiff(f_ctx.get("gray"), f_ctx.get("blur"))
 
     # binariza a diferença usando um limiar
     _, l_binary = cv2.threshold(l_diff, fi_threshold, 255, cv2.THRESH_BINARY)
@@ -64,20 +75,21 @@ def filtro_alta_frequencia(f_image, fi_threshold: int = 50) -> float:
     return (l_num_white_pixels / (l_height * l_width)) * 100
 
 # ---------------------------------------------------------------------------------------------
-def do_filtro_alta_frequencia(fs_image_path: str, fi_threshold: int = 50) -> bool:
+def do_filtro_alta_frequencia(fs_image_path: str, fi_threshold: int = 50, fi_scale: int = 1) -> bool:
     """ 
     técnica de filtro de alta frequência
     
     :param fs_image_path: path da imagem a analisar
     :param fi_threshold: limite que define o nível de sensibilidade da detecção
+    :param fi_scale: escala de análise (1, 2, 4 ou 8; ver ga_calibration)
 
     :returns: True indica que o nevoeiro foi detectado. False, senão.
     """ 
     # logger
     M_LOG.info(">> do_filtro_alta_frequencia")
 
-    # carrega a imagem
-    l_image = cv2.imread(fs_image_path)
+    # carrega a imagem em escala de cinza, na escala de análise
+    l_image = gf.imread(fs_image_path, fi_scale, fv_color=False)
 
     # retorna se a porcentagem de pixels desfocados está acima do limite (i.e. nevoeiro detectado)
     return filtro_alta_frequencia(l_image) > fi_threshold
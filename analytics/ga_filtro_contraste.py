@@ -20,8 +20,9 @@ import logging
 
 # numPy
 import numpy as np
-# openCV
-import cv2
+
+# local
+import analytics.ga_features as gf
 
 # < logging >----------------------------------------------------------------------------------
 
@@ -43,35 +44,49 @@ def filtro_contraste(f_image) -> float:
     # logger
     M_LOG.info(">> filtro_contraste")
 
-    # converte a imagem para escala de cinza
-    l_gray = cv2.cvtColor(f_image, cv2.COLOR_BGR2GRAY)
+    # retorna a média do contraste local
+    return filtro_contraste_ctx(gf.FeatureContext(f_image))
+
+# ---------------------------------------------------------------------------------------------
+@gf.register("filtro_contraste", "mean_contrast", ("sobel",))
+def filtro_contraste_ctx(f_ctx) -> float:
+    """ 
+    filtro de contraste sobre o contexto compartilhado da imagem
+
+    :param f_ctx: contexto da imagem (ga_features.FeatureContext)
 
-    # calcula o contraste local usando o filtro de Sobel
-    l_grad_x = cv2.Sobel(l_gray, cv2.CV_64F, 1, 0, ksize=3)
-    l_grad_y = cv2.Sobel(l_gray, cv2.CV_64F, 0, 1, ksize=3)
+    :returns: média do contraste local
+    """
+    # derivadas parciais calculadas pelo filtro de Sobel (float32)
+    l_grad_x, l_grad_y = f_ctx.get("sobel")
 
-    # calcula o contraste local  
-    l_local_contrast = np.sqrt(l_grad_x ** 2 + l_grad_y ** 2)
+    # calcula o contraste local (in-place, sem buffers temporários extras); sqrt do numpy
+    # (arredondamento correto) em vez de cv2.magnitude, cujo caminho SIMD faz o último bit
+    # depender do alinhamento do buffer e tornava o CSV não reprodutível entre execuções
+    l_local_contrast = np.multiply(l_grad_x, l_grad_x)
+    l_local_contrast += np.square(l_grad_y)
+    np.sqrt(l_local_contrast, out=l_local_contrast)
 
-    # retorna a média do contraste local
-    return np.mean(l_local_contrast)
+    # retorna a média do contraste local (acumulada em float64)
+    return np.mean(l_local_contrast, dtype=np.float64)
 
 # ---------------------------------------------------------------------------------------------
-def do_filtro_contraste(fs_image_path: str, fi_threshold: int = 30) -> bool:
+def do_filtro_contraste(fs_image_path: str, fi_threshold: int = 30, fi_scale: int = 1) -> bool:
     """ 
     filtro baseado na diferença de contraste entre regiões para detecção de nevoeiro em
     uma imagem
 
     :param fs_image_path: path da imagem a analisar
     :param fi_threshold: limite que define o nível de sensibilidade da detecção
+    :param fi_scale: escala de análise (1, 2, 4 ou 8; ver ga_calibration)
 
     :returns: True indica que o nevoeiro foi detectado. False, senão.
     """
     # logger
     M_LOG.info(">> do_filtro_contraste")
 
-    # carrega a imagem
-    l_image = cv2.imread(fs_image_path)
+    # carrega a imagem em escala de cinza, na escala de análise
+    l_image = gf.imread(fs_image_path, fi_scale, fv_color=False)
 
     # retorna se a média do contraste está abaixo do limite (i.e. nevoeiro detectado)
     return filtro_contraste(l_image) < fi_threshold
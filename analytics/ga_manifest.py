@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+ga_manifest
+
+manifesto dos arquivos já processados pelo analytics.  Cada entrada é indexada pelo nome
+do arquivo e guarda o tamanho, o mtime e a linha de características calculada, de modo
+que uma execução incremental só processa as imagens novas ou alteradas.
+
+2023.may  mlabru  initial version (Linux/Python)
+"""
+# < imports >----------------------------------------------------------------------------------
+
+# python library
+import json
+import logging
+import os
+
+# < constants >--------------------------------------------------------------------------------
+
+# versão do formato do manifesto
+DI_VERSION = 1
+
+# < logging >----------------------------------------------------------------------------------
+
+# logger
+M_LOG = logging.getLogger(__name__)
+M_LOG.setLevel(logging.WARNING)
+
+# ---------------------------------------------------------------------------------------------
+def file_key(fs_path: str) -> list:
+    """
+    chave de alteração do arquivo
+
+    :param fs_path: caminho do arquivo
+
+    :returns: [tamanho, mtime (ns)]
+    """
+    # status do arquivo
+    l_stat = os.stat(fs_path)
+
+    # return key
+    return [l_stat.st_size, l_stat.st_mtime_ns]
+
+# ---------------------------------------------------------------------------------------------
+def load_manifest(fs_path: str, flst_header: list, fdct_params: dict = None) -> dict:
+    """
+    carrega o manifesto
+
+    :param fs_path: caminho do manifesto
+    :param flst_header: colunas esperadas (manifesto de outras colunas é descartado)
+    :param fdct_params: parâmetros do processamento (p.ex. escala de análise)
+
+    :returns: {filename: [size, mtime, row]} ou vazio
+    """
+    # não existe manifesto ?
+    if not os.path.isfile(fs_path):
+        # manifesto vazio
+        return {}
+
+    try:
+        # open manifest
+        with open(fs_path, "r", encoding="UTF8") as lfh:
+            # load manifest
+            ldct_manifest = json.load(lfh)
+
+    # em caso de erro...
+    except (OSError, ValueError) as lerr:
+        # logger
+        M_LOG.warning("discarding unreadable manifest %s: %s", fs_path, str(lerr))
+        # manifesto vazio
+        return {}
+
+    # formato ou colunas diferentes ?
+    if ldct_manifest.get("version") != DI_VERSION or \
+       ldct_manifest.get("header") != list(flst_header) or \
+       ldct_manifest.get("params", {}) != (fdct_params or {}):
+        # logger
+        M_LOG.warning("manifest %s does not match current features or params, rebuilding.", fs_path)
+        # manifesto vazio
+        return {}
+
+    # return files
+    return ldct_manifest.get("files", {})
+
+# ---------------------------------------------------------------------------------------------
+def save_manifest(fs_path: str, flst_header: list, fdct_files: dict,
+                  fdct_params: dict = None) -> None:
+    """
+    salva o manifesto (escrita atômica)
+
+    :param fs_path: caminho do manifesto
+    :param flst_header: colunas das linhas de características
+    :param fdct_files: {filename: [size, mtime, row]}
+    :param fdct_params: parâmetros do processamento (p.ex. escala de análise)
+    """
+    # arquivo temporário
+    ls_tmp = fs_path + ".tmp"
+
+    # create temporary file
+    with open(ls_tmp, "w", encoding="UTF8") as lfh:
+        # save manifest
+        json.dump({"version": DI_VERSION,
+                   "header": list(flst_header),
+                   "params": fdct_params or {},
+                   "files": fdct_files}, lfh)
+
+    # replace manifest
+    os.replace(ls_tmp, fs_path)
+
+# ---------------------------------------------------------------------------------------------
+def changed(fdct_files: dict, fs_dir: str, flst_fnames: list) -> list:
+    """
+    seleciona os arquivos novos ou alterados desde o último processamento
+
+    :param fdct_files: {filename: [size, mtime, row]}
+    :param fs_dir: diretório dos arquivos
+    :param flst_fnames: lista de nomes de arquivo
+
+    :returns: lista de nomes de arquivo a processar (mesma ordem)
+    """
+    # lista de arquivos a processar
+    llst_todo = []
+
+    for ls_fname in flst_fnames:
+        # entrada no manifesto
+        llst_entry = fdct_files.get(ls_fname)
+
+        # arquivo novo ou alterado ?
+        if llst_entry is None or llst_entry[:2] != file_key(os.path.join(fs_dir, ls_fname)):
+            # processar
+            llst_todo.append(ls_fname)
+
+    # return files to process
+    return llst_todo
+
+# ---------------------------------------------------------------------------------------------
+def merge(fdct_files: dict, fs_dir: str, flst_fnames: list, flst_todo: list,
+          flst_rows: list) -> list:
+    """
+    junta as linhas recém calculadas ao manifesto e remove arquivos que não existem mais
+
+    :param fdct_files: {filename: [size, mtime, row]} (atualizado in-place)
+    :param fs_dir: diretório dos arquivos
+    :param flst_fnames: lista ordenada de todos os arquivos atuais
+    :param flst_todo: arquivos processados nesta execução
+    :param flst_rows: linhas calculadas para flst_todo (mesma ordem)
+
+    :returns: linhas de todos os arquivos atuais, na ordem de flst_fnames
+    """
+    for ls_fname, lt_row in zip(flst_todo, flst_rows):
+        # atualiza a entrada
+        fdct_files[ls_fname] = file_key(os.path.join(fs_dir, ls_fname)) + [list(lt_row)]
+
+    # arquivos atuais
+    lset_current = set(flst_fnames)
+
+    for ls_fname in [ls_key for ls_key in fdct_files if ls_key not in lset_current]:
+        # remove arquivo que não existe mais
+        del fdct_files[ls_fname]
+
+    # return all rows
+    return [fdct_files[ls_fname][2] for ls_fname in flst_fnames]
+
+# < the end >----------------------------------------------------------------------------------
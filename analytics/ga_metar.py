@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+ga_metar
+
+índice de METARs para a junção imagem/METAR.  Os arquivos YYYYmmddHHMMSSZm.txt gravados
+pelo gorcap são lidos e interpretados uma única vez; o índice guarda os instantes (UTC
+epoch seconds) ordenados num array de inteiros, ao lado dos campos interpretados
+(visibilidade, teto).  O METAR de cada imagem é o último gravado até o instante da imagem
+(busca binária), de modo que rotular todo o arquivo de imagens é uma única junção
+vetorizada.
+
+2023.may  mlabru  initial version (Linux/Python)
+"""
+# < imports >----------------------------------------------------------------------------------
+
+# python library
+import logging
+import os
+
+# numPy
+import numpy as np
+
+# analytics
+import analytics.ga_store as gs
+
+# local
+import gor_metar as gmr
+
+# < constants >--------------------------------------------------------------------------------
+
+# idade máxima do METAR de uma imagem (s); METARs são emitidos a cada hora
+DI_MAX_AGE = 2 * 3600
+
+# < logging >----------------------------------------------------------------------------------
+
+# logger
+M_LOG = logging.getLogger(__name__)
+M_LOG.setLevel(logging.WARNING)
+
+# =============================================================================================
+class MetarIndex:
+    """
+    índice de METARs ordenado pelo instante
+    """
+    # -----------------------------------------------------------------------------------------
+    def __init__(self, f_times, fdct_fields: dict):
+        """
+        constructor
+
+        :param f_times: instantes dos METARs (UTC epoch seconds)
+        :param fdct_fields: {name: array} campos interpretados, na mesma ordem de f_times
+        """
+        # ordem dos instantes
+        l_order = np.argsort(np.asarray(f_times, dtype=np.int64), kind="stable")
+
+        # instantes ordenados
+        self.a_times = np.asarray(f_times, dtype=np.int64)[l_order]
+
+        # campos na mesma ordem
+        self.dct_fields = {ls_name: np.asarray(l_field)[l_order]
+                           for ls_name, l_field in fdct_fields.items()}
+
+    # -----------------------------------------------------------------------------------------
+    def __len__(self):
+        """
+        número de METARs
+        """
+        # return size
+        return len(self.a_times)
+
+    # -----------------------------------------------------------------------------------------
+    def lookup(self, f_times, fi_max_age: int = DI_MAX_AGE):
+        """
+        posição do último METAR até cada instante (busca binária)
+
+        :param f_times: instantes das imagens (UTC epoch seconds)
+        :param fi_max_age: idade máxima do METAR (s); None para sem limite
+
+        :returns: array de posições no índice (-1 se não há METAR)
+        """
+        # instantes das imagens
+        l_times = np.asarray(f_times, dtype=np.int64)
+
+        # último METAR com instante <= instante da imagem
+        l_pos = np.searchsorted(self.a_times, l_times, side="right") - 1
+
+        # METAR muito antigo ?
+        if fi_max_age is not None and len(self.a_times):
+            l_pos[l_times - self.a_times[np.maximum(l_pos, 0)] > fi_max_age] = -1
+
+        # instantes inválidos (nome de arquivo sem data)
+        l_pos[l_times < 0] = -1
+
+        # return positions
+        return l_pos
+
+    # -----------------------------------------------------------------------------------------
+    def join(self, fs_name: str, f_times, f_default, fi_max_age: int = DI_MAX_AGE):
+        """
+        valor de um campo para cada instante (junção vetorizada)
+
+        :param fs_name: nome do campo (p.ex. visibility)
+        :param f_times: instantes das imagens (UTC epoch seconds)
+        :param f_default: valor para as imagens sem METAR
+        :param fi_max_age: idade máxima do METAR (s); None para sem limite
+
+        :returns: array de valores
+        """
+        # posições no índice
+        l_pos = self.lookup(f_times, fi_max_age)
+
+        # campo
+        l_field = self.dct_fields[fs_name]
+
+        # valores (default onde não há METAR)
+        l_values = np.full(len(l_pos), f_default, dtype=l_field.dtype)
+        l_values[l_pos >= 0] = l_field[l_pos[l_pos >= 0]]
+
+        # return values
+        return l_values
+
+# ---------------------------------------------------------------------------------------------
+def parse_fields(fs_metar: str, f_cache=None) -> dict:
+    """
+    interpreta um METAR (memorizado por gor_metar)
+
+    :param fs_metar: texto do METAR
+    :param f_cache: gor_metar.MetarCache (None = cache padrão)
+
+    :returns: {name: value} campos do índice
+    """
+    # parse METAR
+    l_record = (f_cache or gmr.go_cache).get(fs_metar)
+
+    # return fields (teto -1 se não há teto)
+    return {"visibility": l_record.visibility,
+            "ceiling": l_record.ceiling if l_record.ceiling is not None else -1}
+
+# ---------------------------------------------------------------------------------------------
+def load_index(fs_dir: str, fs_cache: str = None) -> MetarIndex:
+    """
+    carrega o índice a partir do diretório de METARs (YYYYmmddHHMMSSZm.txt)
+
+    :param fs_dir: diretório de METARs
+    :param fs_cache: cache em disco dos METARs interpretados (None = somente em memória)
+
+    :returns: MetarIndex
+    """
+    # cache dos METARs interpretados (carrega o cache em disco, se houver)
+    l_cache = gmr.MetarCache(fs_cache) if fs_cache else gmr.go_cache
+
+    # instantes e campos
+    llst_times = []
+    llst_vis = []
+    llst_ceiling = []
+
+    for ls_fname in sorted(os.listdir(fs_dir)):
+        # não é um METAR ?
+        if not ls_fname.endswith("m.txt"):
+            # next file
+            continue
+
+        # instante do METAR (data do nome do arquivo)
+        li_time = gs.timestamp(ls_fname)
+
+        if li_time < 0:
+            # logger
+            M_LOG.warning("METAR file without date skipped: %s", ls_fname)
+            # next file
+            continue
+
+        # open METAR file
+        with open(os.path.join(fs_dir, ls_fname), "r", encoding="UTF8") as lfh:
+            # parse METAR
+            ldct_fields = parse_fields(lfh.read().strip(), l_cache)
+
+        # save record
+        llst_times.append(li_time)
+        llst_vis.append(ldct_fields["visibility"])
+        llst_ceiling.append(ldct_fields["ceiling"])
+
+    # save cache
+    l_cache.save()
+
+    # return index
+    return MetarIndex(llst_times, {"visibility": np.array(llst_vis, dtype=np.int32),
+                                   "ceiling": np.array(llst_ceiling, dtype=np.int32)})
+
+# ---------------------------------------------------------------------------------------------
+def image_times(flst_fnames: list):
+    """
+    instantes das imagens a partir dos nomes de arquivo (YYYYmmddHHMMSS...)
+
+    :param flst_fnames: nomes dos arquivos
+
+    :returns: array de UTC epoch seconds (-1 para nomes sem data)
+    """
+    # return timestamps
+    return np.array([gs.timestamp(ls_fname) for ls_fname in flst_fnames], dtype=np.int64)
+
+# < the end >----------------------------------------------------------------------------------
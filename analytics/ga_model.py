@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+ga_model
+
+modelo de clusters persistido (scaler, PCA e centróides ajustados pelo fog_clustering).
+O modelo é gravado num único .npz e carregado sem sklearn; a classificação de um vetor
+de características (ou de um lote) é uma distância ponderada aos centróides, em numpy,
+na ordem de microssegundos por vetor.
+
+2023.may  mlabru  initial version (Linux/Python)
+"""
+# < imports >----------------------------------------------------------------------------------
+
+# python library
+import logging
+import os
+
+# numPy
+import numpy as np
+
+# < constants >--------------------------------------------------------------------------------
+
+# versão do formato
+DI_VERSION = 1
+
+# modelo padrão
+DS_MODEL = "./data/fog-clustering.model.npz"
+
+# < logging >----------------------------------------------------------------------------------
+
+# logger
+M_LOG = logging.getLogger(__name__)
+M_LOG.setLevel(logging.WARNING)
+
+# =============================================================================================
+class ClusterModel:
+    """
+    pipeline scaler + KMeans (+ PCA para projeção) ajustado
+    """
+    # -----------------------------------------------------------------------------------------
+    def __init__(self, flst_names: list, f_mean, f_scale, f_centroids, f_pca_mean=None,
+                 f_pca_components=None):
+        """
+        constructor
+
+        :param flst_names: nomes das colunas de características, na ordem do modelo
+        :param f_mean: médias do scaler
+        :param f_scale: desvios do scaler
+        :param f_centroids: centróides no espaço normalizado (k x features)
+        :param f_pca_mean: média do PCA (espaço normalizado)
+        :param f_pca_components: componentes do PCA (n x features)
+        """
+        # colunas
+        self.lst_names = list(flst_names)
+
+        # parâmetros ajustados
+        self.a_mean = np.asarray(f_mean, dtype=np.float64)
+        self.a_scale = np.asarray(f_scale, dtype=np.float64)
+        self.a_centroids = np.asarray(f_centroids, dtype=np.float64)
+        self.a_pca_mean = None if f_pca_mean is None else np.asarray(f_pca_mean, dtype=np.float64)
+        self.a_pca_components = None if f_pca_components is None else \
+                                np.asarray(f_pca_components, dtype=np.float64)
+
+        # centróides no espaço original e pesos 1 / scale² (predict sem normalizar a entrada)
+        self.a_raw_centroids = self.a_mean + self.a_centroids * self.a_scale
+        self.a_weights = 1. / np.square(self.a_scale)
+
+    # -----------------------------------------------------------------------------------------
+    @classmethod
+    def from_fitted(cls, flst_names: list, f_scaler, f_kmeans, f_pca=None):
+        """
+        modelo a partir dos estimadores sklearn ajustados
+
+        :param flst_names: nomes das colunas de características
+        :param f_scaler: StandardScaler
+        :param f_kmeans: KMeans ou MiniBatchKMeans (ajustado nos dados normalizados)
+        :param f_pca: PCA ou IncrementalPCA (opcional)
+
+        :returns: ClusterModel
+        """
+        # return model
+        return cls(flst_names, f_scaler.mean_, f_scaler.scale_, f_kmeans.cluster_centers_,
+                   None if f_pca is None else f_pca.mean_,
+                   None if f_pca is None else f_pca.components_)
+
+    # -----------------------------------------------------------------------------------------
+    @property
+    def n_clusters(self) -> int:
+        """
+        número de clusters
+        """
+        # return k
+        return len(self.a_centroids)
+
+    # -----------------------------------------------------------------------------------------
+    def predict(self, f_values):
+        """
+        cluster de um vetor de características ou de um lote
+
+        :param f_values: vetor (features,) ou lote (rows x features), na ordem de lst_names
+
+        :returns: rótulo (int) para um vetor, array de rótulos para um lote
+        """
+        # vetor ou lote
+        l_values = np.asarray(f_values, dtype=np.float64)
+
+        # vetor ?
+        if 1 == l_values.ndim:
+            # distância ponderada a cada centróide
+            return int(np.argmin(np.square(self.a_raw_centroids - l_values) @ self.a_weights))
+
+        # distâncias ponderadas (rows x k) sem tensor intermediário: |x|² - 2 x.c + |c|²
+        l_x = l_values * np.sqrt(self.a_weights)
+        l_c = self.a_raw_centroids * np.sqrt(self.a_weights)
+        l_dist = np.einsum("ij,ij->i", l_c, l_c)[None, :] - 2. * (l_x @ l_c.T)
+
+        # return labels (|x|² é constante por linha)
+        return np.argmin(l_dist, axis=1)
+
+    # -----------------------------------------------------------------------------------------
+    def project(self, f_values):
+        """
+        projeção PCA de um vetor ou lote (para visualização)
+
+        :param f_values: vetor ou lote, na ordem de lst_names
+
+        :returns: coordenadas PCA
+        """
+        # sem PCA ?
+        if self.a_pca_components is None:
+            raise ValueError("Cluster model without PCA")
+
+        # return projection
+        return ((np.asarray(f_values, dtype=np.float64) - self.a_mean) / self.a_scale -
+                self.a_pca_mean) @ self.a_pca_components.T
+
+    # -----------------------------------------------------------------------------------------
+    def save(self, fs_path: str = DS_MODEL) -> None:
+        """
+        salva o modelo (escrita atômica)
+
+        :param fs_path: arquivo do modelo (.npz)
+        """
+        # cria o diretório do modelo
+        if os.path.dirname(fs_path):
+            os.makedirs(os.path.dirname(fs_path), exist_ok=True)
+
+        # parâmetros
+        ldct_arrays = {"version": np.array(DI_VERSION), "names": np.array(self.lst_names),
+                       "mean": self.a_mean, "scale": self.a_scale, "centroids": self.a_centroids}
+
+        # PCA ?
+        if self.a_pca_components is not None:
+            ldct_arrays.update(pca_mean=self.a_pca_mean, pca_components=self.a_pca_components)
+
+        # arquivo temporário
+        ls_tmp = fs_path + ".tmp"
+
+        # create temporary file
+        with open(ls_tmp, "wb") as lfh:
+            # save model
+            np.savez(lfh, **ldct_arrays)
+
+        # replace model
+        os.replace(ls_tmp, fs_path)
+
+# ---------------------------------------------------------------------------------------------
+def load(fs_path: str = DS_MODEL) -> ClusterModel:
+    """
+    carrega um modelo salvo
+
+    :param fs_path: arquivo do modelo (.npz)
+
+    :returns: ClusterModel
+    """
+    # open model
+    with np.load(fs_path, allow_pickle=False) as l_npz:
+        # versão diferente ?
+        if int(l_npz["version"]) != DI_VERSION:
+            # raise error
+            raise ValueError(f"Unsupported cluster model version in {fs_path}")
+
+        # return model
+        return ClusterModel(l_npz["names"].tolist(), l_npz["mean"], l_npz["scale"], l_npz["centroids"],
+                            l_npz["pca_mean"] if "pca_mean" in l_npz else None,
+                            l_npz["pca_components"] if "pca_components" in l_npz else None)
+
+# < the end >----------------------------------------------------------------------------------
@@ -18,8 +18,9 @@ import logging
 
 # numPy
 import numpy as np
-# openCV
-import cv2
+
+# local
+import analytics.ga_features as gf
 
 # < logging >----------------------------------------------------------------------------------
 
@@ -40,30 +41,41 @@ def modelo_cores(f_image) -> float:
     # logger
     M_LOG.info(">> modelo_cores")
 
-    # converte a imagem para o espaço de cores HSV
-    l_hsv = cv2.cvtColor(f_image, cv2.COLOR_BGR2HSV)
+    # retorna o desvio padrão do canal de matiz
+    return modelo_cores_ctx(gf.FeatureContext(f_image))
 
+# ---------------------------------------------------------------------------------------------
+@gf.register("modelo_cores", "std_dev", ("hsv",))
+def modelo_cores_ctx(f_ctx) -> float:
+    """
+    técnica de modelo de cores sobre o contexto compartilhado da imagem
+
+    :param f_ctx: contexto da imagem (ga_features.FeatureContext)
+
+    :returns: desvio padrão do canal de matiz
+    """
     # extrai o canal de matiz (H) da imagem HSV
-    l_hue_channel = l_hsv[:, :, 0]
+    l_hue_channel = f_ctx.get("hsv")[:, :, 0]
 
     # retorna o desvio padrão do canal de matiz
     return np.std(l_hue_channel)
 
 # ---------------------------------------------------------------------------------------------
-def do_modelo_cores(fs_image_path: str, ff_threshold: float = 0.1):
+def do_modelo_cores(fs_image_path: str, ff_threshold: float = 0.1, fi_scale: int = 1):
     """
     técnica de modelo de cores
 
     :param fs_image_path: path da imagem a analisar
     :param ff_threshold: limite que define o nível de sensibilidade da detecção
+    :param fi_scale: escala de análise (1, 2, 4 ou 8; ver ga_calibration)
 
     :returns: True indica que o nevoeiro foi detectado. False, senão.
     """
     # logger
     M_LOG.info(">> do_modelo_cores")
 
-    # carrega a imagem
-    l_image = cv2.imread(fs_image_path)
+    # carrega a imagem em cores, na escala de análise
+    l_image = gf.imread(fs_image_path, fi_scale, fv_color=True)
 
     # retorna se o desvio padrão está abaixo do limite (i.e. nevoeiro detectado)
     return modelo_cores(l_image) < ff_threshold
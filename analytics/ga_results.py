@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+ga_results
+
+tabela indexada de resultados por imagem (métricas ga_* e rótulos de cluster) num banco
+SQLite.  Substitui os links simbólicos criados por imagem e por métrica: as visões
+ordenadas por métrica ou por cluster são consultas ao índice (metric, value), e a
+criação de links passa a ser uma exportação opcional, em lote, de um subconjunto (os K
+primeiros de uma métrica ou um único rótulo).
+
+2023.may  mlabru  initial version (Linux/Python)
+"""
+# < imports >----------------------------------------------------------------------------------
+
+# python library
+import logging
+import os
+import sqlite3
+
+# < constants >--------------------------------------------------------------------------------
+
+# banco de resultados
+DS_DB_RESULTS = "./data/fog-results.db"
+
+# create results table (uma linha por imagem e métrica)
+DS_SQL_RESULTS = '''CREATE TABLE IF NOT EXISTS results (
+                    metric   TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    value    REAL,
+                    PRIMARY KEY (metric, filename)) WITHOUT ROWID;'''
+
+# create index for sorted views
+DS_SQL_RESULTS_NDX = '''CREATE INDEX IF NOT EXISTS results_value ON results (metric, value);'''
+
+# < logging >----------------------------------------------------------------------------------
+
+# logger
+M_LOG = logging.getLogger(__name__)
+M_LOG.setLevel(logging.WARNING)
+
+# ---------------------------------------------------------------------------------------------
+def connect(fs_db: str = DS_DB_RESULTS):
+    """
+    connect to the results database, creating the table and index if needed
+
+    :param fs_db: database file
+
+    :returns: connection object
+    """
+    # create connection
+    lconn = sqlite3.connect(fs_db)
+    assert lconn is not None
+
+    # create table and index
+    lconn.execute(DS_SQL_RESULTS)
+    lconn.execute(DS_SQL_RESULTS_NDX)
+
+    # return connection
+    return lconn
+
+# ---------------------------------------------------------------------------------------------
+def save_results(f_conn, fs_metric: str, flst_fnames: list, flst_values: list,
+                 flst_keep: list = None) -> None:
+    """
+    save one metric for several images in a single batch
+
+    :param f_conn: connection object
+    :param fs_metric: metric name (p.ex. analise_contraste, kmeans)
+    :param flst_fnames: image filenames
+    :param flst_values: metric values (same order)
+    :param flst_keep: if given, rows of this metric for other filenames are deleted
+    """
+    # upsert rows
+    f_conn.executemany("INSERT OR REPLACE INTO results (metric, filename, value) VALUES (?, ?, ?);",
+                       [(fs_metric, ls_fname, float(lf_value))
+                        for ls_fname, lf_value in zip(flst_fnames, flst_values)])
+
+    # remove imagens que não existem mais ?
+    if flst_keep is not None:
+        # tabela temporária com os arquivos atuais
+        f_conn.execute("CREATE TEMP TABLE IF NOT EXISTS keep (filename TEXT PRIMARY KEY);")
+        f_conn.execute("DELETE FROM keep;")
+        f_conn.executemany("INSERT OR IGNORE INTO keep (filename) VALUES (?);",
+                           [(ls_fname,) for ls_fname in flst_keep])
+
+        # delete stale rows
+        f_conn.execute("DELETE FROM results WHERE metric = ? AND "
+                       "filename NOT IN (SELECT filename FROM keep);", (fs_metric,))
+
+# ---------------------------------------------------------------------------------------------
+def delete_metric(f_conn, fs_metric: str) -> None:
+    """
+    delete all rows of a metric (p.ex. before saving a new clustering in batches)
+
+    :param f_conn: connection object
+    :param fs_metric: metric name
+    """
+    # execute query
+    f_conn.execute("DELETE FROM results WHERE metric = ?;", (fs_metric,))
+
+# ---------------------------------------------------------------------------------------------
+def count(f_conn, fs_metric: str) -> int:
+    """
+    number of images with a metric
+
+    :param f_conn: connection object
+    :param fs_metric: metric name
+
+    :returns: number of rows
+    """
+    # execute query
+    return f_conn.execute("SELECT COUNT(*) FROM results WHERE metric = ?;", (fs_metric,)).fetchone()[0]
+
+# ---------------------------------------------------------------------------------------------
+def sorted_view(f_conn, fs_metric: str, fi_limit: int = -1, fv_desc: bool = False,
+                ff_value: float = None) -> list:
+    """
+    images sorted by a metric (uses the (metric, value) index)
+
+    :param f_conn: connection object
+    :param fs_metric: metric name
+    :param fi_limit: maximum number of rows (-1 = all)
+    :param fv_desc: True for descending order
+    :param ff_value: if given, only rows with this value (p.ex. one cluster label)
+
+    :returns: list of (filename, value)
+    """
+    # build query
+    ls_sql = "SELECT filename, value FROM results WHERE metric = ?"
+    lt_data = (fs_metric,)
+
+    # filtro por valor ?
+    if ff_value is not None:
+        ls_sql += " AND value = ?"
+        lt_data += (float(ff_value),)
+
+    ls_sql += f" ORDER BY value {'DESC' if fv_desc else 'ASC'}, filename LIMIT ?;"
+
+    # execute query
+    return f_conn.execute(ls_sql, lt_data + (int(fi_limit),)).fetchall()
+
+# ---------------------------------------------------------------------------------------------
+def export_links(fs_dir_img: str, fs_dir_out: str, flst_rows: list, fs_fmt: str) -> int:
+    """
+    batched symlink export of a sorted view. The output directory is cleared once and
+    the links are created without per-link remove/retry.
+
+    :param fs_dir_img: images directory
+    :param fs_dir_out: output directory (inside fs_dir_img, links point to ../<image>)
+    :param flst_rows: list of (filename, value)
+    :param fs_fmt: link name format, with fields {value} and {fname}
+
+    :returns: number of links created
+    """
+    # caminho completo para a saída
+    ls_dir = os.path.join(fs_dir_img, fs_dir_out)
+    os.makedirs(ls_dir, exist_ok=True)
+
+    # remove os links anteriores (uma varredura do diretório)
+    with os.scandir(ls_dir) as l_entries:
+        for l_entry in l_entries:
+            if l_entry.is_symlink():
+                os.unlink(l_entry.path)
+
+    # nomes já criados (evita colisões de valores iguais)
+    lset_names = set()
+
+    for ls_fname, lf_value in flst_rows:
+        # nome do link
+        ls_name = fs_fmt.format(value=lf_value, fname=ls_fname)
+
+        if ls_name in lset_names:
+            # logger
+            M_LOG.warning("duplicate link %s for %s skipped", ls_name, ls_fname)
+            # next
+            continue
+
+        # create a symbolic link pointing to the image
+        os.symlink(os.path.join("..", ls_fname), os.path.join(ls_dir, ls_name))
+        lset_names.add(ls_name)
+
+    # return number of links
+    return len(lset_names)
+
+# < the end >----------------------------------------------------------------------------------
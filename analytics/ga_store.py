@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+"""
+ga_store
+
+armazenamento colunar das características (substitui o fog-clustering.csv).  Cada coluna
+é um arquivo binário bruto (<nome>.bin) com tipo fixo, descrito em meta.json junto com o
+número de linhas.  Novas linhas são anexadas ao final de cada coluna e a leitura é feita
+por np.memmap, sem parse: abrir milhões de linhas custa milissegundos.
+
+O meta.json é gravado por último (escrita atômica); bytes além de nrows, deixados por uma
+gravação interrompida, são descartados na próxima gravação.
+
+2023.may  mlabru  initial version (Linux/Python)
+"""
+# < imports >----------------------------------------------------------------------------------
+
+# python library
+import datetime
+import json
+import logging
+import os
+
+# numPy
+import numpy as np
+
+# < constants >--------------------------------------------------------------------------------
+
+# versão do formato
+DI_VERSION = 1
+
+# arquivo de metadados
+DS_META = "meta.json"
+
+# colunas de identificação (nome, dtype)
+DLST_ID_COLUMNS = [("timestamp", "<i8"), ("station", "S8"), ("filename", "S64")]
+
+# tipo das colunas de características
+DS_FEATURE_DTYPE = "<f8"
+
+# < logging >----------------------------------------------------------------------------------
+
+# logger
+M_LOG = logging.getLogger(__name__)
+M_LOG.setLevel(logging.WARNING)
+
+# ---------------------------------------------------------------------------------------------
+def _column_path(fs_dir: str, fs_name: str) -> str:
+    """
+    caminho do arquivo da coluna
+    """
+    # return column path
+    return os.path.join(fs_dir, fs_name + ".bin")
+
+# ---------------------------------------------------------------------------------------------
+def _save_meta(fs_dir: str, flst_schema: list, fi_nrows: int) -> None:
+    """
+    salva os metadados (escrita atômica)
+    """
+    # arquivo temporário
+    ls_tmp = os.path.join(fs_dir, DS_META + ".tmp")
+
+    # create temporary file
+    with open(ls_tmp, "w", encoding="UTF8") as lfh:
+        # save meta
+        json.dump({"version": DI_VERSION, "nrows": fi_nrows,
+                   "columns": [list(lt_col) for lt_col in flst_schema]}, lfh)
+
+    # replace meta
+    os.replace(ls_tmp, os.path.join(fs_dir, DS_META))
+
+# ---------------------------------------------------------------------------------------------
+def load_meta(fs_dir: str):
+    """
+    carrega os metadados do armazenamento
+
+    :param fs_dir: diretório do armazenamento
+
+    :returns: (schema [(name, dtype)], nrows) ou (None, 0) se não existe
+    """
+    # caminho dos metadados
+    ls_meta = os.path.join(fs_dir, DS_META)
+
+    # não existe ?
+    if not os.path.isfile(ls_meta):
+        # empty store
+        return None, 0
+
+    # open meta
+    with open(ls_meta, "r", encoding="UTF8") as lfh:
+        # load meta
+        ldct_meta = json.load(lfh)
+
+    # versão diferente ?
+    if ldct_meta.get("version") != DI_VERSION:
+        # raise error
+        raise ValueError(f"Unsupported feature store version in {fs_dir}")
+
+    # return schema and number of rows
+    return [tuple(llst_col) for llst_col in ldct_meta["columns"]], int(ldct_meta["nrows"])
+
+# ---------------------------------------------------------------------------------------------
+def check_fnames(flst_fnames: list) -> None:
+    """
+    verifica se os nomes cabem na coluna filename (o S64 truncaria sem aviso)
+
+    :param flst_fnames: nomes dos arquivos
+    """
+    # tamanho da coluna (bytes)
+    li_size = np.dtype(dict(DLST_ID_COLUMNS)["filename"]).itemsize
+
+    for ls_fname in flst_fnames:
+        # nome longo demais ?
+        if len(ls_fname.encode("UTF8")) > li_size:
+            # raise error
+            raise ValueError(f"File name longer than {li_size} bytes: {ls_fname}")
+
+# ---------------------------------------------------------------------------------------------
+def make_columns(flst_fnames: list, fs_station: str, flst_header: list, flst_rows: list) -> dict:
+    """
+    monta as colunas tipadas a partir dos nomes de arquivo e das linhas de características
+
+    :param flst_fnames: nomes dos arquivos (YYYYmmddHHMMSSZc.png)
+    :param fs_station: código da estação
+    :param flst_header: nomes das colunas de características
+    :param flst_rows: linhas de características (mesma ordem de flst_fnames)
+
+    :returns: {name: array}, na ordem do schema
+    """
+    # os nomes cabem na coluna filename ?
+    check_fnames(flst_fnames)
+
+    # timestamp (UTC epoch seconds) a partir do nome do arquivo
+    l_timestamp = np.array([timestamp(ls_fname) for ls_fname in flst_fnames], dtype="<i8")
+
+    # colunas de identificação
+    ldct_columns = {"timestamp": l_timestamp,
+                    "station": np.full(len(flst_fnames), fs_station, dtype="S8"),
+                    "filename": np.array(flst_fnames, dtype=dict(DLST_ID_COLUMNS)["filename"])}
+
+    # características (matriz linhas x colunas)
+    l_values = np.asarray(flst_rows, dtype=DS_FEATURE_DTYPE).reshape(len(flst_fnames),
+                                                                      len(flst_header))
+
+    for li_ndx, ls_name in enumerate(flst_header):
+        # coluna de característica
+        ldct_columns[ls_name] = np.ascontiguousarray(l_values[:, li_ndx])
+
+    # return columns
+    return ldct_columns
+
+# ---------------------------------------------------------------------------------------------
+def timestamp(fs_fname: str) -> int:
+    """
+    converte a data do nome do arquivo (YYYYmmddHHMMSS...) em UTC epoch seconds (-1 se inválida)
+    """
+    try:
+        # data do nome do arquivo
+        ldt_date = datetime.datetime.strptime(fs_fname[:14], "%Y%m%d%H%M%S")
+
+    # em caso de erro...
+    except ValueError:
+        # data inválida
+        return -1
+
+    # return epoch seconds
+    return int(ldt_date.replace(tzinfo=datetime.timezone.utc).timestamp())
+
+# ---------------------------------------------------------------------------------------------
+def write(fs_dir: str, fdct_columns: dict) -> None:
+    """
+    grava (substitui) todo o armazenamento
+
+    :param fs_dir: diretório do armazenamento
+    :param fdct_columns: {name: array}, todas com o mesmo número de linhas
+    """
+    # cria o diretório
+    os.makedirs(fs_dir, exist_ok=True)
+
+    # invalida o armazenamento anterior até a gravação terminar
+    if os.path.isfile(os.path.join(fs_dir, DS_META)):
+        # remove meta
+        os.remove(os.path.join(fs_dir, DS_META))
+
+    # schema e número de linhas
+    llst_schema = [(ls_name, l_col.dtype.str) for ls_name, l_col in fdct_columns.items()]
+    li_nrows = len(next(iter(fdct_columns.values()))) if fdct_columns else 0
+
+    for ls_name, l_col in fdct_columns.items():
+        # mesmo número de linhas ?
+        assert len(l_col) == li_nrows, ls_name
+
+        # grava a coluna num arquivo temporário
+        ls_tmp = _column_path(fs_dir, ls_name) + ".tmp"
+        l_col.tofile(ls_tmp)
+
+        # replace column
+        os.replace(ls_tmp, _column_path(fs_dir, ls_name))
+
+    # colunas do novo schema
+    lset_keep = {os.path.basename(_column_path(fs_dir, ls_name)) for ls_name in fdct_columns}
+
+    # remove as colunas que não fazem mais parte do schema (extrator removido, outra grade)
+    with os.scandir(fs_dir) as l_entries:
+        for l_entry in l_entries:
+            if l_entry.name.endswith((".bin", ".bin.tmp")) and l_entry.name not in lset_keep:
+                # remove stale column
+                os.remove(l_entry.path)
+
+    # save meta
+    _save_meta(fs_dir, llst_schema, li_nrows)
+
+# ---------------------------------------------------------------------------------------------
+def append(fs_dir: str, fdct_columns: dict) -> None:
+    """
+    anexa linhas ao armazenamento (cria se não existe)
+
+    :param fs_dir: diretório do armazenamento
+    :param fdct_columns: {name: array}, mesmo schema do armazenamento
+    """
+    # schema atual
+    llst_schema, li_nrows = load_meta(fs_dir)
+
+    # armazenamento novo ?
+    if llst_schema is None:
+        # grava tudo
+        write(fs_dir, fdct_columns)
+        # return
+        return
+
+    # schema diferente ?
+    if llst_schema != [(ls_name, l_col.dtype.str) for ls_name, l_col in fdct_columns.items()]:
+        # raise error
+        raise ValueError(f"Feature store schema mismatch in {fs_dir}")
+
+    # número de linhas anexadas
+    li_new = len(next(iter(fdct_columns.values()))) if fdct_columns else 0
+
+    for ls_name, ls_dtype in llst_schema:
+        # coluna a anexar
+        l_col = fdct_columns[ls_name]
+        assert len(l_col) == li_new, ls_name
+
+        # open column file
+        with open(_column_path(fs_dir, ls_name), "r+b") as lfh:
+            # descarta bytes de uma gravação interrompida
+            lfh.truncate(li_nrows * np.dtype(ls_dtype).itemsize)
+            lfh.seek(0, os.SEEK_END)
+
+            # anexa a coluna
+            lfh.write(np.ascontiguousarray(l_col, dtype=ls_dtype).tobytes())
+
+    # save meta (confirma as novas linhas)
+    _save_meta(fs_dir, llst_schema, li_nrows + li_new)
+
+# ---------------------------------------------------------------------------------------------
+def load(fs_dir: str, flst_names: list = None) -> dict:
+    """
+    abre as colunas do armazenamento por memory-map (somente leitura)
+
+    :param fs_dir: diretório do armazenamento
+    :param flst_names: colunas desejadas (None = todas)
+
+    :returns: {name: np.memmap}, na ordem do schema
+    """
+    # schema atual
+    llst_schema, li_nrows = load_meta(fs_dir)
+
+    # não existe ?
+    if llst_schema is None:
+        # raise error
+        raise FileNotFoundError(f"No feature store in {fs_dir}")
+
+    # colunas
+    ldct_columns = {}
+
+    for ls_name, ls_dtype in llst_schema:
+        # coluna não desejada ?
+        if flst_names is not None and ls_name not in flst_names:
+            # next column
+            continue
+
+        # memmap não aceita arquivos vazios
+        ldct_columns[ls_name] = np.memmap(_column_path(fs_dir, ls_name), dtype=ls_dtype, mode="r",
+                                          shape=(li_nrows,)) if li_nrows > 0 else \
+                                np.empty(0, dtype=ls_dtype)
+
+    # return columns
+    return ldct_columns
+
+# ---------------------------------------------------------------------------------------------
+def feature_names(fs_dir: str) -> list:
+    """
+    nomes das colunas de características (exclui as colunas de identificação)
+
+    :param fs_dir: diretório do armazenamento
+
+    :returns: lista de nomes
+    """
+    # schema atual
+    llst_schema, _ = load_meta(fs_dir)
+
+    # colunas de identificação
+    lset_ids = {ls_name for ls_name, _ in DLST_ID_COLUMNS}
+
+    # return feature names
+    return [ls_name for ls_name, _ in (llst_schema or []) if ls_name not in lset_ids]
+
+# < the end >----------------------------------------------------------------------------------
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+ga_tiles
+
+estatísticas regionais de nevoeiro.  A imagem é dividida numa grade de N x M regiões
+(tiles) e, para cada região, calculam-se a média e o desvio padrão dos níveis de cinza e
+a energia média do gradiente de Sobel (gx² + gy²).  As somas por região são obtidas de
+imagens integrais (summed-area tables) com quatro acessos por região, de modo que o custo
+é o mesmo da métrica global, qualquer que seja o número de regiões.
+
+2023.may  mlabru  initial version (Linux/Python)
+"""
+# < imports >----------------------------------------------------------------------------------
+
+# python library
+import logging
+
+# numPy
+import numpy as np
+# openCV
+import cv2
+
+# < constants >--------------------------------------------------------------------------------
+
+# estatísticas por região (ordem das grades)
+DLST_STATS = ["mean", "std", "energy"]
+
+# < logging >----------------------------------------------------------------------------------
+
+# logger
+M_LOG = logging.getLogger(__name__)
+M_LOG.setLevel(logging.WARNING)
+
+# ---------------------------------------------------------------------------------------------
+def _box_sum(f_integral, f_ys, f_xs):
+    """
+    soma de cada região a partir da imagem integral
+
+    :param f_integral: imagem integral ((h + 1) x (w + 1))
+    :param f_ys: limites das linhas das regiões (rows + 1)
+    :param f_xs: limites das colunas das regiões (cols + 1)
+
+    :returns: somas por região (rows x cols)
+    """
+    # return D - B - C + A
+    return f_integral[np.ix_(f_ys[1:], f_xs[1:])] - f_integral[np.ix_(f_ys[:-1], f_xs[1:])] - \
+           f_integral[np.ix_(f_ys[1:], f_xs[:-1])] + f_integral[np.ix_(f_ys[:-1], f_xs[:-1])]
+
+# ---------------------------------------------------------------------------------------------
+def tile_stats(f_gray, fi_rows: int, fi_cols: int, ft_grads=None):
+    """
+    calcula a grade de estatísticas regionais
+
+    :param f_gray: imagem em escala de cinza
+    :param fi_rows: número de linhas da grade
+    :param fi_cols: número de colunas da grade
+    :param ft_grads: derivadas de Sobel (gx, gy) já calculadas (opcional)
+
+    :returns: array (3, rows, cols) com média, desvio padrão e energia de Sobel
+    """
+    # dimensões da imagem
+    li_height, li_width = f_gray.shape[:2]
+
+    # grade maior que a imagem ?
+    if not 0 < fi_rows <= li_height or not 0 < fi_cols <= li_width:
+        # raise error
+        raise ValueError(f"Invalid tile grid {fi_rows}x{fi_cols} for image {li_width}x{li_height}")
+
+    # limites das regiões
+    l_ys = np.linspace(0, li_height, fi_rows + 1).astype(np.intp)
+    l_xs = np.linspace(0, li_width, fi_cols + 1).astype(np.intp)
+
+    # área de cada região
+    l_area = np.outer(np.diff(l_ys), np.diff(l_xs)).astype(np.float64)
+
+    # imagens integrais da imagem e do seu quadrado
+    l_sum, l_sqsum = cv2.integral2(f_gray, sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+
+    # média e desvio padrão por região
+    l_mean = _box_sum(l_sum, l_ys, l_xs) / l_area
+    l_std = np.sqrt(np.maximum(_box_sum(l_sqsum, l_ys, l_xs) / l_area - l_mean ** 2, 0.))
+
+    # derivadas de Sobel não fornecidas ?
+    if ft_grads is None:
+        # derivadas parciais nas direções x e y
+        ft_grads = (cv2.Sobel(f_gray, cv2.CV_32F, 1, 0, ksize=3),
+                    cv2.Sobel(f_gray, cv2.CV_32F, 0, 1, ksize=3))
+
+    # energia do gradiente (gx² + gy²)
+    l_energy = np.multiply(ft_grads[0], ft_grads[0])
+    l_energy += np.square(ft_grads[1])
+
+    # energia média por região
+    l_energy = _box_sum(cv2.integral(l_energy, sdepth=cv2.CV_64F), l_ys, l_xs) / l_area
+
+    # return grids
+    return np.stack([l_mean, l_std, l_energy])
+
+# ---------------------------------------------------------------------------------------------
+def tiles_ctx(f_ctx, fi_rows: int, fi_cols: int):
+    """
+    estatísticas regionais sobre o contexto compartilhado da imagem
+
+    :param f_ctx: contexto da imagem (ga_features.FeatureContext)
+    :param fi_rows: número de linhas da grade
+    :param fi_cols: número de colunas da grade
+
+    :returns: array (3, rows, cols) com média, desvio padrão e energia de Sobel
+    """
+    # return grids (reaproveita gray e sobel do contexto)
+    return tile_stats(f_ctx.get("gray"), fi_rows, fi_cols, f_ctx.get("sobel"))
+
+# ---------------------------------------------------------------------------------------------
+def header(fi_rows: int, fi_cols: int) -> list:
+    """
+    nomes das colunas da grade achatada (tile_<stat>_<row>_<col>)
+
+    :param fi_rows: número de linhas da grade
+    :param fi_cols: número de colunas da grade
+
+    :returns: lista de nomes de colunas
+    """
+    # return column names (mesma ordem de ravel() do array (3, rows, cols))
+    return [f"tile_{ls_stat}_{li_row}_{li_col}" for ls_stat in DLST_STATS
+            for li_row in range(fi_rows) for li_col in range(fi_cols)]
+
+# ---------------------------------------------------------------------------------------------
+def parse_grid(fs_grid: str) -> tuple:
+    """
+    converte a especificação da grade ("4x4") em (rows, cols)
+
+    :param fs_grid: especificação da grade
+
+    :returns: (rows, cols)
+    """
+    try:
+        # linhas e colunas
+        li_rows, li_cols = (int(ls_val) for ls_val in fs_grid.lower().split("x"))
+
+    # em caso de erro...
+    except ValueError as lerr:
+        # raise error
+        raise ValueError(f"Invalid tile grid: {fs_grid} (expected RxC, e.g. 4x4)") from lerr
+
+    # grade vazia ou negativa ?
+    if li_rows < 1 or li_cols < 1:
+        # raise error
+        raise ValueError(f"Invalid tile grid: {fs_grid} (expected RxC, e.g. 4x4)")
+
+    # return grid
+    return li_rows, li_cols
+
+# < the end >----------------------------------------------------------------------------------
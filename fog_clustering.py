@@ -1,25 +1,65 @@
 # < imports >----------------------------------------------------------------------------------
 
 # python library
+import argparse
+import concurrent.futures
 import logging
 import os
 import sys
+import time
 
 import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
 
-from sklearn.decomposition import PCA
-from sklearn.preprocessing import StandardScaler
-from sklearn import metrics
-from sklearn.model_selection import ParameterGrid
-from sklearn.cluster import KMeans
+# pandas, matplotlib e sklearn são importados somente nas funções que os usam (início
+# rápido das execuções agendadas)
+
+# local
+import analytics.ga_model as gmd
+import analytics.ga_results as gr
+import analytics.ga_store as gs
 
 # < constants >--------------------------------------------------------------------------------
 
 # diretório contendo as imagens
 DS_DIR_IMG = "data/shots/cap/SBGR-28/"
 
+# armazenamento colunar das características (gerado por analytics.py)
+DS_STORE = "./data/fog-features/"
+# arquivo de características (formato anterior)
+DS_CSV = "./data/fog-clustering.csv"
+
+# candidate values for the number of clusters
+DLST_K = [2, 3, 4, 5, 6, 7, 8, 9, 10, 15, 20, 25, 30]
+
+# critérios de escolha do número de clusters
+DLST_CRITERIA = ["silhouette", "calinski", "elbow"]
+
+# características usadas: ga_* (analytics), embeddings MobileNet (ga_embeddings) ou ambas
+DLST_FEATURES = ["ga", "embed", "both"]
+
+# default number of worker processes for the k sweep (1 = serial)
+D_WORKERS = 1
+
+# default silhouette sample size (silhouette é O(n²))
+D_SAMPLE = 10000
+
+# default random seed (KMeans init and silhouette sample)
+D_SEED = 0
+
+# default rows per chunk in streaming mode
+D_CHUNK = 65536
+
+# < global data >------------------------------------------------------------------------------
+
+# dados do processo worker da varredura de k
+g_data = None
+
+# mostra as figuras na tela ?
+gv_show = True
+
+# diretório das figuras salvas (None = não salva)
+gs_plot_dir = None
+
 # < logging >----------------------------------------------------------------------------------
 
 # logger
@@ -27,14 +67,237 @@ M_LOG = logging.getLogger(__name__)
 M_LOG.setLevel(logging.DEBUG)
 
 # ---------------------------------------------------------------------------------------------
-def load_embeddings():
+def positive_int(fs_value: str) -> int:
+    """
+    converte um argumento inteiro >= 1
+
+    :param fs_value: valor do argumento
+
+    :returns: valor inteiro
+    """
+    # valor inteiro
+    li_value = int(fs_value)
+
+    # não positivo ?
+    if li_value < 1:
+        # raise error
+        raise ValueError(f"Invalid value: {fs_value} (expected an integer >= 1)")
+
+    # return value
+    return li_value
+
+# ---------------------------------------------------------------------------------------------
+def arg_parse():
+    """
+    parse command line arguments
+    arguments parse: <links> <label> <k values> <criterion> <workers> <sample> <seed> <stream>
+                     <chunk> <clusters> <model> <batch> <plots> <features>
+
+    :returns: arguments
+    """
+    # create parser
+    l_parser = argparse.ArgumentParser(description="fog_clustering. Clustering of fog features.")
+    assert l_parser
+
+    # args
+    l_parser.add_argument("-l", "--links", help="export symlinks of all labels to kmeans/.",
+                          default=False, dest="links", action="store_true")
+    l_parser.add_argument("--label", help="export symlinks of this label only.",
+                          default=None, dest="label", type=int)
+    l_parser.add_argument("-k", "--k-values", help="candidate numbers of clusters, comma separated. "
+                          f"[{','.join(map(str, DLST_K))}]", default=DLST_K, dest="k_values",
+                          type=lambda fs_val: [int(ls_k) for ls_k in fs_val.split(",")])
+    l_parser.add_argument("-c", "--criterion", help=f"number of clusters criterion. [{DLST_CRITERIA[0]}]",
+                          default=DLST_CRITERIA[0], dest="criterion", choices=DLST_CRITERIA)
+    l_parser.add_argument("-w", "--workers", help=f"worker processes for the k sweep. [{D_WORKERS}]",
+                          default=D_WORKERS, dest="workers", type=int)
+    l_parser.add_argument("-n", "--sample", help=f"silhouette sample size (0 = all rows). [{D_SAMPLE}]",
+                          default=D_SAMPLE, dest="sample", type=int)
+    l_parser.add_argument("-s", "--seed", help=f"random seed. [{D_SEED}]",
+                          default=D_SEED, dest="seed", type=int)
+    l_parser.add_argument("--stream", help="out-of-core mode: chunked reads, incremental scaler, "
+                          "IncrementalPCA and MiniBatchKMeans.", default=False, dest="stream",
+                          action="store_true")
+    l_parser.add_argument("--chunk", help=f"rows per chunk in streaming mode. [{D_CHUNK}]",
+                          default=D_CHUNK, dest="chunk", type=positive_int)
+    l_parser.add_argument("--clusters", help="number of clusters (skips the k sweep). [sweep]",
+                          default=None, dest="clusters", type=positive_int)
+    l_parser.add_argument("-o", "--model", help="save the fitted scaler, PCA and centroids. "
+                          f"[{gmd.DS_MODEL}]", default=gmd.DS_MODEL, dest="model")
+    l_parser.add_argument("-b", "--batch", help="headless batch mode: never open a window "
+                          "(automatic without a display).", default=False, dest="batch",
+                          action="store_true")
+    l_parser.add_argument("-f", "--features", help="ga_* features, MobileNet embeddings "
+                          f"(analytics.ga_embeddings cache) or both. [{DLST_FEATURES[0]}]",
+                          default=DLST_FEATURES[0], dest="features", choices=DLST_FEATURES)
+    l_parser.add_argument("-p", "--plots", help="save the figures as PNG files in this directory. [off]",
+                          default=None, dest="plots")
+
+    # return arguments
+    return l_parser.parse_args()
+
+# ---------------------------------------------------------------------------------------------
+def has_display() -> bool:
+    """
+    is there a display to show the figures ?
+    """
+    # Windows / macOS sempre têm, X11 / Wayland só com a variável de ambiente
+    return "posix" != os.name or sys.platform == "darwin" or \
+           bool(os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
+
+# ---------------------------------------------------------------------------------------------
+def set_plots(fv_show: bool, fs_dir: str = None) -> None:
+    """
+    configure the figures output
+
+    :param fv_show: show the figures on screen (blocking)
+    :param fs_dir: directory to save the figures (None = don't save)
+    """
+    # globals
+    global gv_show, gs_plot_dir
+
+    # pedido de janela sem display ?
+    if fv_show and not has_display():
+        # logger
+        M_LOG.warning("no display available, running headless")
+        fv_show = False
+
+    # output
+    gv_show = fv_show
+    gs_plot_dir = fs_dir
+
+# ---------------------------------------------------------------------------------------------
+def _pyplot():
+    """
+    matplotlib.pyplot (importado somente quando há figura a produzir), com backend não
+    interativo quando as figuras não são mostradas
+
+    :returns: pyplot module or None if plotting is disabled
+    """
+    # sem figuras ?
+    if not gv_show and not gs_plot_dir:
+        return None
+
+    # matplotlib
+    import matplotlib
+
+    if not gv_show:
+        # backend não interativo (nunca espera por um display)
+        matplotlib.use("Agg")
+
+    import matplotlib.pyplot as plt
+
+    # return pyplot
+    return plt
+
+# ---------------------------------------------------------------------------------------------
+def _show(plt, fs_name: str) -> None:
     """
-    loading the fog dataset in pandas dataframe
+    save and/or show the current figure, then close it
+
+    :param plt: pyplot module
+    :param fs_name: figure file name (without extension)
+    """
+    # salva a figura ?
+    if gs_plot_dir:
+        os.makedirs(gs_plot_dir, exist_ok=True)
+        plt.savefig(os.path.join(gs_plot_dir, fs_name + ".png"), dpi=100, bbox_inches="tight")
+
+    # mostra a figura ?
+    if gv_show:
+        plt.show()
+
+    # close figure
+    plt.close()
+
+# ---------------------------------------------------------------------------------------------
+def open_features(fs_features: str = DLST_FEATURES[0]):
+    """
+    open the feature archive by memory-map: ga_* feature store, MobileNet embeddings or
+    both (joined by filename)
+
+    :param fs_features: ga, embed or both
 
-    :returns: scaled data
+    :returns: (filenames, column names, rows(index) -> values (rows x columns, float64)),
+              or None for ga without a feature store (legacy CSV)
     """
-    # loading fog dataset
-    fog_raw = pd.read_csv("./data/fog-clustering.csv")
+    # características ga_* ?
+    if "embed" != fs_features:
+        # sem armazenamento colunar ?
+        if gs.load_meta(DS_STORE)[0] is None:
+            if "ga" == fs_features:
+                # legacy CSV
+                return None
+
+            # raise error
+            raise FileNotFoundError(f"No feature store in {DS_STORE}")
+
+        # memory-mapped columns
+        llst_ga = gs.feature_names(DS_STORE)
+        ldct_columns = gs.load(DS_STORE, llst_ga + ["filename"])
+
+        def lf_ga(f_ndx):
+            # feature rows
+            return np.column_stack([ldct_columns[ls_name][f_ndx]
+                                    for ls_name in llst_ga]).astype(np.float64)
+
+        # somente ga_* ?
+        if "ga" == fs_features:
+            return ldct_columns["filename"], llst_ga, lf_ga
+
+    # embeddings (importado somente aqui: carrega o cv2)
+    import analytics.ga_embeddings as ge
+
+    # memory-mapped embeddings
+    l_fnames, l_vectors = ge.load(ge.DS_EMBED)
+    llst_embed = [f"emb_{li_ndx}" for li_ndx in range(l_vectors.shape[1])]
+
+    def lf_embed(f_ndx):
+        # embedding rows
+        return np.asarray(l_vectors[f_ndx], dtype=np.float64)
+
+    # somente embeddings ?
+    if "embed" == fs_features:
+        return l_fnames, llst_embed, lf_embed
+
+    # imagens presentes nos dois (junção pelo nome do arquivo)
+    l_keys, l_ga, l_embed = np.intersect1d(ldct_columns["filename"], l_fnames, assume_unique=True,
+                                           return_indices=True)
+
+    def lf_both(f_ndx):
+        # feature and embedding rows
+        return np.hstack([lf_ga(l_ga[f_ndx]), lf_embed(l_embed[f_ndx])])
+
+    # return joined archive
+    return l_keys, llst_ga + llst_embed, lf_both
+
+# ---------------------------------------------------------------------------------------------
+def load_embeddings(fs_features: str = DLST_FEATURES[0]):
+    """
+    loading the fog dataset in pandas dataframe. Uses the columnar feature store and/or the
+    MobileNet embeddings when available (indexed by filename), else the legacy CSV
+    (indexed by row number)
+
+    :param fs_features: ga, embed or both
+
+    :returns: scaled data, fitted scaler
+    """
+    # pandas, sklearn
+    import pandas as pd
+    from sklearn.preprocessing import StandardScaler
+
+    # memory-mapped archive
+    lt_archive = open_features(fs_features)
+
+    if lt_archive is not None:
+        # loading fog dataset (feature columns, indexed by filename)
+        l_fnames, llst_names, lf_rows = lt_archive
+        fog_raw = pd.DataFrame(lf_rows(slice(None)), columns=llst_names,
+                               index=pd.Index(l_fnames.astype(str), name="filename"))
+
+    else:
+        # loading fog dataset
+        fog_raw = pd.read_csv(DS_CSV)
 
     # checking data shape
     row, col = fog_raw.shape
@@ -45,10 +308,11 @@ def load_embeddings():
     fog_raw_scaled = fog_raw.copy()
 
     # scaling the data to keep the different attributes in same range
-    fog_raw_scaled[fog_raw_scaled.columns] = StandardScaler().fit_transform(fog_raw_scaled)
+    scaler = StandardScaler()
+    fog_raw_scaled[fog_raw_scaled.columns] = scaler.fit_transform(fog_raw_scaled)
     print(fog_raw_scaled.describe())
 
-    return fog_raw_scaled
+    return fog_raw_scaled, scaler
 
 # ---------------------------------------------------------------------------------------------
 def pca_embeddings(df_scaled):
@@ -59,6 +323,9 @@ def pca_embeddings(df_scaled):
     :param df_scaled: scaled data
     :return: pca result, pca for plotting graph
     """
+    # pandas, sklearn
+    import pandas as pd
+    from sklearn.decomposition import PCA
 
     pca_2 = PCA(n_components=2)
     pca_2_result = pca_2.fit_transform(df_scaled)
@@ -77,46 +344,211 @@ def pca_embeddings(df_scaled):
     return pca_2_result, pca_2
 
 # ---------------------------------------------------------------------------------------------
-def kmean_hyper_param_tuning(data):
+def _init_worker(f_data):
     """
-    Hyper parameter tuning to select the best from all the parameters on the basis of silhouette_score.
+    inicializa um processo worker da varredura: dados recebidos uma única vez por worker
+    """
+    # globals
+    global g_data
 
-    :param data: dimensionality reduced data after applying PCA
-    :return: best number of clusters for the model (used for KMeans n_clusters)
+    # dados do worker
+    g_data = f_data
+
+# ---------------------------------------------------------------------------------------------
+def eval_k(fi_k: int, fi_sample: int = D_SAMPLE, fi_seed: int = D_SEED, f_data=None) -> dict:
+    """
+    fit KMeans for one candidate k and compute the selection criteria
+
+    :param fi_k: number of clusters
+    :param fi_sample: silhouette sample size (0 = all rows)
+    :param fi_seed: random seed
+    :param f_data: data (None = data of the worker process)
+
+    :returns: {k, inertia, silhouette, calinski, fit_s, score_s}
+    """
+    # sklearn
+    from sklearn import metrics
+    from sklearn.cluster import KMeans
+
+    # dados do worker ?
+    if f_data is None:
+        f_data = g_data
+
+    # tempo inicial
+    lf_ini = time.perf_counter()
+
+    # fit model on fog dataset
+    l_kmeans = KMeans(n_clusters=fi_k, n_init="auto", random_state=fi_seed).fit(f_data)
+    lf_fit = time.perf_counter() - lf_ini
+
+    # amostra da silhueta (toda a base se menor que a amostra)
+    li_sample = fi_sample if 0 < fi_sample < len(f_data) else None
+
+    # critérios (silhueta amostrada com semente fixa)
+    lf_ini = time.perf_counter()
+    lf_silhouette = metrics.silhouette_score(f_data, l_kmeans.labels_, sample_size=li_sample,
+                                             random_state=fi_seed)
+    lf_calinski = metrics.calinski_harabasz_score(f_data, l_kmeans.labels_)
+
+    # return criteria
+    return {"k": fi_k,
+            "inertia": float(l_kmeans.inertia_),
+            "silhouette": float(lf_silhouette),
+            "calinski": float(lf_calinski),
+            "fit_s": lf_fit,
+            "score_s": time.perf_counter() - lf_ini}
+
+# ---------------------------------------------------------------------------------------------
+def _eval_k_worker(fi_k: int, fi_sample: int, fi_seed: int) -> dict:
+    """
+    eval_k no processo worker (uma thread BLAS/OpenMP por worker)
+    """
+    # threadpoolctl (dependência do sklearn)
+    from threadpoolctl import threadpool_limits
+
+    with threadpool_limits(limits=1):
+        # return criteria
+        return eval_k(fi_k, fi_sample, fi_seed)
+
+# ---------------------------------------------------------------------------------------------
+def elbow(flst_k: list, flst_inertia: list) -> int:
+    """
+    elbow of the inertia curve: candidate farthest below the line joining the first and
+    last (normalized) points
+
+    :param flst_k: candidate numbers of clusters (ascending)
+    :param flst_inertia: inertia for each candidate
+
+    :returns: k at the elbow
     """
-    # candidate values for our number of cluster
-    parameters = [2, 3, 4, 5, 6, 7, 8, 9, 10, 15, 20, 25, 30]
+    # sem candidatos ?
+    if not flst_k:
+        # raise error
+        raise ValueError("No candidate number of clusters")
 
-    # instantiating ParameterGrid, pass number of clusters as input
-    parameter_grid = ParameterGrid({'n_clusters': parameters})
+    # poucos candidatos ?
+    if len(flst_k) < 3:
+        return flst_k[0]
+
+    # normaliza k e inércia em [0, 1]
+    l_x = (np.asarray(flst_k, dtype=float) - flst_k[0]) / (flst_k[-1] - flst_k[0])
+    l_y = np.asarray(flst_inertia, dtype=float)
+    l_y = (l_y - l_y[-1]) / max(l_y[0] - l_y[-1], np.finfo(float).eps)
+
+    # distância abaixo da reta (1 - x)
+    return flst_k[int(np.argmax((1. - l_x) - l_y))]
+
+# ---------------------------------------------------------------------------------------------
+def kmeans_sweep(data, flst_k: list = None, fi_workers: int = D_WORKERS, fi_sample: int = D_SAMPLE,
+                 fi_seed: int = D_SEED) -> list:
+    """
+    evaluate the candidate numbers of clusters, in parallel worker processes
 
-    best_score = -1
-    kmeans_model = KMeans(n_init="auto")     # instantiating KMeans model
-    silhouette_scores = []
+    :param data: scaled data
+    :param flst_k: candidate numbers of clusters
+    :param fi_workers: number of worker processes (1 = serial)
+    :param fi_sample: silhouette sample size (0 = all rows)
+    :param fi_seed: random seed
 
-    # evaluation based on silhouette_score
-    for p in parameter_grid:
-        kmeans_model.set_params(**p)    # set current hyper parameter
-        kmeans_model.fit(data)          # fit model on fog dataset, this will find clusters based on parameter p
+    :returns: list of eval_k results, in ascending k
+    """
+    # candidatos válidos (k < número de linhas)
+    llst_cand = sorted({li_k for li_k in (flst_k or DLST_K) if 1 < li_k < len(data)})
+
+    # nenhum candidato válido ?
+    if not llst_cand:
+        # raise error
+        raise ValueError(f"No valid number of clusters in {flst_k or DLST_K}: k must be in "
+                         f"[2, {len(data) - 1}] for {len(data)} rows")
+
+    flst_k = llst_cand
+
+    # dados contíguos
+    l_data = np.ascontiguousarray(data, dtype=np.float64)
+
+    # modo paralelo ?
+    if fi_workers > 1:
+        # cria o pool de processos (dados enviados uma vez por worker)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=fi_workers, initializer=_init_worker,
+                                                    initargs=(l_data,)) as l_pool:
+            # k maiores primeiro (mais lentos), resultados na ordem de k
+            ldct_futures = {li_k: l_pool.submit(_eval_k_worker, li_k, fi_sample, fi_seed)
+                            for li_k in reversed(flst_k)}
+            llst_results = [ldct_futures[li_k].result() for li_k in flst_k]
+
+    # senão, modo serial
+    else:
+        llst_results = [eval_k(li_k, fi_sample, fi_seed, l_data) for li_k in flst_k]
+
+    for ldct_res in llst_results:
+        # logger
+        M_LOG.info("k=%d silhouette=%.4f calinski=%.1f inertia=%.1f fit=%.2fs score=%.2fs",
+                   ldct_res["k"], ldct_res["silhouette"], ldct_res["calinski"], ldct_res["inertia"],
+                   ldct_res["fit_s"], ldct_res["score_s"])
+
+    # return results
+    return llst_results
 
-        ss = metrics.silhouette_score(data, kmeans_model.labels_)   # calculate silhouette_score
-        silhouette_scores += [ss]       # store all the scores
+# ---------------------------------------------------------------------------------------------
+def best_k(flst_results: list, fs_criterion: str = DLST_CRITERIA[0]) -> int:
+    """
+    best number of clusters according to a criterion
 
-        print('Parameter:', p, 'Score', ss)
+    :param flst_results: kmeans_sweep results
+    :param fs_criterion: silhouette, calinski or elbow
 
-        # check p which has the best score
-        if ss > best_score:
-            best_score = ss
-            best_grid = p
+    :returns: best k
+    """
+    # sem resultados ?
+    if not flst_results:
+        # raise error
+        raise ValueError("No k sweep results (no valid number of clusters)")
 
-    # plotting silhouette score
-    plt.bar(range(len(silhouette_scores)), list(silhouette_scores), align='center', color='#722f59', width=0.5)
-    plt.xticks(range(len(silhouette_scores)), list(parameters))
-    plt.title('Silhouette Score', fontweight='bold')
-    plt.xlabel('Number of Clusters')
-    plt.show()
+    # elbow da inércia ?
+    if "elbow" == fs_criterion:
+        return elbow([ldct_res["k"] for ldct_res in flst_results],
+                     [ldct_res["inertia"] for ldct_res in flst_results])
 
-    return 5  # best_grid['n_clusters']
+    # maior silhueta ou maior Calinski-Harabasz
+    return max(flst_results, key=lambda ldct_res: ldct_res[fs_criterion])["k"]
+
+# ---------------------------------------------------------------------------------------------
+def kmean_hyper_param_tuning(data, flst_k: list = None, fs_criterion: str = DLST_CRITERIA[0],
+                             fi_workers: int = D_WORKERS, fi_sample: int = D_SAMPLE,
+                             fi_seed: int = D_SEED):
+    """
+    Hyper parameter tuning to select the best number of clusters on the basis of the
+    sampled silhouette score, the Calinski-Harabasz score or the inertia elbow.
+
+    :param data: scaled data
+    :param flst_k: candidate numbers of clusters
+    :param fs_criterion: silhouette, calinski or elbow
+    :param fi_workers: number of worker processes (1 = serial)
+    :param fi_sample: silhouette sample size (0 = all rows)
+    :param fi_seed: random seed
+    :return: best number of clusters for the model (used for KMeans n_clusters)
+    """
+    # evaluate candidates
+    llst_results = kmeans_sweep(data, flst_k, fi_workers, fi_sample, fi_seed)
+
+    for ldct_res in llst_results:
+        print(f"k={ldct_res['k']:<3} silhouette={ldct_res['silhouette']:.4f} "
+              f"calinski={ldct_res['calinski']:.1f} inertia={ldct_res['inertia']:.1f} "
+              f"time={ldct_res['fit_s'] + ldct_res['score_s']:.2f}s")
+
+    # pyplot (None se não há figuras)
+    plt = _pyplot()
+
+    if plt:
+        # plotting silhouette score
+        silhouette_scores = [ldct_res["silhouette"] for ldct_res in llst_results]
+        plt.bar(range(len(silhouette_scores)), silhouette_scores, align='center', color='#722f59', width=0.5)
+        plt.xticks(range(len(silhouette_scores)), [ldct_res["k"] for ldct_res in llst_results])
+        plt.title('Silhouette Score', fontweight='bold')
+        plt.xlabel('Number of Clusters')
+        _show(plt, "silhouette")
+
+    return best_k(llst_results, fs_criterion)
 
 # ---------------------------------------------------------------------------------------------
 def visualizing_results(pca_result, label, centroids_pca):
@@ -127,6 +559,12 @@ def visualizing_results(pca_result, label, centroids_pca):
     :param label: K Means labels
     :param centroids_pca: PCA format K Means centroids
     """
+    # pyplot (None se não há figuras)
+    plt = _pyplot()
+
+    if not plt:
+        return
+
     # ------------------ Using Matplotlib for plotting-----------------------
     x = pca_result[:, 0]
     y = pca_result[:, 1]
@@ -138,58 +576,263 @@ def visualizing_results(pca_result, label, centroids_pca):
 
     plt.scatter(centroids_pca[:, 0], centroids_pca[:, 1],
                 marker='X', s=200, linewidths=1.5,
-                color='red', edgecolors="black", lw=1.5)
-    plt.show()
+                color='red', edgecolors="black")
+    _show(plt, "clusters")
+
+# ---------------------------------------------------------------------------------------------
+def make_link(flst_labels: list, flst_fnames: list = None, fi_label: int = None,
+              fv_export: bool = False):
+    """
+    save cluster labels to the indexed results table and optionally export symlinks
+
+    :param flst_labels: cluster labels
+    :param flst_fnames: filenames of the labelled rows (None = sorted image directory)
+    :param fi_label: export only this label (None = all labels)
+    :param fv_export: export symlinks to DS_DIR_IMG/kmeans
+    """
+    # nomes dos arquivos não fornecidos ?
+    if flst_fnames is None:
+        # diretório de imagens (mesma ordem do CSV gerado por analytics)
+        flst_fnames = [ls_fname for ls_fname in sorted(os.listdir(DS_DIR_IMG))
+                       if ls_fname.endswith(".jpg") or ls_fname.endswith(".png")]
+
+    # connect to the results database
+    lconn = gr.connect()
+
+    # save labels (replaces the previous clustering)
+    gr.save_results(lconn, "kmeans", flst_fnames, flst_labels, flst_fnames)
+    lconn.commit()
+
+    # exporta os links ?
+    if fv_export or fi_label is not None:
+        # sorted view by label (optionally one label only)
+        llst_rows = gr.sorted_view(lconn, "kmeans", ff_value=fi_label)
+
+        # export links (<label>_<filename>)
+        li_links = gr.export_links(DS_DIR_IMG, "kmeans", llst_rows, "{value:02.0f}_{fname}")
+        print(f"{li_links} links exported")
+
+    # close the connection
+    lconn.close()
+
+# ---------------------------------------------------------------------------------------------
+def feature_names(fs_features: str = DLST_FEATURES[0]) -> list:
+    """
+    feature column names of the archive (columnar store / embeddings, else the legacy CSV header)
+
+    :param fs_features: ga, embed or both
+    """
+    # memory-mapped archive
+    lt_archive = open_features(fs_features)
+
+    if lt_archive is not None:
+        return lt_archive[1]
+
+    # pandas
+    import pandas as pd
+
+    # CSV header
+    return pd.read_csv(DS_CSV, nrows=0).columns.tolist()
 
 # ---------------------------------------------------------------------------------------------
-def make_link(flst_labels: list):
+def iter_chunks(fi_chunk: int = D_CHUNK, fs_features: str = DLST_FEATURES[0]):
     """
-    write image
+    read the feature archive in chunks (memory-mapped store / embeddings, else the legacy CSV)
+
+    :param fi_chunk: rows per chunk
+    :param fs_features: ga, embed or both
+
+    :returns: generator of (filenames, values (rows x features, float64))
     """
-    # index
-    li_ndx = 0
-    # percorre o diretório de imagens...
-    for ls_filename in os.listdir(DS_DIR_IMG):
-        # é um arquivo de imagem ?
-        if ls_filename.endswith(".jpg") or ls_filename.endswith(".png"):
-            # caminho completo para a imagem
-            ls_image_path = os.path.join(DS_DIR_IMG, ls_filename)
+    # memory-mapped archive
+    lt_archive = open_features(fs_features)
 
-            # caminho da imagem
-            ls_src = os.path.join("..", ls_filename)
-            
-            # caminho completo para a saída
-            ls_dst = os.path.join(DS_DIR_IMG, "kmeans", f'{flst_labels[li_ndx]:02d}_' + ls_filename)
+    if lt_archive is not None:
+        # somente as fatias lidas vão para a memória
+        l_fnames, _, lf_rows = lt_archive
 
-            # increment index
-            li_ndx += 1
-            
-            try:
-                # create a symbolic link pointing to src named dst using os.symlink() method
-                os.symlink(ls_src, ls_dst)
+        for li_ini in range(0, len(l_fnames), fi_chunk):
+            # fatia das linhas
+            l_slice = slice(li_ini, li_ini + fi_chunk)
 
-            # em caso de erro...
-            except FileExistsError:
-                # remove previous link
-                os.remove(ls_dst)
+            yield l_fnames[l_slice].astype(str).tolist(), lf_rows(l_slice)
 
-                # create a symbolic link pointing to src named dst using os.symlink() method
-                os.symlink(ls_src, ls_dst)
+    else:
+        # pandas
+        import pandas as pd
+
+        # diretório de imagens (mesma ordem do CSV gerado por analytics)
+        llst_fnames = [ls_fname for ls_fname in sorted(os.listdir(DS_DIR_IMG))
+                       if ls_fname.endswith(".jpg") or ls_fname.endswith(".png")]
+        li_ini = 0
+
+        for ldf_chunk in pd.read_csv(DS_CSV, chunksize=fi_chunk):
+            yield llst_fnames[li_ini:li_ini + len(ldf_chunk)], ldf_chunk.to_numpy(dtype=np.float64)
+            li_ini += len(ldf_chunk)
+
+# ---------------------------------------------------------------------------------------------
+def stream_fit(fi_chunk: int = D_CHUNK, fi_k: int = None, flst_k: list = None,
+               fs_criterion: str = DLST_CRITERIA[0], fi_workers: int = D_WORKERS,
+               fi_sample: int = D_SAMPLE, fi_seed: int = D_SEED, fs_features: str = DLST_FEATURES[0]):
+    """
+    out-of-core fit: incremental scaler statistics, IncrementalPCA and MiniBatchKMeans over
+    chunks of the archive. Memory is bounded by the chunk and sample sizes.
+
+    :param fi_chunk: rows per chunk
+    :param fi_k: number of clusters (None = k sweep on a random sample)
+    :param flst_k: candidate numbers of clusters
+    :param fs_criterion: silhouette, calinski or elbow
+    :param fi_workers: number of worker processes for the k sweep
+    :param fi_sample: sample size (k sweep, KMeans init and plot); 0 = D_SAMPLE, the
+                      in-memory sample is always bounded
+    :param fi_seed: random seed
+    :param fs_features: ga, embed or both
+
+    :return: scaler, pca, kmeans, scaled sample
+    """
+    # sklearn
+    from sklearn.cluster import MiniBatchKMeans
+    from sklearn.decomposition import IncrementalPCA
+    from sklearn.preprocessing import StandardScaler
+
+    # 1st pass: scaler statistics
+    l_scaler = StandardScaler()
+    li_nrows = 0
+
+    for _, l_chunk in iter_chunks(fi_chunk, fs_features):
+        l_scaler.partial_fit(l_chunk)
+        li_nrows += len(l_chunk)
+
+    print(f'There are {li_nrows} rows and {l_scaler.n_features_in_} columns')
+
+    # tamanho da amostra em memória (nunca o arquivo inteiro)
+    li_sample = min(fi_sample if fi_sample > 0 else D_SAMPLE, li_nrows)
+
+    # linhas da amostra (sorteadas antes da leitura)
+    l_rng = np.random.default_rng(fi_seed)
+    l_rows = np.sort(l_rng.choice(li_nrows, size=li_sample, replace=False))
+
+    # 2nd pass: PCA and sample
+    l_pca = IncrementalPCA(n_components=2)
+    llst_sample = []
+    li_ini = 0
+
+    for _, l_chunk in iter_chunks(fi_chunk, fs_features):
+        # scaled chunk
+        l_scaled = l_scaler.transform(l_chunk)
+
+        # IncrementalPCA precisa de ao menos n_components linhas por bloco
+        if len(l_scaled) >= l_pca.n_components:
+            l_pca.partial_fit(l_scaled)
+
+        # linhas da amostra neste bloco
+        l_sel = l_rows[(l_rows >= li_ini) & (l_rows < li_ini + len(l_chunk))] - li_ini
+        llst_sample.append(l_scaled[l_sel])
+        li_ini += len(l_chunk)
+
+    l_sample = np.concatenate(llst_sample)
+
+    print('Explained variation per principal component: {}'.format(l_pca.explained_variance_ratio_))
+
+    # número de clusters não fornecido ?
+    if fi_k is None:
+        # k sweep on the sample
+        fi_k = best_k(kmeans_sweep(l_sample, flst_k, fi_workers, fi_sample, fi_seed), fs_criterion)
+
+    print("optimum num of clusters =", fi_k)
+
+    # inicializa os centróides na amostra (os blocos seguem a ordem temporal do arquivo)
+    l_kmeans = MiniBatchKMeans(n_clusters=fi_k, n_init=3, random_state=fi_seed,
+                               batch_size=min(fi_chunk, 4096)).fit(l_sample)
+
+    # 3rd pass: MiniBatchKMeans
+    for _, l_chunk in iter_chunks(fi_chunk, fs_features):
+        l_kmeans.partial_fit(l_scaler.transform(l_chunk))
+
+    # return fitted pipeline
+    return l_scaler, l_pca, l_kmeans, l_sample
+
+# ---------------------------------------------------------------------------------------------
+def stream_labels(f_scaler, f_kmeans, fi_chunk: int = D_CHUNK, fi_label: int = None,
+                  fv_export: bool = False, fs_features: str = DLST_FEATURES[0]):
+    """
+    label the archive chunk by chunk and save the labels to the indexed results table
+
+    :param f_scaler: fitted scaler
+    :param f_kmeans: fitted kmeans
+    :param fi_chunk: rows per chunk
+    :param fi_label: export only this label (None = all labels)
+    :param fv_export: export symlinks to DS_DIR_IMG/kmeans
+    :param fs_features: ga, embed or both
+    """
+    # connect to the results database
+    lconn = gr.connect()
+
+    # replaces the previous clustering
+    gr.delete_metric(lconn, "kmeans")
+
+    for llst_fnames, l_chunk in iter_chunks(fi_chunk, fs_features):
+        # save labels of the chunk
+        gr.save_results(lconn, "kmeans", llst_fnames, f_kmeans.predict(f_scaler.transform(l_chunk)))
+
+    lconn.commit()
+
+    # exporta os links ?
+    if fv_export or fi_label is not None:
+        # export links (<label>_<filename>)
+        li_links = gr.export_links(DS_DIR_IMG, "kmeans", gr.sorted_view(lconn, "kmeans", ff_value=fi_label),
+                                   "{value:02.0f}_{fname}")
+        print(f"{li_links} links exported")
+
+    # close the connection
+    lconn.close()
 
 # ---------------------------------------------------------------------------------------------
 def main():
+    # get program arguments
+    l_args = arg_parse()
+
+    # figures output (headless no modo batch)
+    set_plots(not l_args.batch, l_args.plots)
+
+    # out-of-core mode ?
+    if l_args.stream:
+        print("1. Fitting scaler, PCA and MiniBatchKMeans over chunks\n")
+        scaler, pca_2, kmeans, sample = stream_fit(l_args.chunk, l_args.clusters, l_args.k_values,
+                                                   l_args.criterion, l_args.workers, l_args.sample,
+                                                   l_args.seed, l_args.features)
+
+        print("\n\n2. Visualizing the sample")
+        visualizing_results(pca_2.transform(sample), kmeans.predict(sample),
+                            pca_2.transform(kmeans.cluster_centers_))
+
+        print("\n\n3. Saving labels")
+        stream_labels(scaler, kmeans, l_args.chunk, l_args.label, l_args.links, l_args.features)
+
+        # save fitted pipeline
+        gmd.ClusterModel.from_fitted(feature_names(l_args.features), scaler, kmeans,
+                                     pca_2).save(l_args.model)
+
+        # return
+        return
+
     print("1. Loading Fog dataset\n")
-    data_scaled = load_embeddings()
+    data_scaled, scaler = load_embeddings(l_args.features)
 
     print("\n\n2. Reducing via PCA\n")
     pca_result, pca_2 = pca_embeddings(data_scaled)
 
     print("\n\n3. HyperTuning the Parameter for KMeans\n")
-    optimum_num_clusters = kmean_hyper_param_tuning(data_scaled)
+    optimum_num_clusters = l_args.clusters or \
+                           kmean_hyper_param_tuning(data_scaled, l_args.k_values, l_args.criterion,
+                                                    l_args.workers, l_args.sample, l_args.seed)
     print("optimum num of clusters =", optimum_num_clusters)
 
+    # sklearn
+    from sklearn.cluster import KMeans
+
     # fitting KMeans
-    kmeans = KMeans(n_clusters=optimum_num_clusters, n_init="auto")
+    kmeans = KMeans(n_clusters=optimum_num_clusters, n_init="auto", random_state=l_args.seed)
     labels = kmeans.fit_predict(data_scaled)
 
     centroids = kmeans.cluster_centers_
@@ -198,8 +841,12 @@ def main():
     print("\n\n4. Visualizing the data")
     visualizing_results(pca_result, kmeans.labels_, centroids_pca)
 
-    print("\n\n5. Making links")
-    make_link(labels)
+    print("\n\n5. Saving labels")
+    make_link(labels, list(data_scaled.index) if "filename" == data_scaled.index.name else None,
+              l_args.label, l_args.links)
+
+    print("\n\n6. Saving model")
+    gmd.ClusterModel.from_fitted(list(data_scaled.columns), scaler, kmeans, pca_2).save(l_args.model)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+"""
+gor_capture
+
+amostragem de quadros sobre o cv2.VideoCapture.  O stream avança com grab() (lê o
+pacote sem decodificar) e retrieve() (a decodificação) só é chamado quando algum
+consumidor precisa do quadro.  Cada consumidor (inferência, foto, gravação) registra a
+sua política: a cada N quadros e/ou a cada T segundos.
+
+uso:
+    lo_sampler = gc.FrameSampler(l_cap)
+    lo_sampler.add("detect", fi_every=2)
+    lo_sampler.add("photo", ff_period=180.)
+
+    l_ret, l_frame, llst_due = lo_sampler.next()
+
+    if "photo" in llst_due:
+        take_photo(l_frame)
+
+para consumidores esporádicos (uma foto a cada minutos), LatestFrameReader drena o stream
+numa thread e mantém somente o quadro mais recente num único slot:
+
+    lo_reader = gc.LatestFrameReader(l_cap)
+    lo_reader.start()
+
+    l_ret, l_frame = lo_reader.latest()
+
+2023.may  mlabru  initial version (Linux/Python)
+"""
+# < imports >----------------------------------------------------------------------------------
+
+# python library
+import logging
+import threading
+import time
+
+# local
+import gor_defs as df
+import gor_stats as gs
+
+# < logging >----------------------------------------------------------------------------------
+
+# logger
+M_LOG = logging.getLogger(__name__)
+M_LOG.setLevel(df.DI_LOG_LEVEL)
+
+# =============================================================================================
+class FrameSampler:
+    """
+    grab/retrieve por política de consumidor
+    """
+    # -----------------------------------------------------------------------------------------
+    def __init__(self, f_cap):
+        """
+        constructor
+
+        :param f_cap: cv2.VideoCapture
+        """
+        # video capture
+        self.o_cap = f_cap
+
+        # políticas {consumidor: [a cada N quadros, período (s), próximo instante]}
+        self.dct_policy = {}
+
+        # pedidos avulsos (consumidores que querem o próximo quadro)
+        self.set_requests = set()
+
+        # quadros lidos e decodificados
+        self.i_grabbed = 0
+        self.i_decoded = 0
+
+    # -----------------------------------------------------------------------------------------
+    def add(self, fs_name: str, fi_every: int = 0, ff_period: float = 0., fv_first: bool = True):
+        """
+        registra um consumidor
+
+        :param fs_name: nome do consumidor
+        :param fi_every: quer um a cada fi_every quadros (0 = sem cadência por quadro)
+        :param ff_period: quer um quadro a cada ff_period segundos (0 = sem cadência por tempo)
+        :param fv_first: o primeiro quadro já é devido (senão, somente após ff_period)
+        """
+        # sem cadência ?
+        if fi_every <= 0 and ff_period <= 0.:
+            # raise error
+            raise ValueError(f"Consumer {fs_name} without frame or time cadence")
+
+        # próximo instante
+        lf_next = time.monotonic() + (0. if fv_first else ff_period)
+
+        # save policy
+        self.dct_policy[fs_name] = [fi_every, ff_period, lf_next]
+
+    # -----------------------------------------------------------------------------------------
+    def _due(self, ff_now: float) -> list:
+        """
+        consumidores que querem o quadro atual
+        """
+        # consumidores
+        llst_due = []
+
+        for ls_name, llst_policy in self.dct_policy.items():
+            li_every, lf_period, lf_next = llst_policy
+
+            # cadência por quadro ?
+            lv_due = li_every > 0 and 0 == (self.i_grabbed - 1) % li_every
+
+            # cadência por tempo ?
+            if lf_period > 0. and ff_now >= lf_next:
+                # próximo instante (grade absoluta, sem deriva)
+                llst_policy[2] = lf_next + ((ff_now - lf_next) // lf_period + 1) * lf_period
+                lv_due = True
+
+            if lv_due:
+                llst_due.append(ls_name)
+
+        # pedidos avulsos
+        llst_due.extend(self.set_requests.difference(llst_due))
+        self.set_requests.clear()
+
+        # return consumers
+        return llst_due
+
+    # -----------------------------------------------------------------------------------------
+    def request(self, fs_name: str) -> None:
+        """
+        pede o próximo quadro para um consumidor (p.ex. tarefa do gor_sched)
+
+        :param fs_name: nome do consumidor
+        """
+        # save request
+        self.set_requests.add(fs_name)
+
+    # -----------------------------------------------------------------------------------------
+    def next(self, ff_now: float = None):
+        """
+        avança um quadro, decodificando-o só se algum consumidor o quer
+
+        :param ff_now: instante atual (s, monotonic)
+
+        :returns: (ok, quadro decodificado ou None, lista de consumidores)
+        """
+        with gs.timer("frame.grab"):
+            # advance stream (no decode)
+            lv_ret = self.o_cap.grab()
+
+        if not lv_ret:
+            # fim do stream
+            return False, None, []
+
+        # quadros lidos
+        self.i_grabbed += 1
+
+        # consumidores do quadro
+        llst_due = self._due(time.monotonic() if ff_now is None else ff_now)
+
+        # ninguém quer o quadro ?
+        if not llst_due:
+            # frame skipped (not decoded)
+            gs.count("frame.skipped")
+
+            # return not decoded
+            return True, None, []
+
+        with gs.timer("frame.retrieve"):
+            # decode frame
+            lv_ret, l_frame = self.o_cap.retrieve()
+
+        if not lv_ret:
+            # erro de decodificação
+            return False, None, []
+
+        # quadros decodificados
+        self.i_decoded += 1
+
+        # return frame and consumers
+        return True, l_frame, llst_due
+
+# =============================================================================================
+class LatestFrameReader(threading.Thread):
+    """
+    leitor em background que drena o stream e guarda só o quadro mais recente.  Por
+    padrão o slot é o último pacote lido por grab() (não decodificado) e latest()
+    decodifica sob demanda; com fv_decode todo quadro é decodificado e o slot guarda a
+    imagem.  A memória é limitada a um quadro; latest() não espera pelo stream (no
+    máximo pelo grab em curso, um intervalo de quadro, no modo não decodificado).
+    """
+    # -----------------------------------------------------------------------------------------
+    def __init__(self, f_cap, fv_decode: bool = False):
+        """
+        constructor
+
+        :param f_cap: cv2.VideoCapture (de uso exclusivo do leitor)
+        :param fv_decode: decodifica todo quadro (senão, somente em latest)
+        """
+        # init super class
+        super().__init__(name="reader", daemon=True)
+
+        # video capture
+        self.o_cap = f_cap
+        self.v_decode = fv_decode
+
+        # slot: quadro decodificado (fv_decode) e instante do último quadro lido
+        self.a_frame = None
+        self.f_time = None
+
+        # locks: captura (grab e retrieve não podem ser concorrentes) e slot
+        self.o_cap_lock = threading.Lock()
+        self.o_lock = threading.Lock()
+
+        # primeiro quadro lido, fim do stream e parada
+        self.o_ready = threading.Event()
+        self.o_eof = threading.Event()
+        self.o_stop = threading.Event()
+
+    # -----------------------------------------------------------------------------------------
+    def run(self):
+        """
+        drena o stream até o fim ou até stop()
+        """
+        # keep running...
+        while not self.o_stop.is_set():
+            # quadro decodificado
+            l_frame = None
+
+            with self.o_cap_lock:
+                # advance stream
+                lv_ret = self.o_cap.grab()
+
+                # decode frame ?
+                if lv_ret and self.v_decode:
+                    lv_ret, l_frame = self.o_cap.retrieve()
+
+            if not lv_ret:
+                # fim do stream
+                break
+
+            with self.o_lock:
+                # substitui o quadro do slot e o instante do quadro
+                self.a_frame = l_frame
+                self.f_time = time.monotonic()
+
+            # quadros lidos
+            gs.count("reader.frames")
+            self.o_ready.set()
+
+        # fim do stream (libera quem espera)
+        self.o_eof.set()
+        self.o_ready.set()
+
+    # -----------------------------------------------------------------------------------------
+    def latest(self, ff_timeout: float = None):
+        """
+        quadro mais recente
+
+        :param ff_timeout: espera máxima (s) pelo primeiro quadro (None = sem limite)
+
+        :returns: (ok, quadro)
+        """
+        # espera pelo primeiro quadro
+        if not self.o_ready.wait(ff_timeout):
+            return False, None
+
+        with self.o_lock:
+            # stream sem quadros ?
+            if self.f_time is None:
+                return False, None
+
+            # idade do quadro
+            gs.observe("reader.age", time.monotonic() - self.f_time)
+
+            # quadro já decodificado ?
+            if self.v_decode:
+                return True, self.a_frame
+
+        # stream terminou (o último pacote não pode mais ser decodificado) ?
+        if self.o_eof.is_set():
+            return False, None
+
+        with self.o_cap_lock, gs.timer("frame.retrieve"):
+            # decode newest packet (espera no máximo o grab em curso)
+            return self.o_cap.retrieve()
+
+    # -----------------------------------------------------------------------------------------
+    def stop(self) -> None:
+        """
+        para o leitor
+        """
+        # stop
+        self.o_stop.set()
+        self.join()
+
+# < the end >----------------------------------------------------------------------------------
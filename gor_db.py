@@ -11,6 +11,9 @@ import logging
 import os
 import sqlite3
 
+# numPy
+import numpy as np
+
 # local
 import gor_defs as df
 import gor_util as gu
@@ -107,7 +110,7 @@ def create_table(f_conn, fs_create_table_sql: str):
         lcur.execute(fs_create_table_sql)
 
     # em caso de erro...
-    except Error as lerr:
+    except sqlite3.Error as lerr:
         # print error
         M_LOG.error("error: %s", str(lerr))
 
@@ -196,5 +199,62 @@ def save2dbmet(f_conn, fs_station: str, fs_date: str, fs_metar: str, fs_fname: s
             # logger
             M_LOG.error("the sqlite connection is closed")
     """
+# ---------------------------------------------------------------------------------------------
+def save2dbtiles(f_conn, flst_tiles: list):
+    """
+    save regional fog statistics to DB
+
+    :param f_conn: connection object
+    :param flst_tiles: list of (station, date, grids), grids array (3, rows, cols) with
+                       mean, std and Sobel energy
+    """
+    # check input
+    assert f_conn
+
+    # create tiles table
+    create_table(f_conn, df.DS_SQL_TILES)
+
+    # build query
+    ls_sql = "INSERT OR REPLACE INTO tiles (station, date, n_rows, n_cols, mean, std, energy) " \
+             "VALUES (?, ?, ?, ?, ?, ?, ?);"
+    M_LOG.debug("ls_sql: %s", str(ls_sql))
+
+    # convert data into tuple format (grids as little-endian float32 blobs)
+    llst_data = [(ls_station, ls_date, l_grids.shape[1], l_grids.shape[2],
+                  *(l_grid.astype("<f4").tobytes() for l_grid in l_grids))
+                 for ls_station, ls_date, l_grids in flst_tiles]
+
+    try:
+        # execute query
+        f_conn.executemany(ls_sql, llst_data)
+
+    # em caso de erro...
+    except sqlite3.Error as lerr:
+        # logger
+        M_LOG.error("Failed to insert tiles into sqlite table. %s", str(lerr))
+
+# ---------------------------------------------------------------------------------------------
+def load_tiles(f_conn, fs_station: str, fs_date: str):
+    """
+    load regional fog statistics from DB
+
+    :param f_conn: connection object
+    :param fs_station: station code
+    :param fs_date: image date
+
+    :returns: grids array (3, rows, cols) with mean, std and Sobel energy, or None
+    """
+    # execute query
+    l_row = f_conn.execute("SELECT n_rows, n_cols, mean, std, energy FROM tiles "
+                           "WHERE station = ? AND date = ?;", (fs_station, fs_date)).fetchone()
+
+    if l_row is None:
+        # not found
+        return None
+
+    # rebuild grids
+    return np.stack([np.frombuffer(l_blob, dtype="<f4").reshape(l_row[0], l_row[1])
+                     for l_blob in l_row[2:]])
+
 # < the end >----------------------------------------------------------------------------------
             
\ No newline at end of file
@@ -60,6 +60,17 @@ DS_SQL_GORMET ='''CREATE TABLE IF NOT EXISTS sshots (
                   image   BLOB,
                   PRIMARY KEY (station, date));'''
 """
+# create tiles table (regional fog statistics, float32 grids rows x cols)
+DS_SQL_TILES = '''CREATE TABLE IF NOT EXISTS tiles (
+                 station TEXT    NOT NULL,
+                 date    TEXT    NOT NULL,
+                 n_rows  INTEGER NOT NULL,
+                 n_cols  INTEGER NOT NULL,
+                 mean    BLOB,
+                 std     BLOB,
+                 energy  BLOB,
+                 PRIMARY KEY (station, date));'''
+
 # < constants >--------------------------------------------------------------------------------
 
 # screen top left
@@ -8,6 +8,8 @@ gor_ia
 
 # python library
 import logging
+import threading
+import time
 
 # numPy
 import numpy as np
@@ -15,9 +17,6 @@ import numpy as np
 # openCV
 import cv2
 
-# imutils
-import imutils
-
 # local
 import gor_defs as df
 
@@ -31,6 +30,27 @@ D_CLASSES = ["background", "aeroplane", "bicycle", "bird", "boat", "bottle", "bu
 # ...then generate a set of bounding box colors for each class
 D_COLORS = np.random.uniform(0, 255, size=(len(D_CLASSES), 3))
 
+# MobileNet SSD input size, scale factor and mean
+DT_SIZE = (300, 300)
+DF_SCALE = 0.007843
+DF_MEAN = 127.5
+
+# detection record: class index, confidence, box (x1, y1, x2, y2) in frame pixels and
+# track id (-1 for raw detections)
+DT_DETECTION = np.dtype([("class", np.int32), ("confidence", np.float32), ("box", np.float32, (4,)),
+                         ("track", np.int32)])
+
+# minimum IoU to associate a detection with a track
+DF_TRACK_IOU = 0.3
+
+# change detector: downscaled frame size, pixel threshold, changed area fraction,
+# forced refresh (s) and background learning rate
+DT_GATE_SIZE = (160, 90)
+DI_GATE_THRESHOLD = 25
+DF_GATE_AREA = 0.002
+DF_GATE_REFRESH = 10.
+DF_GATE_ALPHA = 0.05
+
 # < logging >----------------------------------------------------------------------------------
 
 # logger
@@ -51,43 +71,342 @@ def load_model(f_args):
     return cv2.dnn.readNetFromCaffe(f_args.proto, f_args.model)
 
 # ---------------------------------------------------------------------------------------------
-def detect(f_model, f_confidence, f_frame):
+def class_ids(flst_classes: list):
     """
-    create a database connection to the SQLite database specified by fs_file_db
+    class indexes of a list of class names or indexes
 
-    :param f_frame: frame
+    :param flst_classes: class names (D_CLASSES) or indexes; None = all classes
+
+    :returns: array of class indexes or None
+    """
+    # todas as classes ?
+    if flst_classes is None:
+        return None
+
+    # return class indexes
+    return np.array([D_CLASSES.index(l_cls) if isinstance(l_cls, str) else int(l_cls)
+                     for l_cls in flst_classes], dtype=np.int32)
+
+# ---------------------------------------------------------------------------------------------
+def detect_batch(f_model, f_confidence, flst_frames: list, flst_classes: list = None) -> list:
     """
-    # resize frame
-    l_frame = imutils.resize(f_frame, width=400)
+    detect objects in several frames with a single forward pass
 
-    # grab the frame dimensions
-    (h, w) = l_frame.shape[:2]
+    :param f_model: MobileNet SSD
+    :param f_confidence: minimum confidence
+    :param flst_frames: frames (any size; blobFromImages resizes each one directly to 300x300)
+    :param flst_classes: keep only these classes (names or indexes); None = all classes
 
-    # convert to a blob
-    l_blob = cv2.dnn.blobFromImage(cv2.resize(l_frame, (300, 300)), 0.007843, (300, 300), 127.5)
+    :returns: per-frame detections, one DT_DETECTION array per frame
+    """
+    # sem quadros ?
+    if not flst_frames:
+        return []
+
+    # convert all frames to a single blob (one resize per frame)
+    l_blob = cv2.dnn.blobFromImages(flst_frames, DF_SCALE, DT_SIZE, DF_MEAN)
 
     # pass the blob through the network and obtain the detections and predictions
     f_model.setInput(l_blob)
-    # obtain the detections and predictions
-    detections = f_model.forward()
+    # obtain the detections (1 x 1 x n x 7) of all frames: [image, class, confidence, box]
+    l_det = f_model.forward().reshape(-1, 7)
+
+    # filter out weak detections (vectorized mask)
+    l_mask = l_det[:, 2] > f_confidence
+
+    # class filter ?
+    if flst_classes is not None:
+        l_mask &= np.isin(l_det[:, 1].astype(np.int32), class_ids(flst_classes))
+
+    l_det = l_det[l_mask]
+
+    # detections of each frame (column 0 is the frame index in the batch)
+    llst_result = []
 
+    for li_ndx, l_frame in enumerate(flst_frames):
+        # rows of this frame
+        l_rows = l_det[l_det[:, 0] == li_ndx]
+
+        # grab the frame dimensions
+        li_h, li_w = l_frame.shape[:2]
+
+        # structured result (box from [0, 1] to frame pixels)
+        l_res = np.empty(len(l_rows), dtype=DT_DETECTION)
+        l_res["class"] = l_rows[:, 1]
+        l_res["confidence"] = l_rows[:, 2]
+        l_res["box"] = l_rows[:, 3:7] * np.array([li_w, li_h, li_w, li_h], dtype=np.float32)
+        l_res["track"] = -1
+
+        llst_result.append(l_res)
+
+    # return per-frame detections
+    return llst_result
+
+# ---------------------------------------------------------------------------------------------
+def detect(f_model, f_confidence, f_frame, flst_classes: list = None):
+    """
+    detect objects in a frame
+
+    :param f_model: MobileNet SSD
+    :param f_confidence: minimum confidence
+    :param f_frame: frame
+    :param flst_classes: keep only these classes (names or indexes); None = all classes
+
+    :returns: DT_DETECTION array
+    """
+    # return detections
+    return detect_batch(f_model, f_confidence, [f_frame], flst_classes)[0]
+
+# ---------------------------------------------------------------------------------------------
+def draw(f_frame, f_detections):
+    """
+    draw detections on a frame (in place)
+
+    :param f_frame: frame
+    :param f_detections: DT_DETECTION array of this frame
+
+    :returns: the frame
+    """
     # loop over the detections
-    for i in np.arange(0, detections.shape[2]):
-        # extract the confidence (i.e., probability) associated with the prediction
-        confidence = detections[0, 0, i, 2]
-
-        # filter out weak detections by ensuring the `confidence` is greater than the minimum confidence
-        if confidence > f_confidence:
-            # extract the index of the class label from the `detections`
-            idx = int(detections[0, 0, i, 1])
-            # then compute the (x, y)-coordinates of the bounding box for the object
-            box = detections[0, 0, i, 3:7] * np.array([w, h, w, h])
-            (startX, startY, endX, endY) = box.astype("int")
-
-            # draw the prediction on the frame
-            label = "{}: {:.2f}%".format(D_CLASSES[idx], confidence * 100)
-            cv2.rectangle(l_frame, (startX, startY), (endX, endY), D_COLORS[idx], 2)
-            y = startY - 15 if startY - 15 > 15 else startY + 15
-            cv2.putText(l_frame, label, (startX, y), cv2.FONT_HERSHEY_SIMPLEX, 0.5, D_COLORS[idx], 2)
+    for l_det in f_detections:
+        # class, confidence and box
+        li_idx = int(l_det["class"])
+        (startX, startY, endX, endY) = l_det["box"].astype(int)
+
+        # draw the prediction on the frame
+        label = "{}: {:.2f}%".format(D_CLASSES[li_idx], l_det["confidence"] * 100)
+        cv2.rectangle(f_frame, (startX, startY), (endX, endY), D_COLORS[li_idx], 2)
+        y = startY - 15 if startY - 15 > 15 else startY + 15
+        cv2.putText(f_frame, label, (startX, y), cv2.FONT_HERSHEY_SIMPLEX, 0.5, D_COLORS[li_idx], 2)
+
+    # return frame
+    return f_frame
+
+# =============================================================================================
+class MotionGate:
+    """
+    detector de mudança barato na frente da inferência: o quadro reduzido (tons de
+    cinza) é comparado a um fundo médio móvel; a rede só roda se uma fração mínima dos
+    pixels mudou ou se o intervalo de atualização forçada expirou.
+    """
+    # -----------------------------------------------------------------------------------------
+    def __init__(self, fi_threshold: int = DI_GATE_THRESHOLD, ff_area: float = DF_GATE_AREA,
+                 ff_refresh: float = DF_GATE_REFRESH, ff_alpha: float = DF_GATE_ALPHA):
+        """
+        constructor
+
+        :param fi_threshold: diferença mínima (0-255) para um pixel ser considerado mudado
+        :param ff_area: fração mínima de pixels mudados para rodar a rede
+        :param ff_refresh: intervalo máximo (s) sem rodar a rede
+        :param ff_alpha: taxa de aprendizado do fundo
+        """
+        # parâmetros
+        self.i_threshold = fi_threshold
+        self.f_area = ff_area
+        self.f_refresh = ff_refresh
+        self.f_alpha = ff_alpha
+
+        # fundo (float32) e instante da última inferência
+        self.a_background = None
+        self.f_last = 0.
+
+        # fração de pixels mudados no último quadro
+        self.f_changed = 0.
+
+    # -----------------------------------------------------------------------------------------
+    def check(self, f_frame, ff_now: float = None) -> bool:
+        """
+        verifica se o quadro deve passar pela rede
+
+        :param f_frame: quadro (BGR ou tons de cinza)
+        :param ff_now: instante atual (s, monotonic)
+
+        :returns: True se houve mudança ou a atualização forçada expirou
+        """
+        # instante atual
+        lf_now = time.monotonic() if ff_now is None else ff_now
+
+        # quadro reduzido em tons de cinza, suavizado
+        l_small = cv2.resize(f_frame, DT_GATE_SIZE, interpolation=cv2.INTER_AREA)
+
+        if 3 == l_small.ndim:
+            l_small = cv2.cvtColor(l_small, cv2.COLOR_BGR2GRAY)
+
+        l_small = cv2.GaussianBlur(l_small, (5, 5), 0)
+
+        # primeiro quadro ?
+        if self.a_background is None:
+            self.a_background = l_small.astype(np.float32)
+            self.f_changed = 1.
+
+        else:
+            # fração de pixels mudados em relação ao fundo
+            l_diff = cv2.absdiff(l_small, cv2.convertScaleAbs(self.a_background))
+            self.f_changed = np.count_nonzero(l_diff > self.i_threshold) / l_diff.size
+
+            # atualiza o fundo
+            cv2.accumulateWeighted(l_small, self.a_background, self.f_alpha)
+
+        # mudou ou atualização forçada ?
+        if self.f_changed >= self.f_area or lf_now - self.f_last >= self.f_refresh:
+            # instante da inferência
+            self.f_last = lf_now
+
+            # run inference
+            return True
+
+        # skip inference
+        return False
+
+# ---------------------------------------------------------------------------------------------
+def iou(f_boxes_a, f_boxes_b):
+    """
+    intersection over union of two sets of boxes
+
+    :param f_boxes_a: boxes (n x 4), x1, y1, x2, y2
+    :param f_boxes_b: boxes (m x 4)
+
+    :returns: IoU matrix (n x m)
+    """
+    # boxes
+    l_a = np.asarray(f_boxes_a, dtype=np.float32).reshape(-1, 1, 4)
+    l_b = np.asarray(f_boxes_b, dtype=np.float32).reshape(1, -1, 4)
+
+    # intersection
+    l_w = np.clip(np.minimum(l_a[..., 2], l_b[..., 2]) - np.maximum(l_a[..., 0], l_b[..., 0]), 0, None)
+    l_h = np.clip(np.minimum(l_a[..., 3], l_b[..., 3]) - np.maximum(l_a[..., 1], l_b[..., 1]), 0, None)
+    l_inter = l_w * l_h
+
+    # areas
+    l_area_a = (l_a[..., 2] - l_a[..., 0]) * (l_a[..., 3] - l_a[..., 1])
+    l_area_b = (l_b[..., 2] - l_b[..., 0]) * (l_b[..., 3] - l_b[..., 1])
+
+    # return IoU
+    return l_inter / np.maximum(l_area_a + l_area_b - l_inter, 1e-6)
+
+# =============================================================================================
+class Tracker:
+    """
+    rastreador leve entre quadros-chave: as detecções da rede (update) são associadas às
+    trilhas por IoU e, entre quadros-chave, as caixas são levadas adiante com a velocidade
+    estimada de cada trilha (predict), sem custo por quadro.  thread-safe: update e predict
+    podem ser chamados por estágios diferentes do pipeline.
+    """
+    # -----------------------------------------------------------------------------------------
+    def __init__(self, ff_iou: float = DF_TRACK_IOU):
+        """
+        constructor
+
+        :param ff_iou: IoU mínimo para associar uma detecção a uma trilha
+        """
+        # IoU mínimo
+        self.f_iou = ff_iou
+
+        # trilhas (DT_DETECTION), velocidades das caixas (px/s) e instante do quadro-chave
+        self.a_tracks = np.empty(0, dtype=DT_DETECTION)
+        self.a_velocity = np.empty((0, 4), dtype=np.float32)
+        self.f_time = None
+
+        # próximo id de trilha
+        self.i_next = 0
+
+        # lock
+        self.o_lock = threading.Lock()
+
+    # -----------------------------------------------------------------------------------------
+    def _predict(self, ff_time: float):
+        """
+        trilhas extrapoladas até ff_time (sem lock)
+        """
+        # trilhas
+        l_tracks = self.a_tracks.copy()
+
+        # extrapola as caixas
+        if self.f_time is not None:
+            l_tracks["box"] += self.a_velocity * np.float32(ff_time - self.f_time)
+
+        # return tracks
+        return l_tracks
+
+    # -----------------------------------------------------------------------------------------
+    def predict(self, ff_time: float):
+        """
+        detecções de um quadro intermediário (caixas levadas adiante)
+
+        :param ff_time: instante do quadro (s, monotonic)
+
+        :returns: DT_DETECTION array
+        """
+        with self.o_lock:
+            # return tracks
+            return self._predict(ff_time)
+
+    # -----------------------------------------------------------------------------------------
+    def update(self, f_detections, ff_time: float):
+        """
+        associa as detecções de um quadro-chave às trilhas
+
+        :param f_detections: DT_DETECTION array (saída de detect)
+        :param ff_time: instante do quadro (s, monotonic)
+
+        :returns: DT_DETECTION array com os ids de trilha
+        """
+        with self.o_lock:
+            # quadro-chave anterior ao último ?
+            if self.f_time is not None and ff_time < self.f_time:
+                # return tracks (detecção atrasada é descartada)
+                return self._predict(ff_time)
+
+            # trilhas extrapoladas até o quadro-chave
+            l_tracks = self._predict(ff_time)
+
+            # resultado
+            l_res = f_detections.copy()
+            l_res["track"] = -1
+            l_velocity = np.zeros((len(l_res), 4), dtype=np.float32)
+
+            if len(l_tracks) and len(l_res):
+                # IoU (detecções x trilhas), somente mesma classe
+                l_iou = iou(l_res["box"], l_tracks["box"])
+                l_iou[l_res["class"][:, None] != l_tracks["class"][None, :]] = 0.
+
+                # trilhas já associadas
+                l_used = np.zeros(len(l_tracks), dtype=bool)
+
+                # associação gulosa por IoU decrescente
+                for li_flat in np.argsort(l_iou, axis=None)[::-1]:
+                    li_det, li_trk = np.unravel_index(li_flat, l_iou.shape)
+
+                    # IoU insuficiente ?
+                    if l_iou[li_det, li_trk] < self.f_iou:
+                        break
+
+                    # já associados ?
+                    if l_res["track"][li_det] >= 0 or l_used[li_trk]:
+                        continue
+
+                    # herda a trilha
+                    l_res["track"][li_det] = l_tracks["track"][li_trk]
+
+                    # velocidade das caixas desde o último quadro-chave
+                    if ff_time > self.f_time:
+                        l_velocity[li_det] = (l_res["box"][li_det] - self.a_tracks["box"][li_trk]) / \
+                                             np.float32(ff_time - self.f_time)
+
+                    # trilha usada
+                    l_used[li_trk] = True
+
+            # novas trilhas
+            l_new = l_res["track"] < 0
+            l_res["track"][l_new] = np.arange(self.i_next, self.i_next + np.count_nonzero(l_new))
+            self.i_next += int(np.count_nonzero(l_new))
+
+            # trilhas não detectadas terminam
+            self.a_tracks = l_res.copy()
+            self.a_velocity = l_velocity
+            self.f_time = ff_time
+
+            # return detections with track ids
+            return l_res
 
 # < the end >----------------------------------------------------------------------------------
@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""
+gor_metar
+
+interpretação memorizada de METARs.  O texto bruto do METAR é a chave de um cache LRU em
+memória, opcionalmente persistido em disco (JSON), de modo que o mesmo METAR (repetido a
+cada captura, ou relido ao reprocessar o arquivo de imagens) é interpretado uma única vez.
+Cada METAR vira um registro compacto: visibilidade, códigos de tempo presente, teto e
+data/hora de observação.
+
+2023.may  mlabru  initial version (Linux/Python)
+"""
+# < imports >----------------------------------------------------------------------------------
+
+# python library
+import collections
+import json
+import logging
+import os
+import re
+import threading
+
+# local
+import fl_metar_parser as mp
+
+import gor_defs as df
+
+# < constants >--------------------------------------------------------------------------------
+
+# versão do formato do cache em disco
+DI_VERSION = 1
+
+# default number of METARs kept in memory
+DI_MAXSIZE = 65536
+
+# visibilidade sem restrição (m), usada quando o METAR não informa
+DI_VIS_DEFAULT = 20000
+
+# tempo presente: intensidade/proximidade, descritor e fenômenos
+DO_WEATHER = re.compile(r"^(\+|-|VC)?(MI|BC|PR|DR|BL|SH|TS|FZ)?"
+                        r"((DZ|RA|SN|SG|IC|PL|GR|GS|UP|BR|FG|FU|VA|DU|SA|HZ|PY|PO|SQ|FC|SS|DS)+)?$")
+
+# camada de nuvens que define teto (BKN, OVC ou visibilidade vertical), altura em centenas de pés
+DO_CEILING = re.compile(r"^(BKN|OVC|VV)(\d{3})")
+
+# data/hora de observação (DDHHMMZ)
+DO_TIME = re.compile(r"^(\d{6})Z$")
+
+# grupos que encerram a observação (tendência e observações)
+DSET_END = {"RMK", "TEMPO", "BECMG", "NOSIG"}
+
+# registro compacto
+MetarRecord = collections.namedtuple("MetarRecord", ["visibility", "weather", "ceiling", "time"])
+
+# < logging >----------------------------------------------------------------------------------
+
+# logger
+M_LOG = logging.getLogger(__name__)
+M_LOG.setLevel(df.DI_LOG_LEVEL)
+
+# ---------------------------------------------------------------------------------------------
+def parse_record(fs_metar: str) -> MetarRecord:
+    """
+    interpreta um METAR (sem cache)
+
+    :param fs_metar: texto do METAR
+
+    :returns: MetarRecord (ceiling em pés, None se não há teto; time DDHHMM ou None)
+    """
+    # visibilidade (parser da REDEMET)
+    l_metar = mp.metar_parse(fs_metar)
+    li_vis = l_metar.i_visibility if l_metar.i_visibility is not None else DI_VIS_DEFAULT
+
+    # tempo presente, teto e data/hora
+    llst_weather = []
+    li_ceiling = None
+    ls_time = None
+
+    # grupos da observação
+    for ls_group in fs_metar.split():
+        # fim da observação ?
+        if ls_group in DSET_END:
+            break
+
+        # antes da data/hora (tipo e estação) ?
+        if ls_time is None:
+            # data/hora ?
+            l_match = DO_TIME.match(ls_group)
+
+            if l_match:
+                ls_time = l_match.group(1)
+
+            # next group
+            continue
+
+        # teto ?
+        l_match = DO_CEILING.match(ls_group)
+
+        if l_match:
+            # camada mais baixa
+            li_height = int(l_match.group(2)) * 100
+            li_ceiling = li_height if li_ceiling is None else min(li_ceiling, li_height)
+            # next group
+            continue
+
+        # tempo presente (ao menos um descritor ou fenômeno) ?
+        l_match = DO_WEATHER.match(ls_group)
+
+        if l_match and (l_match.group(2) or l_match.group(3)):
+            llst_weather.append(ls_group)
+
+    # return record
+    return MetarRecord(li_vis, tuple(llst_weather), li_ceiling, ls_time)
+
+# =============================================================================================
+class MetarCache:
+    """
+    cache LRU de METARs interpretados, com persistência opcional em disco
+    """
+    # -----------------------------------------------------------------------------------------
+    def __init__(self, fs_path: str = None, fi_maxsize: int = DI_MAXSIZE):
+        """
+        constructor
+
+        :param fs_path: arquivo do cache em disco (None = somente em memória)
+        :param fi_maxsize: número máximo de METARs em memória
+        """
+        # arquivo e tamanho máximo
+        self.s_path = fs_path
+        self.i_maxsize = max(1, fi_maxsize)
+
+        # {texto: MetarRecord}, do menos para o mais recente
+        self.dct_records = collections.OrderedDict()
+
+        # estatísticas
+        self.i_hits = 0
+        self.i_misses = 0
+
+        # lock (capturas e análises podem compartilhar o cache)
+        self.lock = threading.Lock()
+
+        # carrega o cache em disco
+        if fs_path:
+            self.load()
+
+    # -----------------------------------------------------------------------------------------
+    def get(self, fs_metar: str) -> MetarRecord:
+        """
+        registro do METAR (interpreta somente se não está no cache)
+
+        :param fs_metar: texto do METAR
+
+        :returns: MetarRecord
+        """
+        # chave: texto sem espaços extras
+        ls_key = " ".join(fs_metar.split())
+
+        with self.lock:
+            # no cache ?
+            l_record = self.dct_records.get(ls_key)
+
+            if l_record is not None:
+                # mais recente
+                self.dct_records.move_to_end(ls_key)
+                self.i_hits += 1
+
+                # return record
+                return l_record
+
+        # parse METAR (fora do lock)
+        l_record = parse_record(ls_key)
+
+        with self.lock:
+            # save record
+            self.i_misses += 1
+            self.dct_records[ls_key] = l_record
+
+            # remove o menos recente
+            while len(self.dct_records) > self.i_maxsize:
+                self.dct_records.popitem(last=False)
+
+        # return record
+        return l_record
+
+    # -----------------------------------------------------------------------------------------
+    def load(self) -> None:
+        """
+        carrega o cache em disco (ignorado se não existe ou é de outra versão)
+        """
+        # não existe ?
+        if not os.path.isfile(self.s_path):
+            return
+
+        try:
+            # open cache
+            with open(self.s_path, "r", encoding="UTF8") as lfh:
+                # load cache
+                ldct_cache = json.load(lfh)
+
+        # em caso de erro...
+        except (OSError, ValueError) as lerr:
+            # logger
+            M_LOG.warning("METAR cache %s ignored: %s", self.s_path, str(lerr))
+            # return
+            return
+
+        # versão diferente ?
+        if ldct_cache.get("version") != DI_VERSION:
+            return
+
+        with self.lock:
+            for ls_key, (li_vis, llst_weather, li_ceiling, ls_time) in ldct_cache["records"].items():
+                # restore record
+                self.dct_records[ls_key] = MetarRecord(li_vis, tuple(llst_weather), li_ceiling, ls_time)
+
+            # remove os menos recentes
+            while len(self.dct_records) > self.i_maxsize:
+                self.dct_records.popitem(last=False)
+
+    # -----------------------------------------------------------------------------------------
+    def save(self) -> None:
+        """
+        salva o cache em disco (escrita atômica)
+        """
+        # somente em memória ?
+        if not self.s_path:
+            return
+
+        with self.lock:
+            # registros (ordem LRU preservada)
+            ldct_records = {ls_key: list(l_record) for ls_key, l_record in self.dct_records.items()}
+
+        # cria o diretório do cache
+        if os.path.dirname(self.s_path):
+            os.makedirs(os.path.dirname(self.s_path), exist_ok=True)
+
+        # arquivo temporário
+        ls_tmp = self.s_path + ".tmp"
+
+        # create temporary file
+        with open(ls_tmp, "w", encoding="UTF8") as lfh:
+            # save cache
+            json.dump({"version": DI_VERSION, "records": ldct_records}, lfh)
+
+        # replace cache
+        os.replace(ls_tmp, self.s_path)
+
+# < global data >------------------------------------------------------------------------------
+
+# cache padrão (somente em memória)
+go_cache = MetarCache()
+
+# ---------------------------------------------------------------------------------------------
+def parse(fs_metar: str) -> MetarRecord:
+    """
+    interpreta um METAR usando o cache padrão
+
+    :param fs_metar: texto do METAR
+
+    :returns: MetarRecord
+    """
+    # return record
+    return go_cache.get(fs_metar)
+
+# < the end >----------------------------------------------------------------------------------
@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""
+gor_pipeline
+
+estágios de processamento em threads ligados por filas limitadas.  Cada estágio consome
+itens da sua fila de entrada (opcionalmente em lotes) e entrega o resultado à fila de
+saída; um estágio lento não bloqueia o anterior: quando a fila enche, a política de
+descarte decide entre esperar (block), descartar o item novo (drop-new) ou descartar o
+item mais antigo da fila (drop-old).
+
+latência por estágio (stage.<nome>), profundidade das filas (queue.<nome>) e descartes
+(queue.<nome>.dropped) são registrados no gor_stats.
+
+uso:
+    lo_infer = gp.Channel("infer", 4, "drop-old")
+    lo_stage = gp.Stage("infer", detect_frames, lo_infer, fi_batch=4)
+    lo_stage.start()
+
+    lo_infer.put(l_frame)
+    ...
+    lo_infer.close()
+    lo_stage.join()
+
+2023.may  mlabru  initial version (Linux/Python)
+"""
+# < imports >----------------------------------------------------------------------------------
+
+# python library
+import logging
+import queue
+import threading
+
+# local
+import gor_defs as df
+import gor_stats as gs
+
+# < constants >--------------------------------------------------------------------------------
+
+# políticas de descarte
+DLST_POLICIES = ["block", "drop-new", "drop-old"]
+
+# default queue size
+D_QUEUE = 4
+
+# default drop policy
+D_POLICY = "drop-old"
+
+# fim do fluxo
+D_STOP = object()
+
+# < logging >----------------------------------------------------------------------------------
+
+# logger
+M_LOG = logging.getLogger(__name__)
+M_LOG.setLevel(df.DI_LOG_LEVEL)
+
+# =============================================================================================
+class Channel:
+    """
+    fila limitada com política de descarte
+    """
+    # -----------------------------------------------------------------------------------------
+    def __init__(self, fs_name: str, fi_size: int = D_QUEUE, fs_policy: str = D_POLICY):
+        """
+        constructor
+
+        :param fs_name: nome da fila (estatísticas)
+        :param fi_size: número máximo de itens
+        :param fs_policy: política de descarte (DLST_POLICIES)
+        """
+        # política válida ?
+        if fs_policy not in DLST_POLICIES:
+            # raise error
+            raise ValueError(f"Unknown drop policy: {fs_policy}")
+
+        # nome e política
+        self.s_name = fs_name
+        self.s_policy = fs_policy
+
+        # fila
+        self.o_queue = queue.Queue(max(1, fi_size))
+
+        # itens descartados
+        self.i_dropped = 0
+
+    # -----------------------------------------------------------------------------------------
+    def put(self, f_item) -> bool:
+        """
+        enfileira um item segundo a política de descarte
+
+        :param f_item: item
+
+        :returns: True se o item foi enfileirado
+        """
+        # espera por espaço ?
+        if "block" == self.s_policy:
+            self.o_queue.put(f_item)
+
+        else:
+            try:
+                # fila com espaço ?
+                self.o_queue.put_nowait(f_item)
+
+            except queue.Full:
+                # descarta o item novo ?
+                if "drop-new" == self.s_policy:
+                    self._drop()
+                    return False
+
+                try:
+                    # descarta o item mais antigo
+                    self.o_queue.get_nowait()
+                    self._drop()
+
+                except queue.Empty:
+                    pass
+
+                try:
+                    # enfileira o item novo
+                    self.o_queue.put_nowait(f_item)
+
+                except queue.Full:
+                    # o produtor perdeu a corrida (outro produtor ocupou a vaga)
+                    self._drop()
+                    return False
+
+        # profundidade da fila
+        gs.observe(f"queue.{self.s_name}", self.o_queue.qsize())
+
+        # ok
+        return True
+
+    # -----------------------------------------------------------------------------------------
+    def _drop(self) -> None:
+        """
+        registra um descarte
+        """
+        # descartes
+        self.i_dropped += 1
+        gs.count(f"queue.{self.s_name}.dropped")
+
+    # -----------------------------------------------------------------------------------------
+    def get(self, fi_max: int = 1) -> list:
+        """
+        retira até fi_max itens (espera pelo primeiro)
+
+        :param fi_max: número máximo de itens
+
+        :returns: lista de itens (termina em D_STOP no fim do fluxo)
+        """
+        # primeiro item (bloqueante)
+        llst_items = [self.o_queue.get()]
+
+        # demais itens já disponíveis
+        while len(llst_items) < fi_max and llst_items[-1] is not D_STOP:
+            try:
+                llst_items.append(self.o_queue.get_nowait())
+
+            except queue.Empty:
+                break
+
+        # return items
+        return llst_items
+
+    # -----------------------------------------------------------------------------------------
+    def close(self) -> None:
+        """
+        fim do fluxo (nunca descartado)
+        """
+        # stop marker
+        self.o_queue.put(D_STOP)
+
+    # -----------------------------------------------------------------------------------------
+    def qsize(self) -> int:
+        """
+        número de itens na fila
+        """
+        # return size
+        return self.o_queue.qsize()
+
+# =============================================================================================
+class Stage(threading.Thread):
+    """
+    estágio do pipeline: aplica f_func a lotes da fila de entrada
+    """
+    # -----------------------------------------------------------------------------------------
+    def __init__(self, fs_name: str, f_func, f_input: Channel, f_output: Channel = None,
+                 fi_batch: int = 1):
+        """
+        constructor
+
+        :param fs_name: nome do estágio (estatísticas)
+        :param f_func: função f(list of items) -> list of results (ou None)
+        :param f_input: fila de entrada
+        :param f_output: fila de saída (opcional)
+        :param fi_batch: número máximo de itens por chamada
+        """
+        # init super class
+        super().__init__(name=fs_name, daemon=True)
+
+        # processamento
+        self.f_func = f_func
+
+        # filas
+        self.o_input = f_input
+        self.o_output = f_output
+
+        # tamanho do lote
+        self.i_batch = max(1, fi_batch)
+
+    # -----------------------------------------------------------------------------------------
+    def run(self):
+        """
+        consome a fila de entrada até o fim do fluxo
+        """
+        # keep running...
+        while True:
+            # próximo lote
+            llst_items = self.o_input.get(self.i_batch)
+
+            # fim do fluxo ?
+            lv_stop = llst_items[-1] is D_STOP
+
+            if lv_stop:
+                llst_items.pop()
+
+            if llst_items:
+                try:
+                    with gs.timer(f"stage.{self.name}"):
+                        # process batch
+                        llst_results = self.f_func(llst_items)
+
+                # em caso de erro...
+                except Exception:
+                    # logger
+                    M_LOG.exception("stage %s failed", self.name)
+                    gs.count(f"stage.{self.name}.errors")
+
+                    # next batch
+                    llst_results = None
+
+                # itens processados
+                gs.count(f"stage.{self.name}.items", len(llst_items))
+
+                # entrega os resultados
+                if self.o_output is not None:
+                    for l_result in llst_results or []:
+                        self.o_output.put(l_result)
+
+            if lv_stop:
+                # propaga o fim do fluxo
+                if self.o_output is not None:
+                    self.o_output.close()
+
+                # quit
+                break
+
+# ---------------------------------------------------------------------------------------------
+def add_arguments(f_parser) -> None:
+    """
+    adiciona as opções do pipeline (--queue-size, --drop) a um parser
+
+    :param f_parser: argparse.ArgumentParser
+    """
+    # args
+    f_parser.add_argument("--queue-size", help=f"maximum items per pipeline queue. [{D_QUEUE}]",
+                          default=D_QUEUE, dest="queue_size", type=int)
+    f_parser.add_argument("--drop", help=f"policy when a pipeline stage falls behind. [{D_POLICY}]",
+                          default=D_POLICY, dest="drop", choices=DLST_POLICIES)
+
+# < the end >----------------------------------------------------------------------------------
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+gor_sched
+
+escalonador de tarefas periódicas por prazos absolutos (time.monotonic).  O prazo da
+k-ésima execução de uma tarefa é início + k * período, de modo que atrasos de uma
+iteração não se acumulam (sem deriva, mesmo após semanas).  Prazos perdidos são
+recuperados (catch-up: uma execução por prazo) ou descartados (skip: uma execução e
+salto para o próximo prazo futuro), e contados como estouros.
+
+estatísticas no gor_stats: sched.<tarefa>.late (atraso de cada execução),
+sched.<tarefa>.missed (prazos descartados) e sched.slack (folga de cada espera).
+
+uso:
+    lo_sched = gsc.Scheduler()
+    lo_sched.add("frame", 1. / 12)
+    lo_sched.add("photo", 180.)
+
+    while True:
+        llst_due = lo_sched.poll()
+
+        if "photo" in llst_due:
+            ...
+
+        lo_sched.wait()
+
+2023.may  mlabru  initial version (Linux/Python)
+"""
+# < imports >----------------------------------------------------------------------------------
+
+# python library
+import logging
+import math
+import threading
+import time
+
+# local
+import gor_defs as df
+import gor_stats as gs
+
+# < constants >--------------------------------------------------------------------------------
+
+# políticas para prazos perdidos
+DLST_POLICIES = ["skip", "catch-up"]
+
+# < logging >----------------------------------------------------------------------------------
+
+# logger
+M_LOG = logging.getLogger(__name__)
+M_LOG.setLevel(df.DI_LOG_LEVEL)
+
+# =============================================================================================
+class Task:
+    """
+    tarefa periódica
+    """
+    # -----------------------------------------------------------------------------------------
+    def __init__(self, fs_name: str, ff_period: float, ff_start: float, fs_policy: str):
+        """
+        constructor
+
+        :param fs_name: nome da tarefa
+        :param ff_period: período (s)
+        :param ff_start: primeiro prazo (s, monotonic)
+        :param fs_policy: política para prazos perdidos (DLST_POLICIES)
+        """
+        # política válida ?
+        if fs_policy not in DLST_POLICIES:
+            # raise error
+            raise ValueError(f"Unknown scheduler policy: {fs_policy}")
+
+        # período inválido ?
+        if ff_period <= 0.:
+            # raise error
+            raise ValueError(f"Task {fs_name} without period")
+
+        # parâmetros
+        self.s_name = fs_name
+        self.f_period = ff_period
+        self.s_policy = fs_policy
+
+        # início da grade e índice do próximo prazo
+        self.f_start = ff_start
+        self.i_tick = 0
+
+        # execuções e prazos descartados
+        self.i_runs = 0
+        self.i_missed = 0
+
+    # -----------------------------------------------------------------------------------------
+    @property
+    def deadline(self) -> float:
+        """
+        próximo prazo (s, monotonic)
+        """
+        # return deadline (absoluto, sem acumular erros)
+        return self.f_start + self.i_tick * self.f_period
+
+# =============================================================================================
+class Scheduler:
+    """
+    escalonador de tarefas periódicas por prazos absolutos
+    """
+    # -----------------------------------------------------------------------------------------
+    def __init__(self):
+        """
+        constructor
+        """
+        # tarefas
+        self.dct_tasks = {}
+
+    # -----------------------------------------------------------------------------------------
+    def add(self, fs_name: str, ff_period: float, fv_first: bool = False,
+            fs_policy: str = "skip") -> Task:
+        """
+        registra uma tarefa periódica
+
+        :param fs_name: nome da tarefa
+        :param ff_period: período (s)
+        :param fv_first: a tarefa já é devida agora (senão, após um período)
+        :param fs_policy: política para prazos perdidos (skip ou catch-up)
+
+        :returns: Task
+        """
+        # início da grade
+        lf_start = time.monotonic() + (0. if fv_first else ff_period)
+
+        # create task
+        lo_task = self.dct_tasks[fs_name] = Task(fs_name, ff_period, lf_start, fs_policy)
+
+        # return task
+        return lo_task
+
+    # -----------------------------------------------------------------------------------------
+    def next_deadline(self) -> float:
+        """
+        prazo mais próximo entre as tarefas (s, monotonic)
+        """
+        # return deadline
+        return min((lo_task.deadline for lo_task in self.dct_tasks.values()), default=math.inf)
+
+    # -----------------------------------------------------------------------------------------
+    def poll(self, ff_now: float = None) -> list:
+        """
+        tarefas devidas até agora (avança os prazos)
+
+        :param ff_now: instante atual (s, monotonic)
+
+        :returns: lista de nomes das tarefas devidas (com repetição no catch-up)
+        """
+        # instante atual
+        lf_now = time.monotonic() if ff_now is None else ff_now
+
+        # tarefas devidas
+        llst_due = []
+
+        for lo_task in self.dct_tasks.values():
+            # ainda não ?
+            if lo_task.deadline > lf_now:
+                continue
+
+            # atraso desta execução
+            gs.observe(f"sched.{lo_task.s_name}.late", lf_now - lo_task.deadline)
+
+            # prazos vencidos (incluindo o atual)
+            li_due = int((lf_now - lo_task.deadline) // lo_task.f_period) + 1
+
+            if "catch-up" == lo_task.s_policy:
+                # uma execução por prazo
+                llst_due.extend([lo_task.s_name] * li_due)
+                lo_task.i_runs += li_due
+
+            else:
+                # uma execução; os demais prazos são descartados
+                llst_due.append(lo_task.s_name)
+                lo_task.i_runs += 1
+
+                if li_due > 1:
+                    # estouros
+                    lo_task.i_missed += li_due - 1
+                    gs.count(f"sched.{lo_task.s_name}.missed", li_due - 1)
+
+            # próximo prazo futuro
+            lo_task.i_tick += li_due
+
+        # return due tasks
+        return llst_due
+
+    # -----------------------------------------------------------------------------------------
+    def wait(self, f_event: threading.Event = None) -> bool:
+        """
+        espera até o próximo prazo
+
+        :param f_event: evento que interrompe a espera (p.ex. fim do stream)
+
+        :returns: True se o evento foi sinalizado
+        """
+        # sem tarefas ?
+        if not self.dct_tasks:
+            return False
+
+        # folga até o próximo prazo
+        lf_slack = self.next_deadline() - time.monotonic()
+        gs.observe("sched.slack", max(0., lf_slack))
+
+        # espera interrompível ?
+        if f_event is not None:
+            return f_event.wait(max(0., lf_slack))
+
+        # permite o scheduler
+        if lf_slack > 0.:
+            time.sleep(lf_slack)
+
+        # não interrompido
+        return False
+
+    # -----------------------------------------------------------------------------------------
+    def summary(self) -> dict:
+        """
+        execuções e estouros por tarefa
+
+        :returns: {name: {period, runs, missed}}
+        """
+        # return summary
+        return {ls_name: {"period": lo_task.f_period, "runs": lo_task.i_runs,
+                          "missed": lo_task.i_missed}
+                for ls_name, lo_task in self.dct_tasks.items()}
+
+# < the end >----------------------------------------------------------------------------------
@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+"""
+gor_stats
+
+instrumentação leve: temporizadores nomeados, contadores e histogramas, com chave de
+liga/desliga e gravação periódica de um resumo num arquivo local (JSON lines).  Quando
+desligada, cada ponto de medição custa apenas um teste de flag.
+
+uso:
+    gs.configure("logs/gorfog.stats.jsonl", 60.)
+
+    with gs.timer("ia.detect"):
+        ia.detect(...)
+
+    gs.count("photo.same_metar")
+    gs.observe("loop.slack", lf_slack)
+
+2023.may  mlabru  initial version (Linux/Python)
+"""
+# < imports >----------------------------------------------------------------------------------
+
+# python library
+import atexit
+import contextlib
+import json
+import logging
+import math
+import os
+import threading
+import time
+
+# local
+import gor_defs as df
+
+# < constants >--------------------------------------------------------------------------------
+
+# default dump interval (s)
+DF_INTERVAL = 60.
+
+# histogram buckets per decade (log scale)
+DI_BUCKETS_DECADE = 20
+
+# < logging >----------------------------------------------------------------------------------
+
+# logger
+M_LOG = logging.getLogger(__name__)
+M_LOG.setLevel(df.DI_LOG_LEVEL)
+
+# =============================================================================================
+class Histogram:
+    """
+    histograma em escala logarítmica (memória limitada, percentis aproximados a ~12%)
+    """
+    # -----------------------------------------------------------------------------------------
+    def __init__(self):
+        """
+        constructor
+        """
+        # contagem por bucket {índice: contagem} (índice None para valores <= 0)
+        self.dct_buckets = {}
+
+        # estatísticas exatas
+        self.i_count = 0
+        self.f_sum = 0.
+        self.f_min = math.inf
+        self.f_max = -math.inf
+
+    # -----------------------------------------------------------------------------------------
+    def add(self, ff_value: float):
+        """
+        registra um valor
+        """
+        # bucket do valor
+        li_ndx = math.floor(math.log10(ff_value) * DI_BUCKETS_DECADE) if ff_value > 0. else None
+        self.dct_buckets[li_ndx] = self.dct_buckets.get(li_ndx, 0) + 1
+
+        # estatísticas exatas
+        self.i_count += 1
+        self.f_sum += ff_value
+        self.f_min = min(self.f_min, ff_value)
+        self.f_max = max(self.f_max, ff_value)
+
+    # -----------------------------------------------------------------------------------------
+    def percentile(self, ff_pct: float) -> float:
+        """
+        percentil aproximado (limite superior do bucket, limitado ao máximo observado)
+        """
+        # sem valores ?
+        if 0 == self.i_count:
+            return math.nan
+
+        # posição do percentil
+        lf_rank = ff_pct / 100. * self.i_count
+        li_acc = 0
+
+        # buckets em ordem (valores <= 0 primeiro)
+        for li_ndx in sorted(self.dct_buckets, key=lambda x: -math.inf if x is None else x):
+            li_acc += self.dct_buckets[li_ndx]
+
+            if li_acc >= lf_rank:
+                # limite superior do bucket
+                return min(self.f_min if li_ndx is None else 10. ** ((li_ndx + 1) / DI_BUCKETS_DECADE),
+                           self.f_max)
+
+        # return max
+        return self.f_max
+
+    # -----------------------------------------------------------------------------------------
+    def summary(self) -> dict:
+        """
+        resumo do histograma
+        """
+        # return summary
+        return {"count": self.i_count,
+                "sum": self.f_sum,
+                "mean": self.f_sum / self.i_count if self.i_count else math.nan,
+                "min": self.f_min if self.i_count else math.nan,
+                "max": self.f_max if self.i_count else math.nan,
+                "p50": self.percentile(50.),
+                "p90": self.percentile(90.),
+                "p99": self.percentile(99.)}
+
+# < global data >------------------------------------------------------------------------------
+
+# instrumentação ligada ?
+gv_enabled = False
+
+# lock (medições podem vir de várias threads)
+g_lock = threading.Lock()
+
+# contadores e histogramas
+gdct_counters = {}
+gdct_histograms = {}
+
+# arquivo de resumo e intervalo de gravação
+gs_path = None
+gf_interval = DF_INTERVAL
+gf_next_dump = math.inf
+
+# resumo final registrado no atexit
+gv_atexit = False
+
+# ---------------------------------------------------------------------------------------------
+def configure(fs_path: str, ff_interval: float = DF_INTERVAL) -> None:
+    """
+    liga a instrumentação e define o arquivo e o intervalo dos resumos periódicos
+
+    :param fs_path: arquivo de resumo (JSON lines); None desliga a instrumentação
+    :param ff_interval: intervalo entre resumos (s)
+    """
+    # globals
+    global gv_enabled, gs_path, gf_interval, gf_next_dump, gv_atexit
+
+    # arquivo de resumo
+    gs_path = fs_path
+    gf_interval = ff_interval
+
+    # liga / desliga
+    gv_enabled = fs_path is not None
+    gf_next_dump = time.monotonic() + ff_interval if gv_enabled else math.inf
+
+    if gv_enabled:
+        # cria o diretório do arquivo de resumo
+        if os.path.dirname(fs_path):
+            os.makedirs(os.path.dirname(fs_path), exist_ok=True)
+
+        # resumo final na saída (uma única vez, mesmo com várias chamadas a configure)
+        if not gv_atexit:
+            atexit.register(dump)
+            gv_atexit = True
+
+# ---------------------------------------------------------------------------------------------
+def add_arguments(f_parser) -> None:
+    """
+    adiciona as opções de instrumentação (--stats, --stats-interval) a um parser
+
+    :param f_parser: argparse.ArgumentParser
+    """
+    # args
+    f_parser.add_argument("--stats", help="enable instrumentation, dumping summaries to this file.",
+                          default=None, dest="stats")
+    f_parser.add_argument("--stats-interval", help=f"summary dump interval (s). [{DF_INTERVAL:g}]",
+                          default=DF_INTERVAL, dest="stats_interval", type=float)
+
+# ---------------------------------------------------------------------------------------------
+def enable(fv_enabled: bool = True) -> None:
+    """
+    liga ou desliga a instrumentação (sem alterar o arquivo de resumo)
+    """
+    # globals
+    global gv_enabled
+
+    # switch
+    gv_enabled = fv_enabled
+
+# ---------------------------------------------------------------------------------------------
+def count(fs_name: str, fi_inc: int = 1) -> None:
+    """
+    incrementa um contador
+
+    :param fs_name: nome do contador
+    :param fi_inc: incremento
+    """
+    # desligada ?
+    if not gv_enabled:
+        return
+
+    with g_lock:
+        # increment
+        gdct_counters[fs_name] = gdct_counters.get(fs_name, 0) + fi_inc
+
+    # resumo periódico
+    _maybe_dump()
+
+# ---------------------------------------------------------------------------------------------
+def observe(fs_name: str, ff_value: float) -> None:
+    """
+    registra um valor num histograma
+
+    :param fs_name: nome do histograma
+    :param ff_value: valor
+    """
+    # desligada ?
+    if not gv_enabled:
+        return
+
+    with g_lock:
+        # histograma
+        l_hist = gdct_histograms.get(fs_name)
+
+        if l_hist is None:
+            # create histogram
+            l_hist = gdct_histograms[fs_name] = Histogram()
+
+        # add value
+        l_hist.add(ff_value)
+
+    # resumo periódico
+    _maybe_dump()
+
+# ---------------------------------------------------------------------------------------------
+@contextlib.contextmanager
+def _timer(fs_name: str):
+    """
+    temporizador (registra a duração em segundos no histograma fs_name)
+    """
+    # tempo inicial
+    lf_ini = time.perf_counter()
+
+    try:
+        yield
+
+    finally:
+        # registra a duração
+        observe(fs_name, time.perf_counter() - lf_ini)
+
+# ---------------------------------------------------------------------------------------------
+def timer(fs_name: str):
+    """
+    temporizador nomeado para uso com "with" (no-op se a instrumentação está desligada)
+
+    :param fs_name: nome do temporizador
+
+    :returns: context manager
+    """
+    # return timer
+    return _timer(fs_name) if gv_enabled else contextlib.nullcontext()
+
+# ---------------------------------------------------------------------------------------------
+def summary() -> dict:
+    """
+    resumo atual dos contadores e histogramas
+    """
+    with g_lock:
+        # return summary
+        return {"counters": dict(gdct_counters),
+                "histograms": {ls_name: l_hist.summary() for ls_name, l_hist in gdct_histograms.items()}}
+
+# ---------------------------------------------------------------------------------------------
+def _maybe_dump() -> None:
+    """
+    grava o resumo se o intervalo expirou
+    """
+    # globals
+    global gf_next_dump
+
+    # ainda não ?
+    if time.monotonic() < gf_next_dump:
+        return
+
+    with g_lock:
+        # outra thread já gravou ?
+        if time.monotonic() < gf_next_dump:
+            return
+
+        # próximo resumo
+        gf_next_dump = time.monotonic() + gf_interval
+
+    # save summary
+    dump()
+
+# ---------------------------------------------------------------------------------------------
+def dump() -> None:
+    """
+    acrescenta o resumo atual ao arquivo de resumo (uma linha JSON)
+    """
+    # sem arquivo ?
+    if not gs_path:
+        return
+
+    # resumo com data e processo
+    ldct_summary = summary()
+    ldct_summary["time"] = time.strftime("%Y%m%d%H%M%S", time.gmtime())
+    ldct_summary["pid"] = os.getpid()
+
+    try:
+        # append summary
+        with open(gs_path, "a", encoding="UTF8") as lfh:
+            lfh.write(json.dumps(ldct_summary) + "\n")
+
+    # em caso de erro...
+    except OSError as lerr:
+        # logger
+        M_LOG.error("stats dump failed: %s", str(lerr))
+
+# < the end >----------------------------------------------------------------------------------
@@ -24,6 +24,7 @@ import fl_data_redemet as rm
 
 import gor_db as db
 import gor_defs as df
+import gor_stats as gs
 import gor_util as gu
 
 # < logging >----------------------------------------------------------------------------------
@@ -48,6 +49,9 @@ def arg_parse(fs_sysname: str):
     l_parser.add_argument("-c", "--code", dest="code", action="store", default="SBGR",
                           help="ICAO code.")
 
+    # instrumentation args
+    gs.add_arguments(l_parser)
+
     # return arguments
     return l_parser.parse_args()
 
@@ -130,6 +134,26 @@ def get_metar(fs_station: str, fs_date: str) -> str:
     # try to get data from REDEMET
     return rm.redemet_get_location(fs_date[:-4], fs_station)
 
+# ---------------------------------------------------------------------------------------------
+def positive_int(fs_value: str) -> int:
+    """
+    converte um argumento inteiro >= 1 (argparse type)
+
+    :param fs_value: valor do argumento
+
+    :returns: valor inteiro
+    """
+    # valor inteiro
+    li_value = int(fs_value)
+
+    # não positivo ?
+    if li_value < 1:
+        # raise error
+        raise ValueError(f"Invalid value: {fs_value} (expected an integer >= 1)")
+
+    # return value
+    return li_value
+
 # ---------------------------------------------------------------------------------------------
 def take_shot(fdct_bbox: dict, fs_fname: str):
     """
@@ -12,7 +12,6 @@ import argparse
 import datetime
 import logging
 import sys
-import time
 
 # openCV
 import cv2
@@ -21,7 +20,10 @@ import cv2
 import streamlink
 
 # local
+import gor_capture as gc
 import gor_defs as df
+import gor_sched as gsc
+import gor_stats as gs
 import gor_util as gu
 
 # < constants >--------------------------------------------------------------------------------
@@ -67,6 +69,9 @@ def arg_parse():
                           default=D_PHOTO, dest="photo", type=int)
     l_parser.add_argument("url", help="URL stream source.")
 
+    # instrumentation args
+    gs.add_arguments(l_parser)
+
     # return arguments
     return l_parser.parse_args()
 
@@ -99,10 +104,13 @@ def take_photo(fs_code: str, f_frame):
     # actual date
     ls_date = gu.get_date()
 
-    # try to get data from REDEMET
-    lo_metar = gu.get_metar(fs_code, ls_date)
+    with gs.timer("photo.metar"):
+        # try to get data from REDEMET
+        lo_metar = gu.get_metar(fs_code, ls_date)
 
     if not lo_metar:
+        # METAR not available
+        gs.count("photo.no_metar")
         # quit error
         return
 
@@ -114,8 +122,9 @@ def take_photo(fs_code: str, f_frame):
         # crop image
         l_crop_image = f_frame[df.Y1:df.Y2, df.X1:df.X2]
 
-        # saving the image
-        cv2.imwrite(ls_fname, l_crop_image)
+        with gs.timer("photo.write"):
+            # saving the image
+            cv2.imwrite(ls_fname, l_crop_image)
 
         # save new previous METAR
         gs_metar_prev = lo_metar.s_metar_mesg
@@ -128,6 +137,13 @@ def take_photo(fs_code: str, f_frame):
             # save METAR to file
             lfh.write(lo_metar.s_metar_mesg)
 
+        # photos taken
+        gs.count("photo.taken")
+
+    else:
+        # same METAR, photo skipped
+        gs.count("photo.same_metar")
+
 # ---------------------------------------------------------------------------------------------
 def main():
     """
@@ -136,6 +152,9 @@ def main():
     # get program arguments
     l_args = arg_parse()
 
+    # instrumentation
+    gs.configure(l_args.stats, l_args.stats_interval)
+
     # screenshots directory
     df.DS_DIR_SHOTS = df.DS_DIR_SHOTS.format("cap", l_args.code + "-28")
     # METAR directory
@@ -163,24 +182,38 @@ def main():
     li_frame_width = int(l_cap.get(3))
     li_frame_height = int(l_cap.get(4))
 
-    # time of each interval in secs
-    lf_photo_time = l_args.photo * 60
+    # photo task on absolute deadlines (first photo now)
+    lo_sched = gsc.Scheduler()
+    lo_sched.add("photo", l_args.photo * 60., fv_first=True)
+
+    # latest-frame reader: drains the stream (grab, no decode) and keeps only the newest packet
+    lo_reader = gc.LatestFrameReader(l_cap)
+    lo_reader.start()
 
     # keep running....
     while True:
-        # tempo inicial (sec)
-        lf_ini = time.perf_counter()
-
         try:
-            # capture frame
-            l_ret, l_frame = l_cap.read()
+            # photo interval ?
+            if "photo" not in lo_sched.poll():
+                # wait for the next deadline (returns at once at the end of the stream)
+                if lo_sched.wait(lo_reader.o_eof):
+                    # quit
+                    break
+
+                # next deadline
+                continue
+
+            with gs.timer("frame.read"):
+                # newest frame (decoded on demand)
+                l_ret, l_frame = lo_reader.latest()
 
             if not l_ret:
                 # quit
                 break
 
-            # take a photo         
-            take_photo(l_args.code, l_frame) 
+            with gs.timer("photo.total"):
+                # take a photo
+                take_photo(l_args.code, l_frame)
 
             # wait
             if cv2.waitKey(1) & 0xFF == ord('q'):
@@ -192,13 +225,8 @@ def main():
             # quit
             break
 
-        # elapsed time (sec)
-        lf_dt = time.perf_counter() - lf_ini
-
-        # está adiantado ?
-        if lf_photo_time > lf_dt:
-            # permite o scheduler
-            time.sleep(lf_photo_time - lf_dt)
+    # stop reader
+    lo_reader.stop()
 
     # release video capture
     l_cap.release()
@@ -20,9 +20,13 @@ import cv2
 import streamlink
 
 # local
+import gor_capture as gc
 import gor_db as db
 import gor_ia as ia
 import gor_defs as df
+import gor_pipeline as gp
+import gor_sched as gsc
+import gor_stats as gs
 import gor_util as gu
 
 # < constants >--------------------------------------------------------------------------------
@@ -42,6 +46,9 @@ D_FPS = 12
 # photo interval (min)
 D_PHOTO = 3
 
+# video rotation interval (s)
+D_VIDEO = 3600.
+
 # path to Caffe pre-trained model
 D_MODEL = "models/MobileNetSSD_deploy.caffemodel"
 # path to Caffe 'deploy' prototxt file
@@ -50,6 +57,21 @@ D_PROTO = "models/MobileNetSSD_deploy.prototxt.txt"
 # minimum probability
 D_PROB = 0.2
 
+# classes to detect
+D_CLASSES = ["aeroplane"]
+
+# frames per inference batch
+D_BATCH = 1
+
+# forced inference interval when the scene is static (s)
+D_REFRESH = ia.DF_GATE_REFRESH
+
+# decode and detect one of every N frames
+D_EVERY = 1
+
+# frames between DNN keyframes (0 = no tracking, inference on every changed frame)
+D_KEYFRAME = 0
+
 # default source stream
 D_STREAM = "https://www.youtube.com/watch?v=EvtTtlLInzY&ab_channel=GolfOscarRomeo"
 
@@ -66,7 +88,7 @@ M_LOG.setLevel(df.DI_LOG_LEVEL)
 def arg_parse():
     """
     parse command line arguments
-    arguments parse: URL <ICAO code> <fps> <quality> <model> <proto> <interval> <prob>
+    arguments parse: URL <batch> <ICAO code> <classes> <every> <fps> <gate> <keyframe> <quality> <model> <proto> <interval> <prob>
 
     :returns: arguments
     """
@@ -75,10 +97,21 @@ def arg_parse():
     assert l_parser
 
     # args
+    l_parser.add_argument("-b", "--batch", help=f"max frames per inference batch. [{D_BATCH}]",
+                          default=D_BATCH, dest="batch", type=gu.positive_int)
     l_parser.add_argument("-c", "--code", help=f"ICAO code. [{D_CODE}]",
                           default=D_CODE, dest="code", action="store")
+    l_parser.add_argument("-d", "--detect", help=f"classes to detect. {D_CLASSES}",
+                          default=D_CLASSES, dest="classes", nargs="+", choices=ia.D_CLASSES)
+    l_parser.add_argument("-e", "--detect-every", help=f"decode and detect one of every N frames. [{D_EVERY}]",
+                          default=D_EVERY, dest="every", type=gu.positive_int)
     l_parser.add_argument("-f", "--fps", help=f"play back FPS for opencv. [{D_FPS}]",
                           default=D_FPS, type=int)
+    l_parser.add_argument("-g", "--no-gate", help="run inference on every frame (no change detector).",
+                          default=True, dest="gate", action="store_false")
+    l_parser.add_argument("-k", "--keyframe",
+                          help=f"run the DNN every N frames (or on scene change) and track in between. [{D_KEYFRAME}]",
+                          default=D_KEYFRAME, dest="keyframe", type=int)
     l_parser.add_argument("-m", "--model", help=f"path to Caffe pre-trained model. [{D_MODEL}]",
                           default=D_MODEL)
     l_parser.add_argument("-p", "--prototxt", help=f"path to Caffe prototxt file. [{D_PROTO}]",
@@ -90,8 +123,22 @@ def arg_parse():
     l_parser.add_argument("-w", "--probability", 
                           help=f"minimum probability to filter weak detections. [{D_PROB}]",
                           default=D_PROB, dest="prob", type=float)
+    l_parser.add_argument("--gate-threshold",
+                          help=f"pixel difference (0-255) counted as change. [{ia.DI_GATE_THRESHOLD}]",
+                          default=ia.DI_GATE_THRESHOLD, dest="gate_threshold", type=int)
+    l_parser.add_argument("--gate-area",
+                          help=f"changed area fraction that triggers inference. [{ia.DF_GATE_AREA}]",
+                          default=ia.DF_GATE_AREA, dest="gate_area", type=float)
+    l_parser.add_argument("--refresh", help=f"forced inference interval (s). [{D_REFRESH:g}]",
+                          default=D_REFRESH, dest="refresh", type=float)
     l_parser.add_argument("url", help="URL stream source.")
 
+    # pipeline args
+    gp.add_arguments(l_parser)
+
+    # instrumentation args
+    gs.add_arguments(l_parser)
+
     # return arguments
     return l_parser.parse_args()
 
@@ -142,24 +189,64 @@ def take_photo(fs_code: str, f_frame):
     # actual date
     ls_date = gu.get_date()
 
-    # try to get data from REDEMET
-    lo_metar = gu.get_metar(fs_code, ls_date)
+    with gs.timer("photo.metar"):
+        # try to get data from REDEMET
+        lo_metar = gu.get_metar(fs_code, ls_date)
     M_LOG.debug("metar: %s", str(lo_metar.s_metar_mesg))
 
     # filename
     ls_fname = f"./{df.DS_DIR_GORFOG}/{fs_code}-{ls_date}Zp.png"
 
-    # saving the image
-    cv2.imwrite(ls_fname, f_frame)
+    with gs.timer("photo.write"):
+        # saving the image
+        cv2.imwrite(ls_fname, f_frame)
 
-    # save to DB
-    db.save2dbfog(lconn, fs_code, ls_date, lo_metar.s_metar_mesg)
+    with gs.timer("photo.db"):
+        # save to DB
+        db.save2dbfog(lconn, fs_code, ls_date, lo_metar.s_metar_mesg)
 
-    # commit the changes
-    lconn.commit()
+        # commit the changes
+        lconn.commit()
     # close the connection
     lconn.close()
 
+    # photos taken
+    gs.count("photo.taken")
+
+# ---------------------------------------------------------------------------------------------
+def detect_frames(f_model, f_args, f_tracker, flst_items: list) -> None:
+    """
+    inference stage: detect airplanes in a batch of keyframes (single forward pass)
+
+    :param f_model: MobileNet SSD
+    :param f_args: args (prob, classes)
+    :param f_tracker: ia.Tracker (track ids, boxes for the frames between keyframes)
+    :param flst_items: list of (time, frame)
+    """
+    # detect airplanes in frames
+    llst_dets = ia.detect_batch(f_model, f_args.prob, [l_frame for _, l_frame in flst_items],
+                                f_args.classes)
+
+    for (lf_time, _), l_det in zip(flst_items, llst_dets):
+        # associate detections to tracks
+        l_det = f_tracker.update(l_det, lf_time)
+
+        # detections per frame
+        gs.observe("frame.detections", len(l_det))
+
+# ---------------------------------------------------------------------------------------------
+def save_photos(fs_code: str, flst_frames: list) -> None:
+    """
+    persistence stage: save photos (REDEMET request and DB write off the capture loop)
+
+    :param fs_code: ICAO code
+    :param flst_frames: frames
+    """
+    for l_frame in flst_frames:
+        with gs.timer("photo.total"):
+            # take a photo
+            take_photo(fs_code, l_frame)
+
 # ---------------------------------------------------------------------------------------------
 def main():
     """
@@ -168,6 +255,9 @@ def main():
     # get program arguments
     l_args = arg_parse()
 
+    # instrumentation
+    gs.configure(l_args.stats, l_args.stats_interval)
+
     # check environment
     gu.check_env(df.DS_DIR_GORFOG, df.DS_DB_GORFOG, df.DS_SQL_GORFOG)
 
@@ -190,16 +280,41 @@ def main():
     li_frame_width = int(l_cap.get(3))
     li_frame_height = int(l_cap.get(4))
 
-    # time of each frame in ms
-    lf_frame_time = 1. / l_args.fps
-
     # create VideoWriter object
     l_vid = create_video_out(l_args.code, l_args.fps, (li_frame_width, li_frame_height))
     assert l_vid
 
-    # init elapsed time
-    lf_elapsed_photo = 0.
-    lf_elapsed_video = 0.
+    # inference and persistence stages
+    lo_infer = gp.Channel("infer", l_args.queue_size, l_args.drop)
+    lo_persist = gp.Channel("persist", l_args.queue_size, l_args.drop)
+
+    # tracker (carries boxes between keyframes)
+    lo_tracker = ia.Tracker()
+
+    llst_stages = [gp.Stage("infer", lambda flst: detect_frames(l_model, l_args, lo_tracker, flst),
+                            lo_infer,
+                            fi_batch=l_args.batch),
+                   gp.Stage("persist", lambda flst: save_photos(l_args.code, flst), lo_persist)]
+
+    for l_stage in llst_stages:
+        l_stage.start()
+
+    # change detector (skips inference on static scenes)
+    lo_gate = ia.MotionGate(l_args.gate_threshold, l_args.gate_area, l_args.refresh) \
+              if l_args.gate else None
+
+    # frames since the last keyframe
+    li_since_key = 0
+
+    # frame sampler: grab every frame, decode only for detection and photos
+    lo_sampler = gc.FrameSampler(l_cap)
+    lo_sampler.add("detect", fi_every=l_args.every)
+
+    # periodic tasks on absolute deadlines: frame pacing, photo and video rotation
+    lo_sched = gsc.Scheduler()
+    lo_sched.add("frame", 1. / l_args.fps, fv_first=True)
+    lo_sched.add("photo", l_args.photo * 60.)
+    lo_sched.add("video", D_VIDEO)
 
     # keep running....
     while True:
@@ -207,7 +322,19 @@ def main():
         lf_ini = time.perf_counter()
 
         try:
-            l_ret, l_frame = l_cap.read()
+            # frame time
+            lf_now = time.monotonic()
+
+            # due tasks
+            llst_tasks = lo_sched.poll(lf_now)
+
+            # photo interval ? (decode the next frame for the photo)
+            if "photo" in llst_tasks:
+                lo_sampler.request("photo")
+
+            with gs.timer("frame.read"):
+                # capture frame (decoded only if a consumer wants it)
+                l_ret, l_frame, llst_due = lo_sampler.next(lf_now)
 
             if not l_ret:
                 # quit
@@ -219,28 +346,44 @@ def main():
             # show image
             # cv2.imshow("live", l_frame)
 
-            # detect airplanes in frame
-            ia.detect(l_model, l_args.prob, l_frame)
+            # detection frame ?
+            if "detect" in llst_due:
+                # frames since the last keyframe
+                li_since_key += 1
+
+                with gs.timer("frame.gate"):
+                    # scene changed ?
+                    lv_changed = lo_gate.check(l_frame, lf_now) if lo_gate else l_args.keyframe <= 0
+
+                # keyframe (scene changed or N frames since the last one) ?
+                if lv_changed or 0 < l_args.keyframe <= li_since_key:
+                    # detect airplanes in frame (inference stage)
+                    lo_infer.put((lf_now, l_frame))
+                    li_since_key = 0
+
+                # tracking mode ?
+                elif l_args.keyframe > 0:
+                    # boxes carried forward from the last keyframe
+                    l_det = lo_tracker.predict(lf_now)
+                    gs.observe("frame.tracked", len(l_det))
+
+                else:
+                    # static frame, inference skipped
+                    gs.count("frame.gated")
 
             # 1 hour video ?
-            if lf_elapsed_video >= 3600.:
+            if "video" in llst_tasks:
                 # release video output
                 l_vid.release()
-            
+
                 # create new output video
                 l_vid = create_video_out(l_args.code, l_args.fps, (li_frame_width, li_frame_height))
                 assert l_vid
 
-                # reset video elapsed time
-                lf_elapsed_video = 0.
-
-            # 3 minute photo ?
-            if lf_elapsed_photo >= 180.:
-                # take a photo         
-                take_photo(l_args.code, l_frame) 
-
-                # reset photo elapsed time
-                lf_elapsed_photo = 0.
+            # photo frame ?
+            if "photo" in llst_due:
+                # take a photo (persistence stage)
+                lo_persist.put(l_frame)
 
             # wait
             if cv2.waitKey(1) & 0xFF == ord('q'):
@@ -253,22 +396,20 @@ def main():
             break
 
         # elapsed time (sec)
-        lf_dt = time.perf_counter() - lf_ini
-
-        # increment photo elapsed time
-        lf_elapsed_photo += lf_dt
-        # increment video elapsed time
-        lf_elapsed_video += lf_dt        
-
-        # está adiantado ?
-        if lf_frame_time > lf_dt:
-            # info
-            print(">>>>>>>>>>>>>", lf_frame_time - lf_dt)
-            # permite o scheduler
-            time.sleep(lf_frame_time - lf_dt)
-        else:
-            # info
-            print(lf_dt - lf_frame_time, "<<<<<<<<<<<<<")
+        gs.observe("frame.total", time.perf_counter() - lf_ini)
+
+        # espera o próximo prazo (estouros em sched.<task>.missed)
+        lo_sched.wait()
+
+        # frames processed
+        gs.count("frame.count")
+
+    # end of stream: drain and stop the stages
+    lo_infer.close()
+    lo_persist.close()
+
+    for l_stage in llst_stages:
+        l_stage.join()
 
     # close windows
     cv2.destroyAllWindows()
@@ -14,6 +14,7 @@ import sys
 # local
 import gor_db as db
 import gor_defs as df
+import gor_stats as gs
 import gor_util as gu
 
 # < logging >----------------------------------------------------------------------------------
@@ -30,6 +31,9 @@ def main():
     # get program arguments
     l_args = gu.arg_parse("GORmet")
 
+    # instrumentation
+    gs.configure(l_args.stats, l_args.stats_interval)
+
     # check environment
     gu.check_env(df.DS_DIR_GORMET, df.DS_DB_GORMET, df.DS_SQL_GORMET)
 
@@ -43,22 +47,26 @@ def main():
     # actual date
     ls_date = gu.get_date()
 
-    # try to get data from REDEMET
-    lo_metar = gu.get_metar(l_args.code, ls_date)
+    with gs.timer("metar.fetch"):
+        # try to get data from REDEMET
+        lo_metar = gu.get_metar(l_args.code, ls_date)
     M_LOG.debug("metar: %s", str(lo_metar.s_metar_mesg))
 
     # filename
     ls_fname = f"./{df.DS_DIR_GORMET}/{l_args.code}-{ls_date}Z.png"
 
-    # take a screenshot
-    l_img = gu.take_shot(df.DDCT_BBOX_GORMET, ls_fname)
+    with gs.timer("shot.take"):
+        # take a screenshot
+        l_img = gu.take_shot(df.DDCT_BBOX_GORMET, ls_fname)
     assert l_img is not None
 
-    # save to DB
-    db.save2dbmet(lconn, l_args.code, ls_date, lo_metar.s_metar_mesg, ls_fname)
+    with gs.timer("shot.db"):
+        # save to DB
+        db.save2dbmet(lconn, l_args.code, ls_date, lo_metar.s_metar_mesg, ls_fname)
 
-    # commit the changes and close the connection
-    lconn.commit()
+        # commit the changes
+        lconn.commit()
+    # close the connection
     lconn.close()
 
 # ---------------------------------------------------------------------------------------------